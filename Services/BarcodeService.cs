@@ -17,6 +17,8 @@ using QuestPDF.Helpers;
 using QuestPDF.Infrastructure;
 using System.Text.Json;
 using System.IO;
+using System.Security.Cryptography;
+using System.Text;
 
 namespace ReagentBarcode.Services
 {
@@ -67,7 +69,7 @@ namespace ReagentBarcode.Services
                             foreach(var s in BarcodeSample.AllSamples) {
                                 if (!_cachedSamples.Any(x => x.Full == s.Full)) _cachedSamples.Add(s);
                             }
-                            AnalyzeCalibrationSlopes(_cachedSamples);
+                            if (!LoadCalibrationSlopes(_cachedSamples)) AnalyzeCalibrationSlopes(_cachedSamples);
                             return _cachedSamples;
                         }
                     }
@@ -79,10 +81,69 @@ namespace ReagentBarcode.Services
                 _cachedSamples = BarcodeSample.AllSamples;
             }
             
-            AnalyzeCalibrationSlopes(_cachedSamples);
+            if (!LoadCalibrationSlopes(_cachedSamples)) AnalyzeCalibrationSlopes(_cachedSamples);
             return _cachedSamples;
         }
 
+        // Slopes exported by model_registry.py; only used when written for the
+        // same sample list (anchors file plus golden samples): same count and
+        // same digest of the codes, otherwise the pair vote of
+        // AnalyzeCalibrationSlopes runs as before
+        private bool LoadCalibrationSlopes(List<BarcodeSample> samples)
+        {
+            try {
+                string[] paths = {
+                    Path.Combine(AppDomain.CurrentDomain.BaseDirectory, "wwwroot", "data", "calibration_slopes.json"),
+                    Path.Combine(Directory.GetCurrentDirectory(), "wwwroot", "data", "calibration_slopes.json"),
+                    "wwwroot/data/calibration_slopes.json",
+                    "../wwwroot/data/calibration_slopes.json"
+                };
+                foreach (var path in paths) {
+                    if (!File.Exists(path)) continue;
+                    using var doc = JsonDocument.Parse(File.ReadAllText(path));
+                    var root = doc.RootElement;
+                    if (root.GetProperty("format").GetInt32() != 1) return false;
+                    var source = root.GetProperty("source");
+                    if (source.GetProperty("samples").GetInt32() != samples.Count) return false;
+                    if (source.GetProperty("digest").GetString() != SamplesDigest(samples)) {
+                        _logger.LogInformation($"Calibration slopes in {path} were fitted on other samples, re-analyzing");
+                        return false;
+                    }
+
+                    var loaded = new Dictionary<string, Slopes>();
+                    foreach (var g in root.GetProperty("groups").EnumerateObject()) {
+                        var v = g.Value;
+                        loaded[g.Name] = new Slopes {
+                            pSlopes = v.GetProperty("pSlopes").EnumerateArray().Select(x => x.GetInt32()).ToArray(),
+                            calSlopes = new[] { v.GetProperty("m").GetInt32() },
+                            k = v.GetProperty("k").GetInt32(),
+                            lotSlope = v.GetProperty("lotSlope").GetInt32(),
+                            pLotSlope = v.GetProperty("pLotSlope").GetInt32(),
+                            pDateSlope = v.GetProperty("pDateSlope").GetInt32(),
+                            count = v.GetProperty("count").GetInt32()
+                        };
+                    }
+                    _calibrationSlopesExtended = loaded;
+                    _logger.LogInformation($"Loaded calibration slopes v{root.GetProperty("version").GetInt32()} ({loaded.Count} groups) from {path}");
+                    return true;
+                }
+            } catch (Exception ex) {
+                _logger.LogWarning($"Calibration slopes not loaded: {ex.Message}");
+            }
+            return false;
+        }
+
+        // SHA-256 over the distinct 20-digit codes, sorted ordinally and joined
+        // by "\n" (result_cache.corpus_hash of the registry's sample list)
+        private static string SamplesDigest(List<BarcodeSample> samples)
+        {
+            var codes = samples.Select(x => x.Full)
+                .Where(f => f != null && f.Length == 20 && f.All(char.IsAsciiDigit))
+                .Distinct().OrderBy(f => f, StringComparer.Ordinal);
+            byte[] hash = SHA256.HashData(Encoding.ASCII.GetBytes(string.Join("\n", codes)));
+            return Convert.ToHexString(hash).ToLowerInvariant();
+        }
+
         public BarcodeResult GenerateBarcode(ReagentInput i, bool generateImage = true)
         {
             try {
@@ -1,99 +1,67 @@
 
 import math
 
-# Golden Samples from User Request
-samples = [
-    # IgE
-    ("IgE", "03421240831305186967"), # Lot 051, SN 8696
-    ("IgE", "03412240831905187165"), # Lot 051, SN 8716
-    ("IgE", "03421241130605287237"), # Lot 052, SN 8723
-    ("IgE", "03412241130805287467"), # Lot 052, SN 8746
-    ("IgE", "03421250531105397211"), # Lot 053, SN 9721
-    ("IgE", "03412250531305397641"), # Lot 053, SN 9764
-    
-    # UREA
-    ("UREA", "01021240930900989311"), # Lot 009, SN 8931
-    ("UREA", "01021240930100989451"), # Lot 009, SN 8945
-    ("UREA", "01012240930100994395"), # Lot 009, SN 9439
-    ("UREA", "01021241130001005591"), # Lot 010, SN 0559
-    ("UREA", "01021241130101005561"), # Lot 010, SN 0556
-    ("UREA", "01012241130501010681"), # Lot 010, SN 1068
-    ("UREA", "01021251130301304777"), # Lot 013, SN 0477
-    ("UREA", "01021251130001304769"), # Lot 013, SN 0476
-    ("UREA", "01012251130701301175")  # Lot 013, SN 0117
-]
+import numpy as np
 
-def calculate_checksum_algorithms(code_19):
-    results = {}
-    
-    # Standard Mod 10 (Luhn)
-    sum_luhn = 0
-    reverse = code_19[::-1]
-    for i, digit in enumerate(reverse):
-        n = int(digit)
-        if i % 2 == 0:
-            n *= 2
-            if n > 9: n -= 9
-        sum_luhn += n
-    results['Luhn'] = (10 - (sum_luhn % 10)) % 10
-    
-    # Weighted Mod 10 (3,1,3,1...) - Odd positions x3
-    sum_w31 = 0
-    for i, digit in enumerate(code_19):
-        w = 3 if i % 2 == 0 else 1
-        sum_w31 += int(digit) * w
-    results['Mod10_31'] = (10 - (sum_w31 % 10)) % 10
-    
-    # Weighted Mod 10 (1,3,1,3...) - Even positions x3
-    sum_w13 = 0
-    for i, digit in enumerate(code_19):
-        w = 1 if i % 2 == 0 else 3
-        sum_w13 += int(digit) * w
-    results['Mod10_13'] = (10 - (sum_w13 % 10)) % 10
+from anchor_store import golden_store
+from checksum_families import evaluate_schemes, known_schemes, score_schemes
+from delta_engine import delta_tables, field_columns, predictability, sample_pairs, slope_scores
+
+# Golden Samples from User Request (shared store)
+store = golden_store()
+CHEM_NAMES = {34: "IgE", 10: "UREA"}
+types = [CHEM_NAMES.get(int(ic), f"{ic:03d}") for ic in store.ic]
+codes = store.codes()
 
-    # Mod 11
-    sum_mod11 = 0
-    weights = [2,3,4,5,6,7,8,9]
-    for i, digit in enumerate(code_19[::-1]):
-        sum_mod11 += int(digit) * weights[i % 8]
-    rem = sum_mod11 % 11
-    if rem <= 1: results['Mod11'] = 0 
-    else: results['Mod11'] = 11 - rem
+# Luhn, Mod10_31, Mod10_13 and Mod11 as lookup tables (checksum_families.py)
+SCHEMES = known_schemes(19)
 
-    return results
+def calculate_checksum_algorithms(code_19):
+    # Check digit of one 19-digit code (string or digit row) under every scheme
+    row = np.frombuffer(code_19.encode("ascii"), dtype=np.uint8) - ord("0") if isinstance(code_19, str) else code_19
+    return {name: int(v[0]) for name, v in evaluate_schemes(np.asarray(row).reshape(1, -1), SCHEMES).items()}
 
-print(f"{'Type':<6} {'Barcode (19)':<20} {'Act':<3} {'Luhn':<4} {'31':<4} {'13':<4} {'M11':<4}")
-print("-" * 60)
+if __name__ == "__main__":
+    print(f"{'Type':<6} {'Barcode (19)':<20} {'Act':<3} {'Luhn':<4} {'31':<4} {'13':<4} {'M11':<4}")
+    print("-" * 60)
 
-for type_name, full_code in samples:
-    code_19 = full_code[:19]
-    actual_cs = int(full_code[19])
-    calcs = calculate_checksum_algorithms(code_19)
+    # All schemes against all codes in one pass
+    batch = evaluate_schemes(store.x19(), SCHEMES)
+    for i, (type_name, full_code, row) in enumerate(zip(types, codes, store.digits)):
+        code_19 = full_code[:19]
+        actual_cs = int(row[19])
+        calcs = {name: int(v[i]) for name, v in batch.items()}
     
-    match_str = ""
-    for k, v in calcs.items():
-        if v == actual_cs:
-            match_str = k
-            break
+        match_str = ""
+        for k, v in calcs.items():
+            if v == actual_cs:
+                match_str = k
+                break
             
-    print(f"{type_name:<6} {code_19:<20} {actual_cs:<3} {calcs['Luhn']:<4} {calcs['Mod10_31']:<4} {calcs['Mod10_13']:<4} {calcs['Mod11']:<4} {match_str}")
+        print(f"{type_name:<6} {code_19:<20} {actual_cs:<3} {calcs['Luhn']:<4} {calcs['Mod10_31']:<4} {calcs['Mod10_13']:<4} {calcs['Mod11']:<4} {match_str}")
 
-print("\n--- Delta Analysis ---")
-# Compare pairs to see how changes affect CS
-for i in range(len(samples)):
-    for j in range(i + 1, len(samples)):
-        t1, c1 = samples[i]
-        t2, c2 = samples[j]
-        if t1 == t2: # Compare same chem types
-            s1 = int(c1[15:19])
-            s2 = int(c2[15:19])
-            cs1 = int(c1[19])
-            cs2 = int(c2[19])
-            
-            diff_sn = s2 - s1
-            diff_cs = (cs2 - cs1)
-            
-            # Simple check: Does CS change by +/- 1 when SN changes by 1?
-            # Or weighted?
-            
-            print(f"{t1} Pair: SN {s1}->{s2} (d={diff_sn}), CS {cs1}->{cs2} (d={diff_cs})")
+    scores = score_schemes(store.x19(), store.checks(), SCHEMES)
+    print("Matches: " + ", ".join(f"{name} {n}/{len(store)}" for name, n in scores.items()))
+
+    print("\n--- Delta Analysis ---")
+    # How the CS moves when a field moves, per chemistry: for each field the
+    # slope k with dCS = k * dField (mod 10) that most pairs agree with, and
+    # how well dField predicts dCS at all (delta_engine.py, no pair loops)
+    tables = delta_tables(store, keys=types)
+    for t, by_field in tables.items():
+        print(f"{t}: {by_field['serial'].pairs // 2} pairs")
+        for name, table in by_field.items():
+            scores = slope_scores(table)
+            k = int(scores.argmax())
+            print(f"  d{name:<7} best k={k} ({scores[k]:.0%} of pairs)  predictability {predictability(table):.0%}")
+
+    # A few sampled pairs per chemistry instead of every pair
+    rng = np.random.default_rng(0)
+    cols = field_columns(store)
+    for t in tables:
+        rows = np.flatnonzero(np.array(types) == t)
+        i, j = sample_pairs(store.lot[rows], min(5, rows.size * (rows.size - 1) // 2), rng)
+        for a, b in zip(rows[i], rows[j]):
+            s1, s2 = cols["serial"][a], cols["serial"][b]
+            cs1, cs2 = cols["checksum"][a], cols["checksum"][b]
+            print(f"{t} Pair: SN {s1}->{s2} (d={s2 - s1}), CS {cs1}->{cs2} (d={cs2 - cs1})")
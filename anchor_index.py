@@ -0,0 +1,110 @@
+
+from bisect import bisect_left
+
+import numpy as np
+
+# Nearest-anchor lookup (BarcodeService.FindClosestSample) in O(log n).
+#
+# Anchors are bucketed three times, one bucket map per fallback tier:
+#   (ic, bc, rc, lot) -> (ic, bc, rc) -> (ic)
+# and every bucket keeps its serials sorted, so the closest serial is a
+# bisect away instead of a filter + sort over the whole sample list. Ties go
+# to the anchor that comes first in the store, like the stable LINQ OrderBy.
+# An anchor whose "s" is not a plain number fails int.TryParse in the service
+# and sits at distance 9999 from every target; only the first such anchor of
+# a bucket can ever win, so each bucket keeps just that one next to its table.
+
+NON_NUMERIC_DISTANCE = 9999
+
+
+class _SerialTable:
+    # Sorted distinct serials of one bucket, each with its first store row
+
+    def __init__(self, serials, rows, numeric):
+        # First anchor without a numeric serial, or -1
+        self.fixed = int(rows[~numeric].min()) if (~numeric).any() else -1
+        serials, rows = serials[numeric], rows[numeric]
+        order = np.lexsort((rows, serials))
+        serials, rows = serials[order], rows[order]
+        first = np.ones(serials.size, dtype=bool)
+        first[1:] = serials[1:] != serials[:-1]
+        self.serials = serials[first]
+        self.rows = rows[first]
+        self._serial_list = self.serials.tolist()
+
+    def nearest(self, target):
+        pos = bisect_left(self._serial_list, target)
+        best = None if self.fixed < 0 else (NON_NUMERIC_DISTANCE, self.fixed)
+        for i in (pos - 1, pos):
+            if 0 <= i < len(self._serial_list):
+                cand = (abs(self._serial_list[i] - target), int(self.rows[i]))
+                if best is None or cand < best:
+                    best = cand
+        return best[1]
+
+    def nearest_many(self, targets):
+        if not self.serials.size:
+            return np.full(np.shape(targets), self.fixed, dtype=np.int64)
+        pos = np.searchsorted(self.serials, targets, side="left")
+        last = self.serials.size - 1
+        lo = np.clip(pos - 1, 0, last)
+        hi = np.clip(pos, 0, last)
+        d_lo = np.abs(self.serials[lo] - targets)
+        d_hi = np.abs(self.serials[hi] - targets)
+        take_hi = (d_hi < d_lo) | ((d_hi == d_lo) & (self.rows[hi] < self.rows[lo]))
+        best = np.where(take_hi, self.rows[hi], self.rows[lo])
+        if self.fixed >= 0:
+            d = np.minimum(d_lo, d_hi)
+            take_fixed = (d > NON_NUMERIC_DISTANCE) | ((d == NON_NUMERIC_DISTANCE) & (self.fixed < best))
+            best = np.where(take_fixed, self.fixed, best)
+        return best
+
+
+def _bucket(keys, serials, numeric):
+    groups = {}
+    for row, key in enumerate(keys):
+        groups.setdefault(key, []).append(row)
+    return {key: _SerialTable(serials[rows], np.array(rows, dtype=np.int64), numeric[rows])
+            for key, rows in groups.items()}
+
+
+class AnchorIndex:
+
+    def __init__(self, store):
+        ic = store.ic.astype(np.int64).tolist()
+        bc = store.digits[:, 3].astype(np.int64).tolist()
+        rc = store.digits[:, 4].astype(np.int64).tolist()
+        lot = store.lot.astype(np.int64).tolist()
+        serials = store.serial.astype(np.int64)
+        numeric = np.asarray(store.serial_numeric, dtype=bool)
+
+        self.by_lot = _bucket(list(zip(ic, bc, rc, lot)), serials, numeric)
+        self.by_type = _bucket(list(zip(ic, bc, rc)), serials, numeric)
+        self.by_chem = _bucket(ic, serials, numeric)
+
+    def _table(self, ic, bc, rc, lot):
+        return (self.by_lot.get((ic, bc, rc, lot))
+                or self.by_type.get((ic, bc, rc))
+                or self.by_chem.get(ic))
+
+    def lookup(self, ic, bc, rc, lot, serial):
+        # Store row of the closest anchor, or -1 when the item code has none
+        table = self._table(ic, bc, rc, lot)
+        return -1 if table is None else table.nearest(serial)
+
+    def lookup_many(self, ic, bc, rc, lot, serial):
+        # Bulk lookup over equal-length int arrays; inputs sharing a key are
+        # resolved with one searchsorted against that key's bucket
+        ic, bc, rc, lot, serial = (np.asarray(a, dtype=np.int64) for a in (ic, bc, rc, lot, serial))
+        out = np.full(ic.size, -1, dtype=np.int64)
+        keys = np.stack([ic, bc, rc, lot], axis=1)
+        uniq, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind="stable")
+        bounds = np.searchsorted(inverse[order], np.arange(len(uniq) + 1))
+        for u, key in enumerate(uniq.tolist()):
+            table = self._table(*key)
+            if table is not None:
+                rows = order[bounds[u]:bounds[u + 1]]
+                out[rows] = table.nearest_many(serial[rows])
+        return out
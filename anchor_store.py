@@ -0,0 +1,238 @@
+
+import csv
+import json
+import os
+
+import numpy as np
+
+from label_decoder import CODE_LEN, field_values
+
+# Shared anchor-corpus loader.
+#
+# Anchor records look like the entries of wwwroot/data/barcode_anchors.json:
+#   {"ic": "006", "rt": "R1", "s": "9420", "f": "00621251031303494201"}
+# They are streamed from JSON, JSON Lines or CSV and the 20-digit "f" field is
+# parsed once into a fixed-width uint8 digit matrix. Everything the solvers
+# need (item code, reagent type, lot, serial, P) is kept as small numeric
+# columns next to it, so nothing downstream has to call int(c) per character.
+# The serial is read like BarcodeService does: every digit of "s" as one
+# number ("1068_SYN_K2" -> 10682, int.Parse of the digits), and serial_numeric
+# records whether "s" is a plain number (int.TryParse in FindClosestSample).
+# A .bcc file (corpus_format.py) loads the same columns memory-mapped.
+#
+# Barcode layout (0-based, see label_decoder.FIELDS):
+#   0-2 item code | 3 bottle | 4 reagent | 5-10 yyMMdd | 11 P | 12-14 lot
+#   15-18 serial  | 19 checksum
+
+ANCHORS_PATH = os.path.join("wwwroot", "data", "barcode_anchors.json")
+
+CHUNK_ROWS = 1 << 16
+READ_SIZE = 1 << 16
+
+# Golden samples (mirror of BarcodeSample.AllSamples): (ic, rt, serial, full)
+GOLDEN_SAMPLES = [
+    # IgE (034)
+    ("034", "R1", "8696", "03421240831305186967"),
+    ("034", "R2", "8716", "03412240831905187165"),
+    ("034", "R1", "8723", "03421241130605287237"),
+    ("034", "R2", "8746", "03412241130805287467"),
+    ("034", "R1", "9721", "03421250531105397211"),
+    ("034", "R2", "9764", "03412250531305397641"),
+
+    # UREA (010)
+    ("010", "R1", "8931", "01021240930900989311"),
+    ("010", "R1", "8945", "01021240930100989451"),
+    ("010", "R2", "9439", "01012240930100994395"),
+    ("010", "R1", "0559", "01021241130001005591"),
+    ("010", "R1", "0556", "01021241130101005561"),
+    ("010", "R2", "1068", "01012241130501010681"),
+    ("010", "R1", "0477", "01021251130301304777"),
+    ("010", "R1", "0476", "01021251130001304769"),
+    ("010", "R2", "0117", "01012251130701301175"),
+]
+
+
+def _iter_json_array(f):
+    # Incremental decode of a top-level JSON array, one element at a time
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # Skip whitespace and separators
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = f.read(READ_SIZE)
+            buf, pos = chunk, 0
+            eof = not chunk
+        if pos >= len(buf):
+            return
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("expected a JSON array of anchor records")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(READ_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+        if pos > READ_SIZE:
+            buf, pos = buf[pos:], 0
+
+
+def _detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".bcc":
+        return "bcc"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    return "json"
+
+
+def iter_records(path=ANCHORS_PATH, fmt=None):
+    # Streams {"ic", "rt", "s", "f"} dicts from a JSON / JSON Lines / CSV export
+    fmt = fmt or _detect_format(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if fmt == "jsonl":
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        elif fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            yield from _iter_json_array(f)
+
+
+def _digits_only(s):
+    return "".join(c for c in s if c.isdigit())
+
+
+class AnchorStore:
+    # Column store of anchor barcodes. Row i of every column is one label.
+
+    def __init__(self, digits=None, ic=None, rt=None, lot=None, serial=None, p=None, serial_numeric=None):
+        self.digits = np.zeros((0, CODE_LEN), dtype=np.uint8) if digits is None else digits
+        self.ic = np.zeros(0, dtype=np.uint16) if ic is None else ic
+        self.rt = np.zeros(0, dtype=np.uint8) if rt is None else rt
+        self.lot = np.zeros(0, dtype=np.uint16) if lot is None else lot
+        self.serial = np.zeros(0, dtype=np.uint16) if serial is None else serial
+        self.p = np.zeros(0, dtype=np.uint8) if p is None else p
+        # Serials taken from the code or a plain number; all of them unless given
+        self.serial_numeric = np.ones(len(self.digits), dtype=bool) if serial_numeric is None else serial_numeric
+        self.skipped = 0
+
+    def __len__(self):
+        return self.digits.shape[0]
+
+    @classmethod
+    def from_records(cls, records, chunk=CHUNK_ROWS):
+        store = cls()
+        store.extend(records, chunk)
+        return store
+
+    def extend(self, records, chunk=CHUNK_ROWS):
+        # Parses records in fixed-size chunks so memory stays bounded by the
+        # final columns plus one chunk of raw text.
+        codes, ics, rts, serials, numeric = [], [], [], [], []
+        parts = []
+        for rec in records:
+            f_code = (rec.get('f') or "").strip()
+            if len(f_code) != CODE_LEN or not f_code.isdigit():
+                self.skipped += 1
+                continue
+            codes.append(f_code)
+            ics.append(rec.get('ic') or f_code[0:3])
+            rts.append(rec.get('rt') or "R1")
+            s = (rec.get('s') or "").strip()
+            serials.append(_digits_only(s) or f_code[15:19])
+            numeric.append(s.isdigit() or not s)
+            if len(codes) >= chunk:
+                parts.append(self._parse_chunk(codes, ics, rts, serials, numeric))
+                codes, ics, rts, serials, numeric = [], [], [], [], []
+        if codes:
+            parts.append(self._parse_chunk(codes, ics, rts, serials, numeric))
+        if parts:
+            self._append(parts)
+        return self
+
+    @staticmethod
+    def _parse_chunk(codes, ics, rts, serials, numeric):
+        raw = np.frombuffer("".join(codes).encode("ascii"), dtype=np.uint8)
+        digits = (raw.reshape(-1, CODE_LEN) - ord("0")).astype(np.uint8)
+        ic = np.array([int(_digits_only(x) or 0) for x in ics], dtype=np.uint16)
+        rt = np.array([2 if x == "R2" else 1 for x in rts], dtype=np.uint8)
+        lot = field_values(digits, "lot", np.uint16)
+        # Past 9 digits int.Parse would overflow in the service anyway
+        serial = np.array([int(x[-9:]) for x in serials], dtype=np.uint32)
+        return digits, ic, rt, lot, serial, digits[:, 11].copy(), np.array(numeric, dtype=bool)
+
+    def _append(self, parts):
+        cols = list(zip(*parts))
+        self.digits = np.concatenate([self.digits] + list(cols[0]))
+        self.ic = np.concatenate([self.ic] + list(cols[1]))
+        self.rt = np.concatenate([self.rt] + list(cols[2]))
+        self.lot = np.concatenate([self.lot] + list(cols[3]))
+        self.serial = np.concatenate([self.serial] + list(cols[4]))
+        self.p = np.concatenate([self.p] + list(cols[5]))
+        self.serial_numeric = np.concatenate([self.serial_numeric] + list(cols[6]))
+
+    def select(self, rows):
+        # Sub-store for a boolean mask, index array or slice
+        return AnchorStore(self.digits[rows], self.ic[rows], self.rt[rows],
+                           self.lot[rows], self.serial[rows], self.p[rows], self.serial_numeric[rows])
+
+    def x19(self):
+        # Digits covered by the checksum
+        return self.digits[:, :19]
+
+    def checks(self):
+        return self.digits[:, 19]
+
+    def codes(self):
+        return ["".join(map(str, row)) for row in self.digits]
+
+    def item_codes(self):
+        return [f"{v:03d}" for v in self.ic]
+
+    def rgt_types(self):
+        return [f"R{v}" for v in self.rt]
+
+    def group_keys(self):
+        # "ItemCode_RgtType" per row, same key BarcodeService groups slopes by
+        return [f"{i:03d}_R{r}" for i, r in zip(self.ic, self.rt)]
+
+    def groups(self):
+        # Group key -> row indices, in order of first appearance
+        out = {}
+        for row, key in enumerate(self.group_keys()):
+            out.setdefault(key, []).append(row)
+        return {k: np.array(v) for k, v in out.items()}
+
+
+def load_store(path=ANCHORS_PATH, fmt=None):
+    if (fmt or _detect_format(path)) == "bcc":
+        # Memory-mapped binary corpus; imported here as corpus_format builds on this module
+        import corpus_format
+        return corpus_format.read_store(path)
+    return AnchorStore.from_records(iter_records(path, fmt))
+
+
+def golden_store():
+    return AnchorStore.from_records({'ic': ic, 'rt': rt, 's': s, 'f': f} for ic, rt, s, f in GOLDEN_SAMPLES)
@@ -0,0 +1,252 @@
+
+import calendar
+import re
+import sys
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from anchor_index import AnchorIndex
+from anchor_store import CODE_LEN
+from label_decoder import decode_labels
+from slope_fit import WSUM_WEIGHTS, analyze_calibration_slopes, service_store
+
+# Batch port of BarcodeService.GenerateBarcode (without the image).
+#
+# Inputs are normalized once into integer columns, every input is matched to
+# its anchor, and the P-digit derivation and CalculateWeightedSum checksum are
+# then evaluated as array expressions over the whole batch. A full test corpus
+# is checked against a slope set in one call, no web host needed.
+
+TestCase = namedtuple("TestCase", "id chem code bottle rgt lot serial expiry expected")
+
+# Mirror of Models/ChemicalData.cs: (name, default code, aliases)
+CHEMICALS = [
+    ("UREA II GEN", "010", ("UREA", "UREA IIGEN")),
+    ("IgE", "034", ("TOTAL IgE",)),
+]
+
+# Service defaults when a group has no fitted slopes
+DEFAULT_SLOPES = ((3, 0, 3, 0), 1, 0, 0, 0, 1)
+
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_DMY = re.compile(r"^(\d{1,2})([/.-])(\d{1,2})\2(\d{4})$")
+_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+_MONTH_YEAR = re.compile(r"^([A-Za-z]+) (\d{4})$")
+
+
+def find_chemical(name):
+    # ChemicalData.FindByAnyName -> default item code, or None
+    if not name or not name.strip():
+        return None
+    n = name.upper()
+    for chem, code, aliases in CHEMICALS:
+        if chem.upper() == n or any(a.upper() in n for a in aliases) or chem.upper() in n:
+            return code
+    return None
+
+
+def _valid(y, m, d):
+    return 1 <= m <= 12 and 1 <= d <= calendar.monthrange(y, m)[1]
+
+
+def parse_expiry_date(ds):
+    # BarcodeService.ParseExpiryDate: first matching format wins
+    # (dd/MM before MM/dd), then the last day of that month; today otherwise
+    ds = ds or ""
+    y = m = None
+    match = _DMY.match(ds)
+    if match:
+        a, sep, b, yy = int(match.group(1)), match.group(2), int(match.group(3)), int(match.group(4))
+        if _valid(yy, b, a):
+            y, m = yy, b
+        elif sep == "/" and _valid(yy, a, b):
+            y, m = yy, a
+    elif _ISO.match(ds):
+        yy, mm, dd = (int(g) for g in _ISO.match(ds).groups())
+        if _valid(yy, mm, dd):
+            y, m = yy, mm
+    elif _MONTH_YEAR.match(ds):
+        name, yy = _MONTH_YEAR.match(ds).groups()
+        if name.lower() in _MONTHS:
+            y, m = int(yy), _MONTHS[name.lower()]
+    if y is None:
+        return date.today()
+    return date(y, m, calendar.monthrange(y, m)[1])
+
+
+def _digits(s):
+    return "".join(c for c in (s or "") if c.isdigit())
+
+
+def normalize_inputs(ic, bc, rc, lot, serial, expiry):
+    # ReagentInput strings -> integer columns, same normalization as the service.
+    # Expiry strings repeat a lot, so each distinct one is parsed once.
+    n = len(ic)
+    cols = {
+        'ic': np.array([int(_digits((x or "000").rjust(3, "0")[:3]) or 0) for x in ic], dtype=np.int64),
+        'ic_str': [(x or "000").rjust(3, "0")[:3] for x in ic],
+        'bc_str': [(x or "1")[:1] for x in bc],
+        'rc_str': [(x or "1")[:1] for x in rc],
+    }
+    # Non-digit bottle/reagent codes can never match an anchor
+    cols['bc'] = np.array([int(x) if x.isdigit() else -1 for x in cols['bc_str']], dtype=np.int64)
+    cols['rc'] = np.array([int(x) if x.isdigit() else -1 for x in cols['rc_str']], dtype=np.int64)
+    lot_digits = [_digits(x or "0") for x in lot]
+    cols['lot_digits'] = lot_digits
+    cols['lot'] = np.array([int(d[-3:]) if d else 0 for d in lot_digits], dtype=np.int64)
+    cols['serial'] = np.array([int(_digits(x or "0").rjust(4, "0")[-4:]) for x in serial], dtype=np.int64)
+
+    parsed = {}
+    dates = np.zeros((n, 6), dtype=np.int64)
+    for row, ds in enumerate(expiry):
+        if ds not in parsed:
+            parsed[ds] = [int(c) for c in parse_expiry_date(ds).strftime("%y%m%d")]
+        dates[row] = parsed[ds]
+    cols['date'] = dates
+    return cols
+
+
+def inputs_from_cases(cases):
+    # Same ReagentInput Controllers/ValidationController.cs builds per TestCase,
+    # rule for rule: there is no bottle 3 branch, so "60 ml" stays "1"
+    ics, bcs, rcs = [], [], []
+    for t in cases:
+        ics.append(find_chemical(t.chem) or t.code)
+        bottle = "1"
+        if "40" in t.bottle:
+            bottle = "2"
+        if "20" in t.bottle:
+            bottle = "1"
+        if "20" in t.bottle or "IgE" in t.bottle and t.rgt == "R2":
+            bottle = "1"
+        bcs.append(bottle)
+        rcs.append("2" if t.rgt == "R2" else "1")
+    return normalize_inputs(ics, bcs, rcs, [t.lot for t in cases], [t.serial for t in cases],
+                            [t.expiry for t in cases])
+
+
+def find_closest_samples(store, inputs, index=None):
+    # FindClosestSample for a whole batch: anchor row per input, -1 when the
+    # chemistry has no anchors
+    index = index or AnchorIndex(store)
+    return index.lookup_many(inputs['ic'], inputs['bc'], inputs['rc'], inputs['lot'], inputs['serial'])
+
+
+def _slope_columns(store, anchors, slopes):
+    # Per-input slope parameters of the anchor's ItemCode_RgtType group
+    keys = store.group_keys()
+    table = {}
+    for key in set(keys[a] for a in anchors):
+        s = slopes.get(key)
+        table[key] = DEFAULT_SLOPES if s is None else (s.p_slopes, s.k, s.m, s.lot_slope, s.p_lot_slope, s.p_date_slope)
+    rows = [table[keys[a]] for a in anchors]
+    p_s = np.array([r[0] for r in rows], dtype=np.int64).reshape(-1, 4)
+    return p_s, *(np.array([r[i] for r in rows], dtype=np.int64) for i in range(1, 6))
+
+
+def _fallback_code(ic, bc, rc, dt, lot_digits, s4):
+    # No anchors for the item code: P from the serial, plain 3-1 checksum
+    c_final = ic + bc + rc + dt + str((int(s4[-1]) * 3 + 5) % 10) + lot_digits.rjust(3, "0") + s4
+    weight = sum(int(c) * (3 if j % 2 == 0 else 1) for j, c in enumerate(reversed(c_final)))
+    return (c_final + str((10 - weight % 10) % 10)).rjust(20, "0")[-20:]
+
+
+def generate_batch(store, inputs, slopes=None, index=None):
+    # -> list of 20-digit barcodes, one per input
+    if slopes is None:
+        slopes = analyze_calibration_slopes(store)
+    n = len(inputs['ic'])
+    anchors = find_closest_samples(store, inputs, index)
+    hit = np.flatnonzero(anchors >= 0)
+    out = [None] * n
+
+    if hit.size:
+        a = anchors[hit]
+        digits = store.digits[a].astype(np.int64)
+        p_s, k, m, l_s, p_ls, p_ds = _slope_columns(store, a, slopes)
+
+        s_in = inputs['serial'][hit]
+        s_sample = store.serial[a].astype(np.int64)
+        lot_in = inputs['lot'][hit]
+        lot_sample = store.lot[a].astype(np.int64)
+        dt = inputs['date'][hit]
+
+        # New P digit from the anchor's P and the serial / lot / date deltas
+        p_sample = digits[:, 11]
+        p_new = p_sample.copy()
+        for j in range(4):
+            p_new += p_s[:, j] * ((s_in // 10 ** j) % 10 - (s_sample // 10 ** j) % 10)
+        d_lot = lot_in - lot_sample
+        p_new += p_ls * d_lot
+        p_new += p_ds * (dt.sum(axis=1) - digits[:, 5:11].sum(axis=1))
+        p_new %= 10
+
+        # Target calibration value, then the checksum that reaches it
+        anchor_cal = (digits[:, 19] + digits[:, :19] @ WSUM_WEIGHTS) % 10
+        d_tens = s_in // 10 - s_sample // 10
+        target_cal = (anchor_cal + k * (p_new - p_sample) + m * d_tens + l_s * d_lot) % 10
+
+        code = np.empty((hit.size, CODE_LEN), dtype=np.int64)
+        code[:, :5] = digits[:, :5]
+        code[:, 5:11] = dt
+        code[:, 11] = p_new
+        code[:, 12:15] = np.stack([lot_in // 100, (lot_in // 10) % 10, lot_in % 10], axis=1)
+        code[:, 15:19] = np.stack([s_in // 1000, (s_in // 100) % 10, (s_in // 10) % 10, s_in % 10], axis=1)
+        code[:, 19] = (target_cal - code[:, :19] @ WSUM_WEIGHTS) % 10
+
+        text = (code.astype(np.uint8) + ord("0")).tobytes().decode("ascii")
+        for i, row in enumerate(hit):
+            out[row] = text[i * CODE_LEN:(i + 1) * CODE_LEN]
+
+    for row in np.flatnonzero(anchors < 0):
+        dt = "".join(str(v) for v in inputs['date'][row])
+        out[row] = _fallback_code(inputs['ic_str'][row], inputs['bc_str'][row], inputs['rc_str'][row], dt,
+                                  inputs['lot_digits'][row], f"{inputs['serial'][row]:04d}")
+    return out
+
+
+def cases_from_store(store):
+    # One TestCase per anchor, fields decoded the way generate_test_cases.py does
+    labels = decode_labels(store.digits)
+    bottles, lots, serials, expiry = labels.text_fields()
+    return [TestCase(i + 1, "", f"{ic:03d}", bottle, f"R{rt}", lot, serial, exp, f_code)
+            for i, (ic, rt, bottle, lot, serial, exp, f_code)
+            in enumerate(zip(store.ic.tolist(), store.rt.tolist(), bottles, lots, serials, expiry, labels.strings()))]
+
+
+_CS_CASE = re.compile(r'new\((\d+),\s*' + r',\s*'.join([r'"((?:[^"\\]|\\.)*)"'] * 8) + r'\)')
+
+
+def load_cases(path='new_test_cases.txt'):
+    # TestCase records from C# "new(...)" lines (generate_test_cases.py output)
+    cases = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = _CS_CASE.search(line)
+            if match:
+                g = match.groups()
+                cases.append(TestCase(int(g[0]), g[1].replace('\\"', '"'), *g[2:]))
+    return cases
+
+
+def validate_cases(cases, store, slopes=None, index=None):
+    # -> (actual barcodes, boolean pass mask)
+    actual = generate_batch(store, inputs_from_cases(cases), slopes, index)
+    passed = np.array([a == t.expected for a, t in zip(actual, cases)], dtype=bool)
+    return actual, passed
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else 'new_test_cases.txt'
+    store = service_store()
+    cases = load_cases(path)
+    actual, passed = validate_cases(cases, store)
+    for t, a, ok in zip(cases, actual, passed):
+        if not ok:
+            print(f"Test #{t.id} [{t.chem} SN:{t.serial} Lot:{t.lot}] -> FAIL")
+            print(f"   Expected: {t.expected}")
+            print(f"   Actual  : {a}")
+    print(f"Summary: {int(passed.sum())}/{len(cases)} Passed.")
@@ -0,0 +1,213 @@
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+import synthetic_corpus
+from anchor_store import golden_store, load_store
+from batch_generate import cases_from_store, validate_cases
+from checksum_families import score_schemes
+from modular_solver import solve_mod, solve_positions
+from slope_fit import WSUM_WEIGHTS, SlopeFitter
+from synthetic_corpus import synthetic_store
+from weight_search import MODES, pattern_count, search_cyclic
+
+# Benchmark harness for the checksum-hypothesis solvers.
+#
+# Every solver runs against fixed corpora (the golden samples, the shipped
+# anchors, seeded synthetic corpora from synthetic_corpus.py, a corpus
+# directory it wrote or a .bcc file) and reports throughput, peak traced
+# memory and time-to-first-solution. Results are written as JSON and compared
+# against a stored baseline; a solver is flagged when its throughput drops or
+# its peak memory grows by more than the tolerance.
+#
+#   python benchmarks.py                          # all corpora, print JSON
+#   python benchmarks.py --corpora golden anchors --save-baseline
+#   python benchmarks.py --out bench.json --tolerance 0.25
+
+BASELINE_PATH = "benchmark_baseline.json"
+CORPORA = ("golden", "anchors", "synth10k", "synth1m")
+
+# Checksum model of the seeded synthetic corpora (see synthetic_corpus.py)
+SYNTH_MODEL = "Mod10_31"
+
+
+def load_corpus(name, seed=0):
+    # A named corpus, a directory written by synthetic_corpus.py or an
+    # anchor / .bcc file
+    if os.path.isdir(name):
+        return synthetic_corpus.load_corpus(name)
+    if os.path.isfile(name):
+        return load_store(name)
+    if name == "golden":
+        return golden_store()
+    if name == "anchors":
+        return load_store()
+    if name == "synth10k":
+        return synthetic_store(10_000, seed, SYNTH_MODEL)
+    if name == "synth1m":
+        return synthetic_store(1_000_000, seed, SYNTH_MODEL)
+    raise ValueError(f"unknown corpus {name}")
+
+
+# Solver runners: (store, first) -> (work units, unit name). Each runner
+# calls first() the moment it has its first solution.
+
+def run_weight_search(store, first, L=5):
+    # The whole space is scanned, so the work reported is the work done
+    # whatever the first match
+    X, checks = store.x19(), store.checks()
+    for _ in search_cyclic(X, checks, L):
+        first()
+    return pattern_count(L) * len(MODES), "patterns"
+
+
+def run_linear_solver(store, first):
+    for rule in ("direct", "luhn"):
+        if solve_positions(store.digits, 19, range(19), 10, rule) is not None:
+            first()
+    return len(store) * 2, "rows"
+
+
+def run_coefficients(store, first):
+    wsum = store.x19().astype(np.int64) @ WSUM_WEIGHTS
+    target = (store.checks() + wsum) % 10
+    for rows in store.groups().values():
+        A = np.column_stack([store.p[rows], store.serial[rows] // 10, store.lot[rows],
+                             np.ones(rows.size)]).astype(np.int64)
+        if solve_mod(A, target[rows], 10) is not None:
+            first()
+    return len(store), "rows"
+
+
+def run_slope_fit(store, first):
+    SlopeFitter().add_store(store).slopes()
+    first()
+    n = sum(rows.size * (rows.size - 1) // 2 for rows in store.groups().values())
+    return n, "pairs"
+
+
+def run_batch_generate(store, first):
+    actual, passed = validate_cases(cases_from_store(store), store, slopes={})
+    first()
+    return len(actual), "labels"
+
+
+def run_checksum_scan(store, first):
+    score_schemes(store.x19(), store.checks())
+    first()
+    return len(store), "labels"
+
+
+# name -> (runner, largest corpus it is run on)
+SOLVERS = {
+    "weight_search": (run_weight_search, None),
+    "linear_solver": (run_linear_solver, None),
+    "coefficients": (run_coefficients, None),
+    "slope_fit": (run_slope_fit, 1_000),
+    "batch_generate": (run_batch_generate, None),
+    "checksum_scan": (run_checksum_scan, None),
+}
+
+
+def bench_one(runner, store, memory=True):
+    # Timed pass first; tracemalloc slows Python-level code down a lot, so
+    # peak memory comes from a second, traced pass.
+    first = []
+    t0 = time.perf_counter()
+
+    def mark():
+        if not first:
+            first.append(time.perf_counter() - t0)
+
+    units, unit_name = runner(store, mark)
+    elapsed = time.perf_counter() - t0
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            runner(store, lambda: None)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds": round(elapsed, 6),
+        "units": units,
+        "unit": unit_name,
+        "throughput": round(units / elapsed, 3) if elapsed > 0 else None,
+        "peak_bytes": peak,
+        "time_to_first_solution": round(first[0], 6) if first else None,
+    }
+
+
+def run_benchmarks(corpora=CORPORA, solvers=tuple(SOLVERS), seed=0, memory=True):
+    results = {}
+    for corpus in corpora:
+        store = load_corpus(corpus, seed)
+        for name in solvers:
+            runner, max_rows = SOLVERS[name]
+            key = f"{name}/{corpus}"
+            if max_rows is not None and len(store) > max_rows:
+                results[key] = {"skipped": f"corpus larger than {max_rows} rows"}
+                continue
+            results[key] = bench_one(runner, store, memory)
+            results[key]["rows"] = len(store)
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    # -> list of regression messages
+    flags = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base or "skipped" in cur or "skipped" in base:
+            continue
+        if base.get("throughput") and cur["throughput"] < base["throughput"] * (1 - tolerance):
+            flags.append(f"{key}: throughput {cur['throughput']} < baseline {base['throughput']}")
+        if base.get("peak_bytes") and cur["peak_bytes"] and cur["peak_bytes"] > base["peak_bytes"] * (1 + tolerance):
+            flags.append(f"{key}: peak memory {cur['peak_bytes']} > baseline {base['peak_bytes']}")
+    return flags
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the checksum solvers")
+    parser.add_argument("--corpora", nargs="+", default=list(CORPORA),
+                        help=f"any of {', '.join(CORPORA)}, synthetic_corpus.py directories or anchor / .bcc files")
+    parser.add_argument("--solvers", nargs="+", default=list(SOLVERS), choices=list(SOLVERS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced peak-memory pass")
+    parser.add_argument("--out", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.corpora, args.solvers, args.seed, not args.no_memory)
+    report = {"python": platform.python_version(), "numpy": np.__version__, "results": results}
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            report["regressions"] = compare(results, json.load(f)["results"], args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text)
+
+    if report.get("regressions"):
+        for msg in report["regressions"]:
+            print(f"REGRESSION {msg}")
+        raise SystemExit(1)
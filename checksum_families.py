@@ -0,0 +1,124 @@
+
+import numpy as np
+
+# Checksum families as (position, digit) -> contribution lookup tables.
+#
+# Every scheme here is "sum of per-digit contributions, reduced mod M, then a
+# finishing rule", so it is fully described by a (width, 10) table of
+# contributions (already reduced mod M), the modulus and the rule:
+#   remainder  (M - s % M) % M           Luhn / GS1 style
+#   direct     s % M
+#   mod11      0 if s % M <= 1 else M - s % M
+# Luhn's double-and-subtract-9 is just another table. Evaluating a batch is a
+# gather of the digit matrix against the stacked tables of all schemes plus
+# one sum, so every scheme is scored against every label in one pass.
+
+FINISH_RULES = ("remainder", "direct", "mod11")
+CHUNK_ROWS = 1 << 16
+
+
+class ChecksumScheme:
+
+    def __init__(self, name, table, modulus, finish="remainder"):
+        if finish not in FINISH_RULES:
+            raise ValueError(f"unknown finishing rule {finish}")
+        self.name = name
+        self.table = np.asarray(table, dtype=np.int64) % modulus
+        self.modulus = modulus
+        self.finish = finish
+
+    @property
+    def width(self):
+        return self.table.shape[0]
+
+    def evaluate(self, digits):
+        # (n, width) digit matrix -> (n,) check digits
+        return evaluate_schemes(digits, [self])[self.name]
+
+    def __repr__(self):
+        return f"ChecksumScheme({self.name!r}, modulus={self.modulus}, finish={self.finish!r})"
+
+
+def weighted(name, weights, modulus=10, finish="remainder"):
+    # Plain weighted sum: digit d at position i contributes weights[i] * d
+    weights = np.asarray(weights, dtype=np.int64)
+    return ChecksumScheme(name, np.outer(weights, np.arange(10)), modulus, finish)
+
+
+def cyclic(name, pattern, width=19, modulus=10, finish="remainder", from_right=False):
+    # Weights repeating `pattern` across the code, anchored left or right
+    w = [pattern[i % len(pattern)] for i in range(width)]
+    return weighted(name, w[::-1] if from_right else w, modulus, finish)
+
+
+def luhn(width=19):
+    # From the right, every other digit (starting with the rightmost) is
+    # doubled and 9 is subtracted from two-digit results
+    doubled = np.array([(2 * d - 9) if 2 * d > 9 else 2 * d for d in range(10)])
+    table = np.array([doubled if (width - 1 - i) % 2 == 0 else np.arange(10) for i in range(width)])
+    return ChecksumScheme("Luhn", table, 10, "remainder")
+
+
+def mod11(width=19, cycle=(2, 3, 4, 5, 6, 7, 8, 9)):
+    # Weights 2..9 repeating from the right, remainder <= 1 -> 0
+    return cyclic("Mod11", cycle, width, 11, "mod11", from_right=True)
+
+
+def known_schemes(width=19):
+    # The schemes calculate_checksum_algorithms has always reported
+    return [
+        luhn(width),
+        cyclic("Mod10_31", (3, 1), width),
+        cyclic("Mod10_13", (1, 3), width),
+        mod11(width),
+    ]
+
+
+def _stack(schemes):
+    # Flat (width * 10, S) contribution table plus per-scheme finishing data
+    width = schemes[0].width
+    if any(s.width != width for s in schemes):
+        raise ValueError("all schemes must have the same width")
+    flat = np.stack([s.table.reshape(-1) for s in schemes], axis=1)
+    moduli = np.array([s.modulus for s in schemes], dtype=np.int64)
+    rules = np.array([FINISH_RULES.index(s.finish) for s in schemes])
+    return flat, moduli, rules
+
+
+def _finish(sums, moduli, rules):
+    r = sums % moduli
+    out = np.where(rules == 0, (moduli - r) % moduli, r)
+    return np.where(rules == 2, np.where(r <= 1, 0, moduli - r), out)
+
+
+def _chunks(digits, chunk):
+    for lo in range(0, digits.shape[0], chunk):
+        yield lo, digits[lo:lo + chunk]
+
+
+def evaluate_schemes(digits, schemes=None, chunk=CHUNK_ROWS):
+    # name -> (n,) check digit of every label under that scheme
+    digits = np.asarray(digits)
+    schemes = known_schemes(digits.shape[1]) if schemes is None else schemes
+    flat, moduli, rules = _stack(schemes)
+    offsets = 10 * np.arange(digits.shape[1])
+    out = np.empty((digits.shape[0], len(schemes)), dtype=np.int64)
+    for lo, part in _chunks(digits, chunk):
+        sums = flat[part.astype(np.int64) + offsets].sum(axis=1)
+        out[lo:lo + part.shape[0]] = _finish(sums, moduli, rules)
+    return {s.name: out[:, k] for k, s in enumerate(schemes)}
+
+
+def score_schemes(digits, checks, schemes=None, chunk=CHUNK_ROWS):
+    # name -> number of labels whose check digit the scheme reproduces,
+    # in one pass and without keeping per-label results
+    digits = np.asarray(digits)
+    checks = np.asarray(checks, dtype=np.int64)
+    schemes = known_schemes(digits.shape[1]) if schemes is None else schemes
+    flat, moduli, rules = _stack(schemes)
+    offsets = 10 * np.arange(digits.shape[1])
+    hits = np.zeros(len(schemes), dtype=np.int64)
+    for lo, part in _chunks(digits, chunk):
+        sums = flat[part.astype(np.int64) + offsets].sum(axis=1)
+        hits += (_finish(sums, moduli, rules) == checks[lo:lo + part.shape[0], None]).sum(axis=0)
+    return {s.name: int(h) for s, h in zip(schemes, hits)}
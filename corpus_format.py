@@ -0,0 +1,207 @@
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from anchor_store import CODE_LEN, AnchorStore, load_store
+from synthetic_corpus import load_corpus
+
+# Binary corpus format (.bcc) for the anchor / label store.
+#
+# Reparsing barcode_anchors.json on every start costs seconds per million
+# labels; a .bcc file is opened with numpy.memmap instead, so startup is a
+# header read and every process mapping the same file shares one copy in the
+# page cache. Layout:
+#   8 bytes   magic "BCCORP01"
+#   4 bytes   header length (little-endian uint32)
+#   header    JSON: rows, packing, categories and column offsets/dtypes/shapes
+#   columns   each starting on a 64-byte boundary
+# Columns:
+#   digits    packing "raw": (rows, 20) uint8; packing "bcd": two digits per
+#             byte (even position in the high nibble), (rows, 10) uint8
+#   group     uint8/uint16 index into the header's [item code, reagent] list
+#   ic, rt    raw packing only: uint16 item code and uint8 reagent per row
+#   lot       uint16
+#   serial    uint16, or uint32 when a serial does not fit
+#   serial_numeric  uint8, 1 where the anchor's "s" is a plain number
+#             (AnchorStore.serial_numeric; all 1 when the column is absent)
+# P is digit 11. Raw is the default and the packing load_store reads: every
+# column of the store is the mapping itself, nothing is copied per process.
+# BCD (about half the size, no ic / rt columns) is an archival packing; it is
+# only read a chunk at a time through CorpusFile.iter_stores, which unpacks
+# and gathers the item code and reagent per chunk.
+#
+#   python corpus_format.py wwwroot/data/barcode_anchors.json anchors.bcc
+#   python corpus_format.py corpora/synth1m synth1m-archive.bcc --packing bcd
+
+MAGIC = b"BCCORP01"
+ALIGN = 64
+PACKINGS = ("raw", "bcd")
+CHUNK_ROWS = 1 << 16
+
+
+def pack_bcd(digits):
+    # (n, 20) digits -> (n, 10) bytes
+    digits = np.asarray(digits, dtype=np.uint8)
+    return (digits[:, 0::2] << 4) | digits[:, 1::2]
+
+
+def unpack_bcd(packed, out=None):
+    packed = np.asarray(packed)
+    out = np.empty((packed.shape[0], 2 * packed.shape[1]), dtype=np.uint8) if out is None else out
+    out[:, 0::2] = packed >> 4
+    out[:, 1::2] = packed & 0x0F
+    return out
+
+
+def _categories(store):
+    # Distinct (ic, rt) pairs in order of first appearance and the per-row code
+    pairs = store.ic.astype(np.int64) * 10 + store.rt
+    uniq, first, codes = np.unique(pairs, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(order.size)
+    cats = [[f"{int(v) // 10:03d}", f"R{int(v) % 10}"] for v in uniq[order]]
+    dtype = np.uint8 if len(cats) <= 256 else np.uint16
+    return cats, rank[codes.reshape(-1)].astype(dtype)
+
+
+def write_store(path, store, packing="raw"):
+    # AnchorStore -> .bcc file; returns the header
+    if packing not in PACKINGS:
+        raise ValueError(f"unknown packing {packing}")
+    digits = np.asarray(store.digits, dtype=np.uint8)
+    cats, group = _categories(store)
+    columns = {
+        "digits": pack_bcd(digits) if packing == "bcd" else digits,
+        "group": group,
+    }
+    if packing == "raw":
+        columns["ic"] = np.asarray(store.ic, dtype="<u2")
+        columns["rt"] = np.asarray(store.rt, dtype=np.uint8)
+    columns.update({
+        "lot": np.asarray(store.lot, dtype="<u2"),
+        "serial": np.asarray(store.serial, dtype="<u2" if not len(store) or store.serial.max() < 1 << 16 else "<u4"),
+        "serial_numeric": np.asarray(store.serial_numeric, dtype=np.uint8),
+    })
+
+    # Offsets are relative to the data section, which starts aligned after the header
+    header = {"version": 1, "rows": len(store), "code_len": CODE_LEN, "packing": packing,
+              "categories": cats, "columns": {}}
+    offset = 0
+    for name, arr in columns.items():
+        header["columns"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    blob = json.dumps(header).encode("utf-8")
+    start = -(-(len(MAGIC) + 4 + len(blob)) // ALIGN) * ALIGN
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint32(len(blob)).astype("<u4").tobytes())
+        f.write(blob)
+        f.write(b"\0" * (start - f.tell()))
+        for name, arr in columns.items():
+            f.write(b"\0" * (start + header["columns"][name]["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+    return header
+
+
+def read_header(path):
+    # -> (header, byte offset of the data section)
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a .bcc corpus")
+        size = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+        header = json.loads(f.read(size).decode("utf-8"))
+    return header, -(-(len(MAGIC) + 4 + size) // ALIGN) * ALIGN
+
+
+class CorpusFile:
+    # Read-only view of a .bcc file; every column is a numpy.memmap
+
+    def __init__(self, path):
+        self.path = path
+        self.header, start = read_header(path)
+        self.rows = self.header["rows"]
+        self.packing = self.header["packing"]
+        self.categories = [tuple(c) for c in self.header["categories"]]
+        self.columns = {}
+        for name, spec in self.header["columns"].items():
+            shape = tuple(spec["shape"])
+            if self.rows == 0:
+                self.columns[name] = np.zeros(shape, dtype=spec["dtype"])
+            else:
+                self.columns[name] = np.memmap(path, dtype=spec["dtype"], mode='r',
+                                               offset=start + spec["offset"], shape=shape)
+        self._cat_ic = np.array([int(ic) for ic, _ in self.categories] or [0], dtype=np.uint16)
+        self._cat_rt = np.array([int(rt[1:]) for _, rt in self.categories] or [1], dtype=np.uint8)
+
+    def __len__(self):
+        return self.rows
+
+    def digits(self, rows=slice(None)):
+        # Unpacked (k, 20) digit matrix; with raw packing and a slice, a view of the mapping
+        d = self.columns["digits"][rows]
+        return d if self.packing == "raw" else unpack_bcd(d)
+
+    def store(self, rows=slice(None)):
+        # AnchorStore over the selected rows; for a raw file and a slice every
+        # column is a view of the mapping
+        if "ic" in self.columns:
+            ic, rt = self.columns["ic"][rows], self.columns["rt"][rows]
+        else:
+            group = self.columns["group"][rows]
+            ic, rt = self._cat_ic[group], self._cat_rt[group]
+        digits = self.digits(rows)
+        numeric = self.columns.get("serial_numeric")
+        return AnchorStore(digits, ic, rt, self.columns["lot"][rows], self.columns["serial"][rows], digits[:, 11],
+                           None if numeric is None else numeric[rows].view(bool))
+
+    def iter_stores(self, chunk=CHUNK_ROWS):
+        # Bounded-memory pass over the corpus
+        for lo in range(0, self.rows, chunk):
+            yield self.store(slice(lo, lo + chunk))
+
+    def groups(self):
+        # Group key -> row indices in order of first appearance, as AnchorStore.groups
+        group = np.asarray(self.columns["group"])
+        order = np.argsort(group, kind="stable")
+        bounds = np.searchsorted(group[order], np.arange(len(self.categories) + 1))
+        out = {}
+        for k, (ic, rt) in enumerate(self.categories):
+            rows = order[bounds[k]:bounds[k + 1]]
+            if rows.size:
+                out[f"{ic}_{rt}"] = rows
+        return out
+
+
+def read_store(path):
+    # Whole-corpus AnchorStore straight on the mapping (raw packing only)
+    corpus = CorpusFile(path)
+    if corpus.packing != "raw":
+        raise ValueError(f"{path}: {corpus.packing} packing is read chunk by chunk (CorpusFile.iter_stores); "
+                         f"convert it to raw packing to load it whole")
+    return corpus.store()
+
+
+def convert(src, dst, packing="raw"):
+    # Anchor export (JSON / JSON Lines / CSV) or synthetic_corpus directory -> .bcc
+    if os.path.isdir(src):
+        store = load_corpus(src)
+    else:
+        store = load_store(src)
+    return write_store(dst, store, packing), store.skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an anchor export to the memory-mapped .bcc format")
+    parser.add_argument("src", help="anchor file (JSON / JSON Lines / CSV) or synthetic_corpus.py directory")
+    parser.add_argument("dst", help="output .bcc file")
+    parser.add_argument("--packing", default="raw", choices=PACKINGS, help="bcd: archival, read per chunk only")
+    args = parser.parse_args()
+
+    header, skipped = convert(args.src, args.dst, args.packing)
+    print(f"SUCCESS ({header['rows']} labels, {len(header['categories'])} groups, "
+          f"{os.path.getsize(args.dst)} bytes, {skipped} skipped)")
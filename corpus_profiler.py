@@ -0,0 +1,176 @@
+
+import argparse
+import csv
+import json
+
+import numpy as np
+
+from anchor_store import CODE_LEN, golden_store, load_store
+
+# Column-wise profile of an anchor corpus, for the dashboard.
+#
+# Everything is computed from the store's uint8 digit matrix with bincount
+# over offset codes (digit + 10 * column), so one pass is a handful of array
+# operations no matter how many labels there are:
+#   - per-position digit histograms and Shannon entropy (bits)
+#   - pairwise mutual information between positions, e.g. P (11) against the
+#     serial digits (15-18) and the checksum (19)
+#   - per ItemCode_RgtType group: row count, constant/variable mask and the
+#     value of every constant column
+#
+#   python corpus_profiler.py --json profile.json --csv profile.csv
+#   python corpus_profiler.py --golden
+
+FIELDS = {
+    "item": range(0, 3), "bottle": range(3, 4), "reagent": range(4, 5), "date": range(5, 11),
+    "p": range(11, 12), "lot": range(12, 15), "serial": range(15, 19), "checksum": range(19, 20),
+}
+
+
+def _field_of(pos):
+    return next(name for name, cols in FIELDS.items() if pos in cols)
+
+
+def position_histograms(digits):
+    # (n, W) digit matrix -> (W, 10) counts
+    width = digits.shape[1]
+    codes = digits.astype(np.int32) + 10 * np.arange(width, dtype=np.int32)
+    return np.bincount(codes.ravel(), minlength=10 * width).reshape(width, 10)
+
+
+def entropy(counts, axis=-1):
+    # Shannon entropy in bits of histogram(s) along `axis`
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=axis, keepdims=True)
+    prob = np.divide(counts, total, out=np.zeros_like(counts), where=total > 0)
+    logs = np.log2(prob, out=np.zeros_like(prob), where=prob > 0)
+    return 0.0 - (prob * logs).sum(axis=axis)
+
+
+def mutual_information(digits, hist=None):
+    # (W, W) matrix of I(X_a; X_b) in bits; the diagonal is the entropy
+    width = digits.shape[1]
+    hist = position_histograms(digits) if hist is None else hist
+    h = entropy(hist)
+    cols = [digits[:, c].astype(np.int32) for c in range(width)]
+    mi = np.diag(h)
+    for a in range(width):
+        if h[a] == 0:
+            continue
+        for b in range(a + 1, width):
+            if h[b] == 0:
+                continue
+            joint = np.bincount(cols[a] * 10 + cols[b], minlength=100)
+            mi[a, b] = mi[b, a] = max(h[a] + h[b] - entropy(joint), 0.0)
+    return mi
+
+
+def group_masks(store):
+    # ItemCode_RgtType -> (rows, constant mask over positions, digits of the
+    # first row), groups ordered by key
+    gid = store.ic.astype(np.int64) * 10 + store.rt
+    keys, inverse, counts = np.unique(gid, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sorted_digits = store.digits[order]
+    lo = np.minimum.reduceat(sorted_digits, starts, axis=0)
+    hi = np.maximum.reduceat(sorted_digits, starts, axis=0)
+    out = {}
+    for g, key in enumerate(keys.tolist()):
+        out[f"{key // 10:03d}_R{key % 10}"] = (int(counts[g]), lo[g] == hi[g], lo[g])
+    return out
+
+
+def profile(store, mi=True):
+    digits = store.digits
+    hist = position_histograms(digits)
+    report = {
+        "rows": len(store),
+        "positions": [
+            {
+                "position": pos,
+                "field": _field_of(pos),
+                "counts": hist[pos].tolist(),
+                "distinct": int((hist[pos] > 0).sum()),
+                "entropy": round(float(h), 6),
+            }
+            for pos, h in enumerate(entropy(hist))
+        ],
+        "groups": {
+            key: {
+                "rows": n,
+                "constant": const.tolist(),
+                "values": [int(v) if c else None for v, c in zip(first, const)],
+            }
+            for key, (n, const, first) in group_masks(store).items()
+        },
+    }
+    if mi:
+        report["mutual_information"] = np.round(mutual_information(digits, hist), 6).tolist()
+    return report
+
+
+def write_json(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def write_csv(report, path):
+    # One row per position: corpus-wide histogram and entropy, then the
+    # per-group constant value ("" when the column varies in that group)
+    groups = sorted(report["groups"])
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["position", "field", "entropy", "distinct"] + [f"n{d}" for d in range(10)] + groups)
+        for col in report["positions"]:
+            pos = col["position"]
+            consts = ["" if report["groups"][g]["values"][pos] is None else report["groups"][g]["values"][pos]
+                      for g in groups]
+            w.writerow([pos, col["field"], col["entropy"], col["distinct"]] + col["counts"] + consts)
+
+
+def write_mi_csv(report, path):
+    with open(path, 'w', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(["position"] + list(range(CODE_LEN)))
+        for pos, row in enumerate(report["mutual_information"]):
+            w.writerow([pos] + row)
+
+
+def print_report(report, focus=(11, 19), against=(15, 16, 17, 18, 19)):
+    for col in report["positions"]:
+        values = [d for d, n in enumerate(col["counts"]) if n]
+        kind = 'CONSTANT' if col["distinct"] == 1 else 'VAR'
+        print(f"Col {col['position']:2d} [{col['field']}]: {values} {kind} H={col['entropy']:.3f}")
+    if "mutual_information" in report:
+        print("-" * 20)
+        mi = report["mutual_information"]
+        for a in focus:
+            pairs = ", ".join(f"{b}:{mi[a][b]:.3f}" for b in against if b != a)
+            print(f"MI({a}; .) {pairs}")
+    print("-" * 20)
+    for key, g in sorted(report["groups"].items()):
+        mask = "".join("C" if c else "." for c in g["constant"])
+        print(f"{key} n={g['rows']}: {mask}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the digit columns of an anchor corpus")
+    parser.add_argument("--anchors", default=None, help="anchor file (JSON / JSON Lines / CSV)")
+    parser.add_argument("--golden", action="store_true", help="profile the golden samples only")
+    parser.add_argument("--json", default=None, help="write the full report as JSON")
+    parser.add_argument("--csv", default=None, help="write the per-position table as CSV")
+    parser.add_argument("--mi-csv", default=None, help="write the mutual information matrix as CSV")
+    parser.add_argument("--no-mi", action="store_true", help="skip mutual information")
+    args = parser.parse_args()
+
+    store = golden_store() if args.golden else load_store(args.anchors) if args.anchors else load_store()
+    report = profile(store, mi=not args.no_mi)
+    if args.json:
+        write_json(report, args.json)
+    if args.csv:
+        write_csv(report, args.csv)
+    if args.mi_csv and "mutual_information" in report:
+        write_mi_csv(report, args.mi_csv)
+    if not (args.json or args.csv or args.mi_csv):
+        print_report(report)
@@ -1,75 +1,90 @@
 
-import itertools
-
-samples_raw = [
-    ("03421240831305186967"), ("03412240831905187165"), ("03421241130605287237"),
-    ("03412241130805287467"), ("03421250531105397211"), ("03412250531305397641"),
-    ("01021240930900989311"), ("01021240930100989451"), ("01012240930100994395"),
-    ("01021241130001005591"), ("01021241130101005561"), ("01012241130501010681"),
-    ("01021251130301304777"), ("01021251130001304769"), ("01012251130701301175")
-]
-
-data = []
-for s in samples_raw:
-    digits = [int(c) for c in s[:19]]
-    checksum = int(s[19])
-    data.append((digits, checksum))
-
-print(f"Solving for {len(data)} samples...")
-
-def check(weights, modulus=10, remainder_mode=True):
-    # remainder_mode: True = (10 - sum%10)%10, False = sum%10
-    score = 0
-    for digits, expected in data:
-        s = sum(w * d for w, d in zip(weights, digits))
-        if remainder_mode:
-            calc = (modulus - (s % modulus)) % modulus
-        else:
-            calc = s % modulus
-        if calc == expected:
-            score += 1
-    return score
-
-# Try cycles of length 2 to 6
-for L in range(2, 7):
-    print(f"Testing cycles of length {L}...")
-    # Brute force all combinations of digits 1-9 for length L
-    for pat in itertools.product(range(1, 10), repeat=L):
-        full_weights = (pat * 20)[:19]
-        
-        # Test Mod 10 Remainder (Luhn style)
-        if check(full_weights, 10, True) == 15:
-            print(f"!!! FOUND MATCH (Mod 10 Remainder) !!! Pattern: {pat}")
-            exit()
-            
-        # Test Mod 10 Standard
-        if check(full_weights, 10, False) == 15:
-            print(f"!!! FOUND MATCH (Mod 10 Direct) !!! Pattern: {pat}")
-            exit()
-            
-        # Test Mod 11
-        if check(full_weights, 11, True) == 15:
-             print(f"!!! FOUND MATCH (Mod 11) !!! Pattern: {pat}")
-             exit()
-
-print("No Repeating Pattern Found.")
-
-# If no simple pattern, try pure random solver for first 19 weights? 
-# Maybe too large space 9^19.
-# But we can try to solve for "IgE" and "UREA" separately.
-
-print("\nTrying Separate Solvers:")
-
-ige_data = data[:6]
-urea_data = data[6:]
-
-def solve_sub(subdata, label):
-    for L in range(2, 6):
-        for pat in itertools.product(range(1, 10), repeat=L):
-            full_weights = (pat * 20)[:19]
-            if sum(1 for d, e in subdata if (10 - sum(w*x for w,x in zip(full_weights,d))%10)%10 == e) == len(subdata):
-                print(f"{label} MATCH (Mod 10 Remainder): {pat}")
-                return
-
-solve_sub(ige_data, "IgE")
-solve_sub(urea_data, "UREA")
+import argparse
+
+from anchor_store import golden_store
+from hypothesis_ranking import TopK, format_hypothesis
+from instrumentation import REPORT_EVERY, Metrics
+from parallel_search import SearchJob, parallel_sweep
+from prune_search import search_weights
+
+# Golden samples as a digit matrix + checksum vector, scored in blocks by weight_search
+store = golden_store()
+X, checks = store.x19(), store.checks()
+ige = store.ic == 34
+urea = store.ic == 10
+
+MODE_LABELS = {"remainder": "Mod 10 Remainder", "direct": "Mod 10 Direct", "mod11": "Mod 11"}
+
+
+def main(workers=None, checkpoint=None, top=5, metrics=None):
+    print(f"Solving for {len(X)} samples...")
+
+    # Try cycles of length 2 to 6
+    # Each pattern is tested as Mod 10 Remainder (Luhn style), Mod 10 Direct and Mod 11
+    print("Testing cycles of length 2 to 6...")
+    # With ranking on, the sweeps also keep the best near-fits per group, so
+    # a sweep that finds no match has ranked its whole space already
+    tops = {}
+    job = SearchJob("ALL", X, checks, range(2, 7))
+    if top:
+        tops["ALL"] = TopK(top)
+    for _, L, _, mode, pat in parallel_sweep([job], workers, checkpoint=checkpoint, metrics=metrics, tops=tops):
+        print(f"!!! FOUND MATCH ({MODE_LABELS[mode]}) !!! Pattern: {pat}")
+        return
+
+    print("No Repeating Pattern Found.")
+
+    # If no simple pattern, try the first 19 weights as a free vector.
+    # The 9^19 space is only reachable with pruning (prune_search.py).
+    print("Testing non-repeating 19-weight vectors (pruned)...")
+    for mode in MODE_LABELS:
+        for weights in search_weights(X, checks, mode, limit=1, metrics=metrics, label="ALL"):
+            print(f"!!! FOUND MATCH ({MODE_LABELS[mode]}) !!! Weights: {weights}")
+            return
+
+    print("No 19-Weight Vector Found.")
+
+    # We can also try to solve for "IgE" and "UREA" separately.
+    # Both sub-solves share the same pool and run concurrently.
+
+    print("\nTrying Separate Solvers:")
+
+    sub_jobs = [
+        SearchJob("IgE", X[ige], checks[ige], range(2, 6), modes=("remainder",)),
+        SearchJob("UREA", X[urea], checks[urea], range(2, 6), modes=("remainder",)),
+    ]
+    sub_checkpoint = checkpoint + ".sub" if checkpoint else None
+    if top:
+        tops.update({sub.label: TopK(top) for sub in sub_jobs})
+    for label, _, _, _, pat in parallel_sweep(sub_jobs, workers, checkpoint=sub_checkpoint, metrics=metrics, tops=tops):
+        print(f"{label} MATCH (Mod 10 Remainder): {pat}")
+
+    for label, mask in (("IgE", ige), ("UREA", urea)):
+        for weights in search_weights(X[mask], checks[mask], "remainder", limit=1, metrics=metrics, label=label):
+            print(f"{label} 19-WEIGHT MATCH (Mod 10 Remainder, None = any weight): {weights}")
+
+    if not top:
+        return
+
+    # Ranking mode: the best near-fits the sweeps kept per group, with the
+    # serials of the samples each one misses
+    print(f"\nBest {top} Near-Fits per Group:")
+    groups = {"ALL": (job, slice(None))}
+    groups.update({sub.label: (sub, mask) for sub, mask in zip(sub_jobs, (ige, urea))})
+    for label, (g, rows) in groups.items():
+        print(f"{label}:")
+        for h in tops[label].hypotheses(g.X, g.checks, ids=store.serial[rows]):
+            print(f"  {format_hypothesis(h)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--checkpoint", default=None, help="resume file for long sweeps")
+    parser.add_argument("--top", type=int, default=5, help="near-fits to rank per group (0 = off)")
+    parser.add_argument("--progress", type=float, default=REPORT_EVERY, help="seconds between progress lines")
+    parser.add_argument("--metrics", default=None, help="JSON metrics file, rewritten with every progress line")
+    parser.add_argument("--profile", default=None, help="cProfile output (parent and workers merged)")
+    args = parser.parse_args()
+    with Metrics("crack_checksum", args.progress, args.metrics, args.profile) as metrics:
+        main(args.workers, args.checkpoint, args.top, metrics)
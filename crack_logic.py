@@ -1,6 +1,9 @@
 
 import sys
-from itertools import product
+
+from anchor_store import golden_store
+from corpus_profiler import print_report, profile
+from modular_solver import solve_positions
 
 # Samples: Full 20 chars
 # We are interested in Index 10 (P) and Index 19 (Checksum)
@@ -53,92 +56,43 @@ from itertools import product
 # 11: 9
 # 12-19: 00989311
 # ok, let's dump the samples into code and parse them mechanically.
+# (The settled layout is label_decoder.FIELDS: 11 is P, 12-14 lot, 15-18 serial.)
 
-samples = [
-    "03421240831305186967",
-    "03412240831905187165",
-    "03421241130605287237",
-    "03412241130805287467",
-    "03421250531105397211",
-    "03412250531305397641",
-    "01021240930900989311",
-    "01021240930100989451",
-    "01012240930100994395",
-    "01021241130001005591",
-    "01021241130101005561",
-    "01012241130501010681",
-    "01021251130301304777",
-    "01021251130001304769",
-    "01012251130701301175"
-]
+store = golden_store()
 
 def analyze_positional_changes():
-    # Convert to list of lists of ints
-    data = [[int(c) for c in s] for s in samples]
-    
-    # Check which columns are constant or variable
-    cols = range(20)
-    for c in cols:
-        col_vals = [row[c] for row in data]
-        unique = set(col_vals)
-        print(f"Col {c}: {unique} {'CONSTANT' if len(unique)==1 else 'VAR'}")
-        
-    print("-" * 20)
+    # Which columns are constant or variable, per-column entropy, the mutual
+    # information of P (11) and the checksum (19) with the serial digits, and
+    # per-group constant masks -- all from the corpus profiler
+    print_report(profile(store))
     
     # Focus on Col 10, 11, 19
     # Try to find linear relation for Col 11 (Q) and Col 19 (Check)
     # Target = Col 11. Inputs = Col 0..10 + 12..18?
     # It seems Col 11 changes with Serial.
-    
-    # Let's brute force formatted logic for Col 11.
-    # It might be Check Digit 1.
-    pass
 
 def solve_linear(target_idx, input_indices, modulus=10):
     print(f"Solving for Target Index {target_idx} (Mod {modulus})...")
-    data = [[int(c) for c in s] for s in samples]
-    
-    Y = [row[target_idx] for row in data]
-    X = [[row[i] for i in input_indices] for row in data]
+    data = store.digits
     
-    # Brute force weights
-    L = len(input_indices)
-    
-    # Heuristic: Weights likely [1, 3, 7, 9] (odd)
-    # We'll try small weights range -5 to 5 or 1 to 9.
-    
-    # Attempt 1: Weights 1, 3, 7, 9
-    from itertools import product
-    
-    for pat in product([1, 3, 7, 9], repeat=L):
-        valid = True
-        for i in range(len(samples)):
-            s = sum(w * x for w, x in zip(pat, X[i]))
-            if (s % modulus) != (Y[i] % modulus) and ((modulus - s%modulus)%modulus != Y[i]):
-                 # Try both s%10 == t and (10-s)%10 == t
-                 valid = False
-                 break
-        
-        # Check standard Luhn-like: Sum + Target = 0 mod 10
-        if not valid:
-            valid_luhn = True
-            for i in range(len(samples)):
-                s = sum(w * x for w, x in zip(pat, X[i]))
-                if (s + Y[i]) % modulus != 0:
-                    valid_luhn = False
-                    break
-            if valid_luhn:
-                print(f"!!! FOUND LUHN-LIKE for Idx {target_idx}: Weights {pat}, Mod {modulus}")
-                return
-
-        if valid:
-             # Check which rule
-            rule1 = all((sum(w*x for w,x in zip(pat, X[i])) % modulus) == Y[i] for i in range(len(samples)))
-            if rule1:
-                print(f"!!! FOUND DIRECT SUM for Idx {target_idx}: Weights {pat}, Mod {modulus}")
-                return
+    # The weights are the unknowns of a linear system mod M, one congruence
+    # per sample, so solve it exactly instead of enumerating 4^L weight tuples.
+    # Direct sum:  sum(w * x) = Y        (mod M)
+    # Luhn-like:   sum(w * x) + Y = 0    (mod M)
+    found = False
+    for rule, label in (("direct", "DIRECT SUM"), ("luhn", "LUHN-LIKE")):
+        space = solve_positions(data, target_idx, input_indices, modulus, rule)
+        if space is None:
+            continue
+        found = True
+        print(f"!!! FOUND {label} for Idx {target_idx}: {space.count()} weight vectors, Mod {modulus}")
+        print(f"  particular: {tuple(int(w) for w in space.particular)}")
+        print(f"  free dimensions: {space.dimension()}")
+        for v in space.basis:
+            print(f"  + t * {tuple(int(w) for w in v)}")
     
-    print(f"No simple linear pattern for Idx {target_idx}.")
+    if not found:
+        print(f"No linear pattern for Idx {target_idx}.")
 
 if __name__ == "__main__":
     analyze_positional_changes()
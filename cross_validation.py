@@ -0,0 +1,297 @@
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from anchor_store import load_store
+from label_decoder import decode_labels
+from model_registry import CompiledModels, intercepts, model_columns
+from modular_solver import solve_mod
+from slope_fit import DEFAULT_CAL, DEFAULT_P_SET, GroupFit, Slopes, anchor_features, service_store
+from synthetic_corpus import load_corpus
+
+# Cross-validation of the checksum models on held-out anchors.
+#
+# The solvers fit and verify on the same few samples; with 4 unknowns and 6
+# points a solution says little. Here the anchors of every ItemCode_RgtType
+# group are split into folds, either
+#   kfold   k shuffled folds (seeded)
+#   lot     leave one lot out: the held-out lot is never seen in training
+# and every candidate model is fitted on the other folds and scored on the
+# held-out one:
+#   service       slope_fit votes + intercepts, scored by the compiled
+#                 model_registry evaluator (predicted P and checksum)
+#   coefficients  every (k, m, l, C) in Z/10 with
+#                 Cal = k*P + m*SNTens + l*lot + C on all training anchors
+#                 (solve_coefficients), each scored on the held-out anchors
+# The service votes of all folds of a group come from one pass over its pairs
+# (FoldFit) and groups are spread over a process pool. The report is held-out
+# checksum accuracy per group and model and, for the coefficient model, per
+# parameter set: how many folds found it and how often it predicted the
+# held-out checksum.
+#
+#   python cross_validation.py                        # service anchors, 5 folds
+#   python cross_validation.py --folds lot --json cv.json
+#   python cross_validation.py --corpus corpora/synth1m --max-anchors 200 --workers 8
+
+MODELS = ("service", "coefficients")
+K = 5
+MIN_ANCHORS = 3
+TOP_SETS = 3
+
+_WORKER_STORE = {}
+
+
+def kfold(n, k=K, seed=0):
+    # Held-out row positions of each of min(k, n) folds
+    order = np.random.default_rng(seed).permutation(n)
+    return [np.sort(f) for f in np.array_split(order, min(k, n))]
+
+
+def lot_folds(lots):
+    # One fold per distinct lot
+    return [np.flatnonzero(lots == lot) for lot in np.unique(lots)]
+
+
+def group_folds(store, scheme="kfold", k=K, seed=0, min_anchors=MIN_ANCHORS, max_anchors=None):
+    # -> [(group key, row indices, [held-out positions within rows])]; groups
+    # with too few anchors (or a single lot under "lot") are left out
+    out = []
+    for key, rows in store.groups().items():
+        rows = np.asarray(rows, dtype=np.int64)
+        if max_anchors and rows.size > max_anchors:
+            rows = np.sort(np.random.default_rng(seed).choice(rows, max_anchors, replace=False))
+        if rows.size < min_anchors:
+            continue
+        folds = lot_folds(store.lot[rows]) if scheme == "lot" else kfold(rows.size, k, seed)
+        if len(folds) > 1:
+            out.append((key, rows, folds))
+    return out
+
+
+class FoldFit(GroupFit):
+    # GroupFit that keeps its vote tables per (fold of i, fold of j) block of
+    # the pair loop, so the fit on all folds but f is a sum of blocks: one
+    # O(n^2) pass per group instead of one per fold. Pairs keep their
+    # positions in the full group, which orders them as in the training-only
+    # loop, so ties resolve the same way.
+
+    def __init__(self, fold, nfolds):
+        super().__init__()
+        self.fold = np.asarray(fold)
+        self.blocks = self.empty_tables((nfolds, nfolds))
+
+    def _vote_pairs(self, i, j, new, tables):
+        # Votes go to block (fold of i, fold of j) instead of the group tables
+        fi, fj = self.fold[i], self.fold[j]
+        for a in np.unique(fi).tolist():
+            super()._vote_pairs(i[fi == a], j, new, tuple(t[a, fj] for t in self.blocks))
+
+    def slopes_without(self, f):
+        # Slopes fitted on every anchor outside fold f
+        keep = np.flatnonzero(np.arange(self.blocks[0].shape[0]) != f)
+        train = np.ix_(keep, keep)
+        p_votes, p_first, c_votes, c_first = (t[train] for t in self.blocks)
+        n = int((self.fold != f).sum())
+        if n < 2:
+            p0, _, p2, _, pl, pd = DEFAULT_P_SET
+            return Slopes((p0, 0, p2, 0), *DEFAULT_CAL, pl, pd, n)
+        tables = (p_votes.sum(axis=(0, 1)), p_first.min(axis=(0, 1)),
+                  c_votes.sum(axis=(0, 1)), c_first.min(axis=(0, 1)))
+        return self.slopes(tables)._replace(count=n)
+
+
+def fold_slopes(store, rows, folds):
+    # Service slopes of every fold's training set
+    fold = np.zeros(rows.size, dtype=np.int64)
+    for f, test in enumerate(folds):
+        fold[test] = f
+    fit = FoldFit(fold, len(folds))
+    feats = anchor_features(store, rows)
+    for n in range(rows.size):
+        fit.add({name: v[n] for name, v in feats.items()})
+    return [fit.slopes_without(f) for f in range(len(folds))]
+
+
+def score_service(slopes, train, test, key):
+    # Held-out (P hits, checksum hits) of the service model with `slopes`
+    # and intercepts from `train`
+    p_c, cal_c = intercepts(slopes, model_columns(decode_labels(train.digits)))
+    model = {"pSlopes": list(slopes.p_slopes), "k": slopes.k, "m": slopes.m, "lotSlope": slopes.lot_slope,
+             "pLotSlope": slopes.p_lot_slope, "pDateSlope": slopes.p_date_slope, "pC": p_c, "calC": cal_c}
+    _, p_ok, cs_ok = CompiledModels({key: model}).check(test.digits)
+    return int(p_ok.sum()), int(cs_ok.sum())
+
+
+def _coefficient_system(store):
+    cols = model_columns(decode_labels(store.digits))
+    A = np.column_stack([cols["p"], cols["stens"], cols["lot"], np.ones(len(store), dtype=np.int64)])
+    return A, cols["cal"]
+
+
+def score_coefficients(train, test):
+    # -> (training solutions (s, 4), held-out checksum hits per solution)
+    A, b = _coefficient_system(train)
+    space = solve_mod(A, b, 10)
+    if space is None:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    sols = np.array(list(space.solutions()), dtype=np.int64).reshape(-1, 4)
+    A_test, b_test = _coefficient_system(test)
+    # Cal matches exactly when the checksum does
+    hits = ((A_test @ sols.T) % 10 == b_test[:, None]).sum(axis=0)
+    return sols, hits
+
+
+def _init_worker(store):
+    _WORKER_STORE["store"] = store
+
+
+def run_group(key, rows, folds, models=MODELS, store=None):
+    # Every fold of one group -> list of per-fold result dicts
+    store = _WORKER_STORE["store"] if store is None else store
+    slopes = fold_slopes(store, rows, folds) if "service" in models else None
+    out = []
+    for f, test_pos in enumerate(folds):
+        mask = np.zeros(rows.size, dtype=bool)
+        mask[test_pos] = True
+        train, test = store.select(rows[~mask]), store.select(rows[mask])
+        r = {"group": key, "train": len(train), "test": len(test)}
+        if slopes is not None:
+            r["service"] = score_service(slopes[f], train, test, key)
+        if "coefficients" in models:
+            r["coefficients"] = score_coefficients(train, test)
+        out.append(r)
+    return out
+
+
+class CVReport:
+    # Held-out accuracy aggregated per group and model
+
+    def __init__(self, scheme, models=MODELS):
+        self.scheme = scheme
+        self.models = tuple(models)
+        self.groups = {}
+
+    def _group(self, key):
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = {"folds": 0, "anchors": 0,
+                                    "service": {"p_hits": 0, "checksum_hits": 0},
+                                    "coefficients": {"folds_solved": 0, "solutions": 0, "expected_hits": 0.0,
+                                                     "sets": {}}}
+        return g
+
+    def add(self, r):
+        g = self._group(r["group"])
+        g["folds"] += 1
+        g["anchors"] += r["test"]
+        if "service" in r:
+            g["service"]["p_hits"] += r["service"][0]
+            g["service"]["checksum_hits"] += r["service"][1]
+        if "coefficients" in r:
+            sols, hits = r["coefficients"]
+            c = g["coefficients"]
+            if len(sols):
+                c["folds_solved"] += 1
+                c["solutions"] += len(sols)
+                # Accuracy of a training solution picked at random
+                c["expected_hits"] += float(hits.mean())
+            for sol, h in zip(sols.tolist(), hits.tolist()):
+                s = c["sets"].setdefault(tuple(sol), [0, 0, 0])
+                s[0] += 1
+                s[1] += h
+                s[2] += r["test"]
+
+    def to_dict(self):
+        out = {"scheme": self.scheme, "models": list(self.models), "groups": {}}
+        for key, g in sorted(self.groups.items()):
+            n = g["anchors"]
+            d = out["groups"][key] = {"folds": g["folds"], "held_out": n}
+            if "service" in self.models:
+                d["service"] = {"p_accuracy": g["service"]["p_hits"] / n,
+                                "checksum_accuracy": g["service"]["checksum_hits"] / n}
+            if "coefficients" in self.models:
+                c = g["coefficients"]
+                # Most held-out hits first: a set found in one fold cannot
+                # outrank one that held up across folds
+                sets = sorted(c["sets"].items(), key=lambda kv: (-kv[1][1], -kv[1][0], kv[0]))
+                d["coefficients"] = {
+                    "folds_solved": c["folds_solved"],
+                    "mean_solutions": c["solutions"] / c["folds_solved"] if c["folds_solved"] else 0,
+                    "expected_accuracy": c["expected_hits"] / n,
+                    "sets": [{"k": s[0], "m": s[1], "l": s[2], "C": s[3], "folds": f,
+                              "accuracy": h / t} for s, (f, h, t) in sets],
+                }
+        return out
+
+    def lines(self, top=TOP_SETS):
+        d = self.to_dict()
+        out = [f"Cross-validation ({d['scheme']} folds)"]
+        for key, g in d["groups"].items():
+            line = f"{key}: {g['folds']} folds, {g['held_out']} held out"
+            svc, coef = g.get("service"), g.get("coefficients")
+            if svc:
+                line += (f" | service checksum {100.0 * svc['checksum_accuracy']:.1f}% "
+                         f"(P {100.0 * svc['p_accuracy']:.1f}%)")
+            if coef:
+                line += (f" | (k,m,l,C) solved {coef['folds_solved']}/{g['folds']} folds, "
+                         f"{coef['mean_solutions']:.0f} solutions/fold, "
+                         f"{100.0 * coef['expected_accuracy']:.1f}% expected")
+            out.append(line)
+            for s in (coef["sets"][:top] if coef else []):
+                out.append(f"    k={s['k']} m={s['m']} l={s['l']} C={s['C']}: "
+                           f"{100.0 * s['accuracy']:.1f}% held out, found in {s['folds']} folds")
+        return out
+
+
+def cross_validate(store, scheme="kfold", k=K, seed=0, models=MODELS, workers=None, max_anchors=None):
+    # -> CVReport over every group of `store`; groups are the parallel unit,
+    # largest first so the pool is not left waiting on one big group
+    tasks = sorted(group_folds(store, scheme, k, seed, max_anchors=max_anchors), key=lambda t: -t[1].size)
+    report = CVReport(scheme, models)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = (run_group(key, rows, folds, models, store) for key, rows, folds in tasks)
+        for fold_results in results:
+            for r in fold_results:
+                report.add(r)
+        return report
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(store,)) as pool:
+        futures = [pool.submit(run_group, key, rows, folds, models) for key, rows, folds in tasks]
+        for fut in futures:
+            for r in fut.result():
+                report.add(r)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cross-validate the checksum models on held-out anchors")
+    parser.add_argument("--corpus", default=None,
+                        help="anchor file or synthetic_corpus.py directory (default: the service's samples)")
+    parser.add_argument("--folds", default="kfold", choices=("kfold", "lot"))
+    parser.add_argument("-k", type=int, default=K, help="folds per group for kfold")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=MODELS)
+    parser.add_argument("--max-anchors", type=int, default=None, help="sample at most this many anchors per group")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--json", default=None, help="full report as JSON")
+    args = parser.parse_args()
+
+    if args.corpus is None:
+        store = service_store()
+    elif os.path.isdir(args.corpus):
+        store = load_corpus(args.corpus)
+    else:
+        store = load_store(args.corpus)
+    t0 = time.perf_counter()
+    report = cross_validate(store, args.folds, args.k, args.seed, tuple(args.models), args.workers, args.max_anchors)
+    for line in report.lines():
+        print(line)
+    print(f"({time.perf_counter() - t0:.1f} s)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report.to_dict(), f, indent=2)
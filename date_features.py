@@ -0,0 +1,160 @@
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from anchor_store import golden_store, load_store
+from label_decoder import date_fields
+from modular_solver import solve_mod
+from slope_fit import WSUM_WEIGHTS
+
+# Does the expiry date really move the P digit (or the checksum)?
+#
+# The yyMMdd block (positions 5-10) is decoded for the whole store at once
+# and turned into candidate date features:
+#   digit_sum     SumDigits(yyMMdd), what the service's pDateSlope multiplies
+#   weighted_sum  the block's share of CalculateWeightedSum
+#   day_of_year   1..366
+#   month_index   months since Jan 2000
+#   day_index     days since 2000-01-01
+# Each feature is fitted per ItemCode_RgtType group against
+#   P   (index 11) ~ p0*sn0 + p2*sn2 + pL*lot + pD*feature + C   (mod 10)
+#   Cal (cs + wsum) ~ k*p  + m*sTens + l*lot + d*feature + C     (mod 10)
+# i.e. the service's own models plus a date term, two ways:
+#   - exactly with modular_solver (is the system consistent, is the date
+#     coefficient pinned to one value?)
+#   - by agreement: the share of labels the best coefficients reproduce, over
+#     the full 10^4 coefficient grid. Labels are first binned into a dense
+#     10^5 residue histogram, and the grid is scored by eliminating one
+#     coefficient at a time, so the cost does not grow with the label count.
+# A real date slope shows up as agreement with the best d clearly above the
+# agreement with d = 0 ("lift").
+#
+#   python date_features.py              # shipped anchors
+#   python date_features.py --golden
+
+DATE_FEATURES = ("digit_sum", "weighted_sum", "day_of_year", "month_index", "day_index")
+
+DateFit = namedtuple("DateFit", "group target feature rows slope agreement agreement_no_date lift "
+                                "consistent pinned")
+
+_CUM_DAYS = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334], dtype=np.int64)
+
+
+def date_digits(store):
+    return store.digits[:, 5:11].astype(np.int64)
+
+
+def decode_dates(store):
+    # -> (yy, mm, dd, valid) int64 columns; valid is False for impossible dates
+    yy, mm, dd, valid = date_fields(store.digits[:, 5:11])
+    return yy.astype(np.int64), mm.astype(np.int64), dd.astype(np.int64), valid
+
+
+def date_features(store):
+    # Feature name -> int64 column (invalid dates are clipped, see decode_dates)
+    d = date_digits(store)
+    yy, mm, dd, _ = decode_dates(store)
+    mm_c = np.clip(mm, 1, 12)
+    dd_c = np.clip(dd, 1, 31)
+    year = 2000 + yy
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    months = (yy + 30) * 12 + (mm_c - 1)
+    days = months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + dd_c - 1
+    return {
+        "digit_sum": d.sum(axis=1),
+        "weighted_sum": d @ WSUM_WEIGHTS[5:11],
+        "day_of_year": _CUM_DAYS[mm_c - 1] + (leap & (mm_c > 2)) + dd_c,
+        "month_index": yy * 12 + mm_c - 1,
+        "day_index": days - np.datetime64("2000-01-01", "D").astype(np.int64),
+    }
+
+
+def targets(store):
+    # Target name -> (target column, control columns of the service model)
+    digits = store.digits.astype(np.int64)
+    serial = store.serial.astype(np.int64)
+    lot = store.lot.astype(np.int64)
+    cal = (digits[:, 19] + digits[:, :19] @ WSUM_WEIGHTS) % 10
+    return {
+        "P": (digits[:, 11], [serial % 10, (serial // 100) % 10, lot]),
+        "Cal": (cal, [digits[:, 11], serial // 10, lot]),
+    }
+
+
+def _eliminate(H):
+    # (..., x, t) counts -> (k, ..., r) counts of r = t - k*x (mod 10)
+    x = np.arange(10)
+    idx = (np.arange(10)[None, None, :] + np.arange(10)[:, None, None] * x[None, :, None]) % 10
+    G = H[..., x[None, :, None], idx].sum(axis=-2)
+    return np.moveaxis(G, -2, 0)
+
+
+def agreement_grid(columns, target):
+    # Best number of rows reproduced by target = sum(k_i * col_i) + C (mod 10)
+    # for every coefficient vector k: array of shape (10,) * len(columns)
+    m = len(columns)
+    cells = np.zeros(target.shape, dtype=np.int64)
+    for col in columns:
+        cells = cells * 10 + col % 10
+    cells = cells * 10 + target % 10
+    H = np.bincount(cells, minlength=10 ** (m + 1)).reshape((10,) * (m + 1))
+    for _ in range(m):
+        H = _eliminate(H)
+    # Axes are now (k_1, ..., k_m, C)
+    return H.max(axis=-1)
+
+
+def fit_feature(controls, feature, target):
+    # -> (slope, agreement, agreement_no_date, consistent, pinned)
+    n = target.size
+    grid = agreement_grid(controls + [feature], target)
+    # A date slope has to beat d = 0 outright; ties keep the slope at 0
+    top, top0 = grid.max(), grid[..., 0].max()
+    slope = 0 if top0 == top else int(np.unravel_index(np.argmax(grid), grid.shape)[-1])
+    agree = top / n
+    agree0 = top0 / n
+
+    A = np.column_stack(controls + [feature, np.ones(n, dtype=np.int64)])
+    space = solve_mod(A, target, 10)
+    pinned = None
+    if space is not None and all(v[len(controls)] == 0 for v in space.basis):
+        pinned = int(space.particular[len(controls)])
+    return slope, agree, agree0, space is not None, pinned
+
+
+def fit_dates(store, features=DATE_FEATURES, min_rows=3):
+    # One DateFit per group, target and feature
+    feats = date_features(store)
+    tgts = targets(store)
+    fits = []
+    for key, rows in store.groups().items():
+        if rows.size < min_rows:
+            continue
+        for tname, (target, controls) in tgts.items():
+            ctl = [c[rows] for c in controls]
+            for fname in features:
+                slope, agree, agree0, consistent, pinned = fit_feature(ctl, feats[fname][rows], target[rows])
+                fits.append(DateFit(key, tname, fname, int(rows.size), slope, agree, agree0,
+                                    agree - agree0, consistent, pinned))
+    return fits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit date features against P and the checksum per group")
+    parser.add_argument("--anchors", default=None, help="anchor file (JSON / JSON Lines / CSV)")
+    parser.add_argument("--golden", action="store_true", help="fit the golden samples only")
+    parser.add_argument("--min-rows", type=int, default=3)
+    args = parser.parse_args()
+
+    store = golden_store() if args.golden else load_store(args.anchors) if args.anchors else load_store()
+    _, _, _, valid = decode_dates(store)
+    if not valid.all():
+        print(f"{int((~valid).sum())} labels with an impossible yyMMdd (clipped)")
+
+    print(f"{'Group':<8} {'Target':<6} {'Feature':<13} {'n':>6} {'d':>2} {'Agree':>6} {'d=0':>6} {'Lift':>6}  Exact")
+    for f in fit_dates(store, min_rows=args.min_rows):
+        exact = "no solution" if not f.consistent else f"d={f.pinned}" if f.pinned is not None else "d free"
+        print(f"{f.group:<8} {f.target:<6} {f.feature:<13} {f.rows:>6} {f.slope:>2} "
+              f"{f.agreement:>6.1%} {f.agreement_no_date:>6.1%} {f.lift:>+6.1%}  {exact}")
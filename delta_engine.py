@@ -0,0 +1,189 @@
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+# Pairwise delta analysis: how does the checksum move when a field moves?
+#
+# For every pair of labels in a group the table counts
+#   (dField mod 10, dChecksum mod 10)
+# over ordered pairs (i, j), i != j, so T[x, y] == T[-x, -y]. Nothing here
+# loops over pairs in Python:
+#
+#   exact    A mod-10 delta only depends on the two labels' residues, so the
+#            table is the cyclic autocorrelation of the group's 10x10
+#            (field, checksum) residue histogram -- O(n + 10^4) per group no
+#            matter how many pairs there are. Same-lot pairs come from the
+#            per-lot histograms the same way.
+#   sample   Stratified pair sampling (same-lot / cross-lot strata with
+#            proportional allocation) for pair-level arrays, e.g. to inspect
+#            raw serial deltas. Enough pairs are drawn that every cell
+#            proportion is within epsilon with probability 1 - delta
+#            (Hoeffding plus a union bound over the 100 cells).
+
+DELTA_FIELDS = ("serial", "stens", "lot", "date", "p")
+
+# counts[x, y]: ordered pairs with dField = x, dChecksum = y (mod 10).
+# pairs: ordered pairs in the group; sampled: pairs drawn (None = exact);
+# epsilon: bound on the error of counts / pairs per cell.
+DeltaTable = namedtuple("DeltaTable", "field counts pairs sampled epsilon")
+
+_CELLS = 100
+
+
+def field_columns(store):
+    # Field name -> int64 column; "checksum" is digit 19
+    digits = store.digits.astype(np.int64)
+    serial = store.serial.astype(np.int64)
+    return {
+        "serial": serial,
+        "stens": serial // 10,
+        "lot": store.lot.astype(np.int64),
+        "date": digits[:, 5:11].sum(axis=1),
+        "p": digits[:, 11],
+        "checksum": digits[:, 19],
+    }
+
+
+def hoeffding_pairs(epsilon, delta=0.05, cells=_CELLS):
+    # Sampled pairs needed for max cell error <= epsilon w.p. 1 - delta
+    return math.ceil(math.log(2 * cells / delta) / (2 * epsilon ** 2))
+
+
+def hoeffding_epsilon(pairs, delta=0.05, cells=_CELLS):
+    return math.sqrt(math.log(2 * cells / delta) / (2 * pairs))
+
+
+def _autocorrelation(H):
+    # (..., 10, 10) residue histograms -> ordered pair counts per (dx, dy)
+    T = np.empty(H.shape, dtype=np.int64)
+    for x in range(10):
+        for y in range(10):
+            T[..., x, y] = (H * np.roll(H, (-x, -y), axis=(-2, -1))).sum(axis=(-2, -1))
+    return T
+
+
+def _exact(f, c, lot):
+    # -> (all pairs table, same-lot pairs table)
+    n = f.size
+    cell = (f % 10) * 10 + c % 10
+    H = np.bincount(cell, minlength=_CELLS).reshape(10, 10)
+    total = _autocorrelation(H)
+    total[0, 0] -= n
+
+    lots, lot_idx = np.unique(lot, return_inverse=True)
+    H_lot = np.bincount(lot_idx * _CELLS + cell, minlength=lots.size * _CELLS).reshape(-1, 10, 10)
+    same = _autocorrelation(H_lot).sum(axis=0)
+    same[0, 0] -= n
+    return total, same
+
+
+def sample_pairs(lot, n_pairs, rng):
+    # Unordered pairs (i, j), i != j, drawn uniformly from all pairs of the
+    # group, stratified into same-lot and cross-lot pairs
+    n = lot.size
+    lots, lot_idx, counts = np.unique(lot, return_inverse=True, return_counts=True)
+    within = counts * (counts - 1) // 2
+    total = n * (n - 1) // 2
+    n_same = int(round(n_pairs * within.sum() / total)) if total else 0
+    n_cross = n_pairs - n_same
+
+    # Same lot: pick the lot by its pair count, then two distinct members
+    order = np.argsort(lot_idx, kind="stable")
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    i_parts, j_parts = [], []
+    if n_same:
+        pick = rng.choice(lots.size, n_same, p=within / within.sum())
+        a = rng.integers(0, counts[pick])
+        b = (a + rng.integers(1, counts[pick])) % counts[pick]
+        i_parts.append(order[starts[pick] + a])
+        j_parts.append(order[starts[pick] + b])
+
+    # Cross lot: uniform pairs, rejecting same-lot draws
+    got = 0
+    while got < n_cross:
+        need = n_cross - got
+        a = rng.integers(0, n, 2 * need)
+        b = rng.integers(0, n, 2 * need)
+        keep = np.flatnonzero(lot_idx[a] != lot_idx[b])[:need]
+        i_parts.append(a[keep])
+        j_parts.append(b[keep])
+        got += keep.size
+
+    if not i_parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(i_parts), np.concatenate(j_parts)
+
+
+def pair_deltas(cols, i, j):
+    # Field name -> raw deltas (j - i) for the given pairs
+    return {name: col[j] - col[i] for name, col in cols.items()}
+
+
+def _sampled(f, c, i, j, n):
+    dx = (f[j] - f[i]) % 10
+    dy = (c[j] - c[i]) % 10
+    # Both orientations, so the estimate is of the same ordered-pair table
+    cells = np.concatenate([dx * 10 + dy, ((10 - dx) % 10) * 10 + (10 - dy) % 10])
+    counts = np.bincount(cells, minlength=_CELLS).reshape(10, 10)
+    return counts * (n * (n - 1) / cells.size)
+
+
+def delta_tables(store, keys=None, fields=DELTA_FIELDS, method="auto", max_exact=None,
+                 epsilon=0.01, delta=0.05, same_lot=False, seed=0):
+    # Group key -> field -> DeltaTable.
+    # keys: one group key per row (default ItemCode_RgtType). method "auto"
+    # is exact; "sample" estimates from stratified pairs, and so does "auto"
+    # for groups above max_exact labels when that is set.
+    # same_lot=True restricts the tables to pairs that share a lot.
+    keys = store.group_keys() if keys is None else keys
+    cols = field_columns(store)
+    rng = np.random.default_rng(seed)
+
+    rows_of = {}
+    for row, key in enumerate(keys):
+        rows_of.setdefault(key, []).append(row)
+
+    out = {}
+    for key, rows in rows_of.items():
+        rows = np.array(rows)
+        n = rows.size
+        c, lot = cols["checksum"][rows], cols["lot"][rows]
+        sample = method == "sample" or (method == "auto" and max_exact is not None and n > max_exact)
+
+        tables = {}
+        if sample and n > 1:
+            n_pairs = min(hoeffding_pairs(epsilon, delta), n * (n - 1) // 2)
+            i, j = sample_pairs(lot, n_pairs, rng)
+            if same_lot:
+                keep = lot[i] == lot[j]
+                i, j = i[keep], j[keep]
+            for name in fields:
+                counts = _sampled(cols[name][rows], c, i, j, n) if i.size else np.zeros((10, 10))
+                if same_lot and i.size:
+                    counts *= i.size / n_pairs
+                tables[name] = DeltaTable(name, counts, n * (n - 1), i.size,
+                                          hoeffding_epsilon(max(n_pairs, 1), delta))
+        else:
+            for name in fields:
+                total, same = _exact(cols[name][rows], c, lot)
+                counts = same if same_lot else total
+                tables[name] = DeltaTable(name, counts, n * (n - 1), None, 0.0)
+        out[key] = tables
+    return out
+
+
+def slope_scores(table):
+    # Fraction of pairs with dChecksum = k * dField (mod 10), for k = 0..9
+    x = np.arange(10)
+    total = table.counts.sum()
+    if not total:
+        return np.zeros(10)
+    return np.array([table.counts[x, (k * x) % 10].sum() / total for k in range(10)])
+
+
+def predictability(table):
+    # Fraction of pairs whose dChecksum is the most common one for their dField
+    total = table.counts.sum()
+    return table.counts.max(axis=1).sum() / total if total else 0.0
@@ -1,82 +1,199 @@
+import argparse
 import json
+import os
+from itertools import islice
 
-chem_map = {
-    "001": "GLUCOSE", "002": "CHOLESTEROL", "003": "TRIGLYCERIDES", "004": "ALBUMIN",
-    "005": "TOTAL PROTEIN", "006": "BIL TOTAL", "007": "BILIRUBIN DIRECT", "009": "UA II GEN",
-    "010": "UREA II GEN", "012": "MAGNESIUM", "013": "PHOSPHORUS", "015": "ALAT",
-    "016": "ASAT", "017": "AMYLASE", "018": "ALP", "019": "CK", "020": "LDH",
-    "022": "GGT", "024": "GTT", "025": "HDL DIRECT", "026": "LDL DIRECT",
-    "027": "CRP ULTRA", "031": "RF", "074": "TOTAL IgE", "059": "CALCIUM ARSENAZO",
-    "061": "HbA1c DIRECT", "071": "CREA ENZ"
-}
-
-def parse_expiry(f):
-    if len(f) < 11: return "01/01/2025"
-    # Prefix is usually first 5 chars. yyMMdd starts at index 5.
-    yymmdd = f[5:11]
-    yy = yymmdd[0:2]
-    mm = yymmdd[2:4]
-    dd = yymmdd[4:6]
-    return f"{mm}/{dd}/20{yy}"
-
-def extract_lot(f):
-    # Logic: Last char is checksum. 4 chars before that is serial.
-    # 3 chars before serial is lot.
-    total = len(f)
-    if total < 10: return "000"
-    lot_end = total - 5
-    lot_start = lot_end - 3
-    return f[lot_start:lot_end]
-
-def extract_bottle(f):
-    if len(f) > 3:
-        b = f[3]
-        if b == '1': return "20 ml"
-        if b == '2': return "40 ml"
-        if b == '3': return "60 ml"
-    return "20 ml"
-
-def extract_serial(f):
-    # Extract the 4 digits before the checksum
-    total = len(f)
-    if total < 5: return "0000"
-    return f[total-5:total-1]
-
-try:
-    with open('wwwroot/data/barcode_anchors.json', 'r') as f:
-        data = json.load(f)
-        
-    with open('new_test_cases.txt', 'w') as out:
+from anchor_store import ANCHORS_PATH, iter_records
+from batch_generate import TestCase
+from label_decoder import chem_map, decode_labels
+
+# Streaming test-case emitter.
+#
+# Anchors are read one record at a time, decoded into TestCase tuples a batch
+# at a time by label_decoder and written in batches with writelines. Every
+# case goes to new_test_cases.txt (the GetTestCases() body merge_controller.py
+# splices into ValidationController.cs) and, optionally, to sharded outputs:
+#   --cs-dir     C# partial-class shards of ValidationController; the
+#                GetTestCases() in new_test_cases.txt then just calls them,
+#                so no single method grows past shard_size cases
+#   --jsonl-dir  JSON Lines shards
+#   --csv-dir    CSV shards, one header per file
+#
+#   python generate_test_cases.py --cs-dir Controllers/TestCases --jsonl-dir out/cases
+
+BATCH = 4096
+SHARD_SIZE = 10_000
+WRITE_BUFFER = 1 << 20
+
+
+def _decode_batch(batch):
+    # [(id, record)] -> TestCase list, fields from one label_decoder pass
+    codes = [item['f'] for _, item in batch]
+    bottles, lots, serials, expiry = decode_labels(codes).text_fields()
+    out = []
+    for (i, item), f_code, bottle, lot, serial, exp in zip(batch, codes, bottles, lots, serials, expiry):
+        ic = item.get('ic', '')
+        out.append(TestCase(i, chem_map.get(ic, f"CHEM_{ic}"), ic, bottle, item.get('rt', 'R1'),
+                            lot, serial, exp, f_code))
+    return out
+
+
+def iter_cases(records, limit=None):
+    # Anchor records -> TestCase, ids numbered by record position
+    numbered = ((i + 1, item) for i, item in enumerate(records) if item.get('f', ''))
+    if limit is not None:
+        numbered = islice(numbered, limit)
+    while True:
+        batch = list(islice(numbered, BATCH))
+        if not batch:
+            return
+        yield from _decode_batch(batch)
+
+
+def cs_line(t):
+    # Escape chemical name for C# string
+    name_esc = t.chem.replace('"', '\\"')
+    return (f'                new({t.id}, "{name_esc}", "{t.code}", "{t.bottle}", "{t.rgt}", '
+            f'"{t.lot}", "{t.serial}", "{t.expiry}", "{t.expected}"),\n')
+
+
+def json_line(t):
+    return json.dumps(t._asdict()) + "\n"
+
+
+def _csv_field(v):
+    v = str(v)
+    if any(c in v for c in ',"\r\n'):
+        return '"' + v.replace('"', '""') + '"'
+    return v
+
+
+def csv_line(t):
+    return ",".join(_csv_field(v) for v in t) + "\n"
+
+
+CSV_HEADER = ",".join(TestCase._fields) + "\n"
+
+
+class ShardWriter:
+    # Writes lines into numbered files of at most shard_size lines each.
+    # head(k) / tail(k) give the text around the lines of shard k.
+
+    def __init__(self, directory, name, shard_size=SHARD_SIZE, head=None, tail=None):
+        self.directory = directory
+        self.name = name
+        self.shard_size = shard_size
+        self.head = head or (lambda k: "")
+        self.tail = tail or (lambda k: "")
+        self.shards = 0
+        self._f = None
+        self._lines = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _roll(self):
+        self.close()
+        path = os.path.join(self.directory, self.name.format(self.shards))
+        self._f = open(path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER)
+        self._f.write(self.head(self.shards))
+        self._lines = 0
+        self.shards += 1
+
+    def write_lines(self, lines):
+        pos = 0
+        while pos < len(lines):
+            if self._f is None or self._lines >= self.shard_size:
+                self._roll()
+            take = lines[pos:pos + self.shard_size - self._lines]
+            self._f.writelines(take)
+            self._lines += len(take)
+            pos += len(take)
+
+    def close(self):
+        if self._f is not None:
+            self._f.write(self.tail(self.shards - 1))
+            self._f.close()
+            self._f = None
+
+
+def cs_shard_head(k):
+    return ("namespace ReagentBarcode.Controllers\n"
+            "{\n"
+            "    public partial class ValidationController\n"
+            "    {\n"
+            f"        private static void AddTestCases{k:03d}(List<TestCase> cases)\n"
+            "        {\n"
+            "            cases.AddRange(new TestCase[]\n"
+            "            {\n")
+
+
+def cs_shard_tail(k):
+    return ("            });\n"
+            "        }\n"
+            "    }\n"
+            "}\n")
+
+
+def write_cases(cases, out_path='new_test_cases.txt', cs_dir=None, jsonl_dir=None, csv_dir=None,
+                shard_size=SHARD_SIZE):
+    # -> number of cases written
+    writers = []
+    if cs_dir:
+        writers.append((ShardWriter(cs_dir, "ValidationController.TestCases{:03d}.cs", shard_size,
+                                    cs_shard_head, cs_shard_tail), cs_line))
+    if jsonl_dir:
+        writers.append((ShardWriter(jsonl_dir, "cases-{:05d}.jsonl", shard_size), json_line))
+    if csv_dir:
+        writers.append((ShardWriter(csv_dir, "cases-{:05d}.csv", shard_size, lambda k: CSV_HEADER), csv_line))
+
+    count = 0
+    with open(out_path, 'w', buffering=WRITE_BUFFER) as out:
         out.write("        private List<TestCase> GetTestCases()\n")
         out.write("        {\n")
-        out.write("            return new List<TestCase>\n")
-        out.write("            {\n")
-        
-        count = 0
-        for i, item in enumerate(data):
-            if count >= 250: break
-            
-            ic = item.get('ic', '')
-            rt = item.get('rt', 'R1')
-            f_code = item.get('f', '')
-            
-            if not f_code: continue
-            
-            name = chem_map.get(ic, f"CHEM_{ic}")
-            exp = parse_expiry(f_code)
-            lot = extract_lot(f_code)
-            bottle = extract_bottle(f_code)
-            serial = extract_serial(f_code)
-            
-            # Escape chemical name for C# string
-            name_esc = name.replace('"', '\\"')
-            
-            out.write(f'                new({i+1}, "{name_esc}", "{ic}", "{bottle}", "{rt}", "{lot}", "{serial}", "{exp}", "{f_code}"),\n')
-            count += 1
-            
-        out.write("            };\n")
+        if not cs_dir:
+            out.write("            return new List<TestCase>\n")
+            out.write("            {\n")
+
+        # A list or other re-iterable would restart at its first case every batch
+        cases = iter(cases)
+        while True:
+            batch = list(islice(cases, BATCH))
+            if not batch:
+                break
+            count += len(batch)
+            if not cs_dir:
+                out.writelines(cs_line(t) for t in batch)
+            for writer, fmt in writers:
+                writer.write_lines([fmt(t) for t in batch])
+
+        for writer, _ in writers:
+            writer.close()
+
+        if cs_dir:
+            # The cases live in the partial-class shards
+            out.write(f"            var cases = new List<TestCase>({count});\n")
+            out.writelines(f"            AddTestCases{k:03d}(cases);\n" for k in range(writers[0][0].shards))
+            out.write("            return cases;\n")
+        else:
+            out.write("            };\n")
         out.write("        }\n")
-        
-    print("SUCCESS")
-except Exception as e:
-    print(f"Error: {e}")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate validation test cases from the anchor corpus")
+    parser.add_argument("--anchors", default=ANCHORS_PATH, help="anchor file (JSON / JSON Lines / CSV)")
+    parser.add_argument("--out", default='new_test_cases.txt')
+    parser.add_argument("--limit", type=int, default=None, help="stop after this many cases (default: all)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--cs-dir", default=None, help="write C# partial-class shards here")
+    parser.add_argument("--jsonl-dir", default=None, help="write JSON Lines shards here")
+    parser.add_argument("--csv-dir", default=None, help="write CSV shards here")
+    args = parser.parse_args()
+
+    try:
+        # Anchors are streamed record by record instead of json.load-ing the file
+        cases = iter_cases(iter_records(args.anchors), args.limit)
+        n = write_cases(cases, args.out, args.cs_dir, args.jsonl_dir, args.csv_dir, args.shard_size)
+        print(f"SUCCESS ({n} cases)")
+    except Exception as e:
+        print(f"Error: {e}")
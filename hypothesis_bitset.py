@@ -0,0 +1,199 @@
+
+import argparse
+
+import numpy as np
+
+from anchor_store import golden_store, load_store
+from label_decoder import decode_labels
+from slope_fit import WSUM_WEIGHTS
+from weight_search import MODES, WEIGHTS_1_9, fold_cyclic, mode_targets, pattern_block, pattern_count
+
+# Bitset index of the hypotheses every sample accepts.
+#
+# A hypothesis space is enumerated once in a fixed order:
+#   CoefficientSpace      (k, m, l, C) in Z/10, index kmlC read as a 4-digit
+#                         number: Cal = k*P + m*SNTens + l*lot + C (mod 10),
+#                         the 10^4 space of solve_coefficients
+#   CyclicSpace(L)        (mode, pattern) for the 9^L cyclic weight patterns
+#                         of crack_checksum, pattern index as in
+#                         weight_search.pattern_block, modes in MODES order
+# and each sample becomes a packed bit array over it (np.packbits, one bit per
+# hypothesis: 1.25 KB for the coefficients, 3 x 66 KB for L = 6). The bits
+# come straight from residue classes: a hypothesis is a tuple of digits, its
+# sum mod M is the sum of one small per-position residue table, so the full
+# residue vector is built by broadcasting those tables position by position,
+# without materializing the hypotheses themselves.
+#
+# The survivors of a corpus are the AND of its sample bitsets. BitsetIndex
+# keeps that AND up to date, so a new anchor costs one bitset and one
+# intersection instead of re-testing the space, and the per-sample rows
+# answer "which samples reject this hypothesis" and "what survives without
+# these samples" without recomputing anything.
+#
+#   python hypothesis_bitset.py                    # golden samples, all spaces
+#   python hypothesis_bitset.py --anchors wwwroot/data/barcode_anchors.json --max-length 5
+
+MAX_LENGTH = 6
+# Residue cells materialized per chunk of samples
+CHUNK_CELLS = 1 << 24
+
+
+def residue_bits(terms, modulus, targets):
+    # terms: per position an (n, b) table of residues mod M. -> (n, prod b)
+    # bools, True where the sum of one entry per position (first position most
+    # significant, as itertools.product) is the row's target mod M
+    n = targets.shape[0]
+    dtype = np.int8 if modulus <= 63 else np.int16
+    res = np.zeros((n, 1), dtype=dtype)
+    for t in terms:
+        res = (res[:, :, None] + t.astype(dtype)[:, None, :]).reshape(n, -1)
+        res %= modulus
+    return res == targets[:, None]
+
+
+def _chunked(bits_of, n, size):
+    # Pack bits_of(lo, hi) over row chunks that keep the residue matrix bounded
+    step = max(1, CHUNK_CELLS // size)
+    return np.concatenate([np.packbits(bits_of(lo, min(lo + step, n)), axis=1) for lo in range(0, n, step)]
+                          or [np.zeros((0, -(-size // 8)), dtype=np.uint8)])
+
+
+class CoefficientSpace:
+
+    name = "coefficients"
+    size = 10 ** 4
+
+    def bitsets(self, digits):
+        # (n, 20) digit matrix -> (n, 1250) packed acceptance bits
+        batch = decode_labels(np.asarray(digits, dtype=np.uint8))
+        d = batch.digits.astype(np.int64)
+        cal = (d[:, 19] + d[:, :19] @ WSUM_WEIGHTS) % 10
+        cols = [batch.p.astype(np.int64), batch.serial.astype(np.int64) // 10, batch.lot.astype(np.int64),
+                np.ones(len(batch), dtype=np.int64)]
+        coef = np.arange(10)
+        terms = [(c[:, None] * coef) % 10 for c in cols]
+        return _chunked(lambda lo, hi: residue_bits([t[lo:hi] for t in terms], 10, cal[lo:hi]), len(batch), self.size)
+
+    def decode(self, index):
+        return dict(zip("kmlC", (int(v) for v in np.unravel_index(index, (10,) * 4))))
+
+
+class CyclicSpace:
+
+    def __init__(self, L, modes=tuple(MODES), alphabet=WEIGHTS_1_9):
+        self.L = L
+        self.modes = tuple(modes)
+        self.alphabet = alphabet
+        self.patterns = pattern_count(L, alphabet)
+        self.size = len(self.modes) * self.patterns
+        self.name = f"cyclic L={L}"
+
+    def bitsets(self, digits):
+        # (n, 20) digit matrix -> (n, size / 8) packed acceptance bits, one
+        # pattern block per mode
+        digits = np.asarray(digits)
+        folded = fold_cyclic(digits[:, :19], self.L)
+        alpha = np.asarray(self.alphabet, dtype=np.int64)
+
+        def bits(lo, hi):
+            out = []
+            for mode in self.modes:
+                modulus, targets = mode_targets(digits[lo:hi, 19], mode)
+                terms = [(folded[lo:hi, r, None] * alpha) % modulus for r in range(self.L)]
+                out.append(residue_bits(terms, modulus, targets))
+            return np.concatenate(out, axis=1)
+
+        return _chunked(bits, len(digits), self.size)
+
+    def decode(self, index):
+        mode, row = divmod(int(index), self.patterns)
+        pattern = pattern_block(row, row + 1, self.L, self.alphabet)[0]
+        return {"mode": self.modes[mode], "pattern": tuple(int(w) for w in pattern)}
+
+
+class BitsetIndex:
+    # Running AND of the sample bitsets over one space; with keep=False only
+    # the AND is kept (constant memory, no per-sample queries)
+
+    def __init__(self, space, keep=True):
+        self.space = space
+        self.keep = keep
+        self.nbytes = -(-space.size // 8)
+        self.samples = 0
+        self._rows = []
+        self._stacked = None
+        # Padding bits past the end of the space never survive
+        self.survivors = np.packbits(np.ones(space.size, dtype=bool))
+
+    def __len__(self):
+        return self.samples
+
+    def add(self, digits):
+        # Add samples ((n, 20) digits); -> surviving hypothesis count
+        bits = self.space.bitsets(digits)
+        if len(bits):
+            self.survivors &= np.bitwise_and.reduce(bits, axis=0)
+            self.samples += len(bits)
+            if self.keep:
+                self._rows.append(bits)
+                self._stacked = None
+        return self.count()
+
+    def rows(self):
+        # (samples, nbytes) packed bitsets
+        if not self.keep:
+            raise ValueError("index was built with keep=False")
+        if self._stacked is None:
+            self._stacked = np.concatenate(self._rows) if self._rows else np.zeros((0, self.nbytes), dtype=np.uint8)
+            self._rows = [self._stacked]
+        return self._stacked
+
+    def count(self, bits=None):
+        bits = self.survivors if bits is None else bits
+        return int(np.unpackbits(bits, count=self.space.size).sum())
+
+    def surviving(self, bits=None, limit=None):
+        # Hypothesis indices set in `bits` (default: the survivors), ascending
+        bits = self.survivors if bits is None else bits
+        idx = np.flatnonzero(np.unpackbits(bits, count=self.space.size))
+        return idx if limit is None else idx[:limit]
+
+    def hypotheses(self, limit=None, bits=None):
+        return [self.space.decode(i) for i in self.surviving(bits, limit).tolist()]
+
+    def accepts(self, index):
+        # Per-sample acceptance of one hypothesis
+        byte, bit = divmod(int(index), 8)
+        return (self.rows()[:, byte] >> (7 - bit)) & 1 == 1
+
+    def survivors_without(self, samples):
+        # AND over every sample except `samples` (indices or mask)
+        keep = np.ones(self.samples, dtype=bool)
+        keep[samples] = False
+        rows = self.rows()[keep]
+        if not len(rows):
+            return np.packbits(np.ones(self.space.size, dtype=bool))
+        return np.bitwise_and.reduce(rows, axis=0)
+
+
+def spaces(max_length=MAX_LENGTH):
+    return [CoefficientSpace()] + [CyclicSpace(L) for L in range(2, max_length + 1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Surviving checksum hypotheses per group via sample bitsets")
+    parser.add_argument("--anchors", default=None, help="anchor file (default: the golden samples)")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH, help="longest cyclic pattern")
+    parser.add_argument("--show", type=int, default=3, help="survivors printed per space")
+    args = parser.parse_args()
+
+    store = golden_store() if args.anchors is None else load_store(args.anchors)
+    groups = {"ALL": np.arange(len(store))}
+    groups.update({key: np.asarray(rows) for key, rows in store.groups().items()})
+    for space in spaces(args.max_length):
+        print(f"{space.name} ({space.size:,} hypotheses, {-(-space.size // 8):,} bytes per sample)")
+        for key, rows in groups.items():
+            index = BitsetIndex(space, keep=False)
+            index.add(store.digits[rows])
+            shown = ", ".join(str(h) for h in index.hypotheses(args.show))
+            print(f"  {key} ({rows.size} samples): {index.count():,} survive" + (f": {shown}" if shown else ""))
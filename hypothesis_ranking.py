@@ -0,0 +1,79 @@
+
+import heapq
+from collections import namedtuple
+
+import numpy as np
+
+from weight_search import MODES, accepts, expand
+
+# Ranking mode for the pattern sweeps.
+#
+# Instead of stopping at the first pattern that fits every sample, a sweep
+# keeps the best K hypotheses per group by number of samples matched. Every
+# chunk a worker scores comes back as its own top K (weight_search.rank_block)
+# and the parent merges them into one bounded heap per group, across workers
+# and pattern lengths. Ranking is a total order (more matches, then shorter
+# pattern, then lower pattern index, then mode order), so the merged result
+# does not depend on how the space was chunked or which worker finished first.
+#
+# The heap root is the weakest kept hypothesis; anything not beating it is
+# dropped in O(1), so memory stays at K entries per group.
+
+Hypothesis = namedtuple("Hypothesis", "matches total L index mode pattern failing")
+
+_MODE_RANK = {mode: i for i, mode in enumerate(MODES)}
+
+
+def _key(matches, L, idx, mode):
+    # Larger is better
+    return (matches, -L, -idx, -_MODE_RANK.get(mode, len(_MODE_RANK)))
+
+
+class TopK:
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, matches, L, idx, mode, pattern):
+        item = (_key(matches, L, idx, mode), (matches, L, idx, mode, tuple(pattern)))
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def extend(self, L, ranked):
+        # ranked: (matches, idx, mode, pattern) as returned by rank_block
+        for matches, idx, mode, pattern in ranked:
+            self.push(matches, L, idx, mode, pattern)
+
+    def merge(self, other):
+        for _, (matches, L, idx, mode, pattern) in other._heap:
+            self.push(matches, L, idx, mode, pattern)
+        return self
+
+    def floor(self):
+        # Matches a new hypothesis needs to have a chance of getting in
+        return self._heap[0][0][0] if len(self._heap) >= self.k else 0
+
+    def entries(self):
+        # (matches, L, idx, mode, pattern), best first
+        return [entry for _, entry in sorted(self._heap, reverse=True)]
+
+    def hypotheses(self, X, checks, ids=None):
+        # Best first, with the IDs of the samples each hypothesis gets wrong
+        ids = np.arange(len(X)) if ids is None else np.asarray(ids)
+        out = []
+        for matches, L, idx, mode, pattern in self.entries():
+            ok = accepts(pattern, X, checks, mode)
+            out.append(Hypothesis(matches, len(X), L, idx, mode, pattern, ids[~ok].tolist()))
+        return out
+
+
+def format_hypothesis(h):
+    failing = ", ".join(str(i) for i in h.failing) or "none"
+    return (f"{h.matches}/{h.total} ({h.mode}, L={h.L}) pattern {h.pattern} "
+            f"-> weights {expand(h.pattern)}; fails: {failing}")
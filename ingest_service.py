@@ -0,0 +1,340 @@
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+from anchor_index import AnchorIndex
+from anchor_store import ANCHORS_PATH, AnchorStore, iter_records
+from batch_generate import cases_from_store, validate_cases
+from hypothesis_bitset import BitsetIndex, CoefficientSpace
+from slope_fit import SlopeFitter, service_store
+from weight_search import MODES, WEIGHTS_1_9, expand, mode_targets, pattern_block, pattern_count
+
+# Long-running ingestion service that keeps the solver state hot.
+#
+# A drop directory is polled for scanned label exports (JSON, JSON Lines or
+# CSV anchor records, the formats anchor_store reads). A file is ingested once
+# its size and mtime have been stable for one poll, so half-written exports
+# are left alone. New labels (codes not seen before) are
+#   - appended to the in-memory AnchorStore and to a JSON Lines journal,
+#     which is replayed on the next start
+#   - fed to the incremental SlopeFitter (only the new pairs are voted)
+#   - scored against every short cyclic weight pattern: per group, the
+#     number of labels each (pattern, mode) accepts is a running count, so
+#     the ranking is one small matrix product per label away
+#   - intersected into the group's (k, m, l, C) bitset (hypothesis_bitset),
+#     so the coefficient sets every label of the group accepts are kept
+# so a new scan is reflected in milliseconds, not a full rerun.
+#
+# Queries are JSON lines over a local socket (TCP on 127.0.0.1 or a Unix
+# socket), one response line per request:
+#   {"op": "validate", "codes": ["03421240831305186967"]}
+#   {"op": "model", "group": "022_R2"}
+#   {"op": "ingest", "records": [{"ic": "034", "rt": "R1", "s": "8696", "f": "..."}]}
+#   {"op": "stats"}
+#
+#   python ingest_service.py drop/
+#   python ingest_service.py --query '{"op": "model", "group": "034_R1"}'
+
+JOURNAL_PATH = os.path.join("wwwroot", "data", "barcode_anchors.ingested.jsonl")
+DROP_EXTENSIONS = (".json", ".jsonl", ".ndjson", ".csv")
+HOST = "127.0.0.1"
+PORT = 8765
+POLL_SECONDS = 1.0
+MAX_LENGTH = 4
+TOP = 5
+CHUNK_ROWS = 4096
+
+
+class RankingTable:
+    # Running match counts of every cyclic pattern of length 1..max_length
+    # (weights from the alphabet) under every mode, per group
+
+    def __init__(self, max_length=MAX_LENGTH, modes=tuple(MODES), alphabet=WEIGHTS_1_9):
+        self.modes = tuple(modes)
+        lengths, index, weights = [], [], []
+        for L in range(1, max_length + 1):
+            n = pattern_count(L, alphabet)
+            pats = pattern_block(0, n, L, alphabet)
+            lengths.append(np.full(n, L))
+            index.append(np.arange(n))
+            weights.append(np.array([expand(p) for p in pats.tolist()], dtype=np.int64))
+        self.L = np.concatenate(lengths)
+        self.index = np.concatenate(index)
+        self.W = np.concatenate(weights)
+        self.counts = {}
+        self.totals = {}
+
+    def add(self, group, X, checks):
+        counts = self.counts.setdefault(group, np.zeros((self.W.shape[0], len(self.modes)), dtype=np.int64))
+        X = np.asarray(X, dtype=np.int64)
+        for lo in range(0, X.shape[0], CHUNK_ROWS):
+            sums = self.W @ X[lo:lo + CHUNK_ROWS].T
+            for m, mode in enumerate(self.modes):
+                modulus, targets = mode_targets(checks[lo:lo + CHUNK_ROWS], mode)
+                counts[:, m] += (sums % modulus == targets).sum(axis=1)
+        self.totals[group] = self.totals.get(group, 0) + X.shape[0]
+
+    def top(self, group, k=TOP):
+        # Best k, ordered like hypothesis_ranking.TopK: more matches, shorter
+        # pattern, lower pattern index, mode order
+        counts = self.counts.get(group)
+        if counts is None:
+            return []
+        c = counts.ravel()
+        rows = np.repeat(np.arange(counts.shape[0]), len(self.modes))
+        mode = np.tile(np.arange(len(self.modes)), counts.shape[0])
+        order = np.lexsort((mode, self.index[rows], self.L[rows], -c))[:k]
+        out = []
+        for t in order.tolist():
+            r = rows[t]
+            pattern = tuple(int(w) for w in self.W[r, :self.L[r]])
+            out.append({"matches": int(c[t]), "total": self.totals[group], "L": int(self.L[r]),
+                        "mode": self.modes[mode[t]], "pattern": pattern})
+        return out
+
+
+class IngestState:
+
+    def __init__(self, store=None, journal=JOURNAL_PATH, max_length=MAX_LENGTH, top=TOP):
+        self.store = AnchorStore()
+        self.journal = journal
+        self.top = top
+        self.fitter = SlopeFitter()
+        self.ranking = RankingTable(max_length)
+        self.coefficients = {}
+        self.known = set()
+        self.files = 0
+        self.last_latency = None
+        self._index = None
+        self._slopes = None
+        # The base corpus goes in as is, duplicates included, like the
+        # service's sample list; only later labels are deduplicated
+        self._add_store(service_store() if store is None else store, dedupe=False)
+        if journal and os.path.exists(journal):
+            self._add_store(AnchorStore.from_records(r for r in iter_records(journal) if r.get('f') not in self.known))
+
+    def _add_store(self, new, dedupe=True):
+        if not len(new):
+            return None
+        codes = new.codes()
+        if dedupe:
+            # Known labels and repeats inside the batch: keep the first
+            first = {}
+            for row, code in enumerate(codes):
+                if code not in self.known:
+                    first.setdefault(code, row)
+            rows = np.array(sorted(first.values()), dtype=np.int64)
+            if rows.size < len(new):
+                new = new.select(rows)
+                codes = [codes[r] for r in rows]
+            if not len(new):
+                return None
+        self.known.update(codes)
+        self.store = new if not len(self.store) else AnchorStore(
+            *(np.concatenate([getattr(self.store, c), getattr(new, c)])
+              for c in ("digits", "ic", "rt", "lot", "serial", "p", "serial_numeric")))
+        self.fitter.add_store(new)
+        X, checks = new.x19(), new.checks()
+        self.ranking.add("ALL", X, checks)
+        for key, group_rows in new.groups().items():
+            self.ranking.add(key, X[group_rows], checks[group_rows])
+            index = self.coefficients.get(key)
+            if index is None:
+                index = self.coefficients[key] = BitsetIndex(CoefficientSpace(), keep=False)
+            index.add(new.digits[group_rows])
+        self._index = None
+        self._slopes = None
+        return new
+
+    def ingest(self, records):
+        # -> (labels added, records skipped as malformed)
+        t0 = time.perf_counter()
+        records = [r for r in records if (r.get('f') or "").strip() not in self.known]
+        parsed = AnchorStore.from_records(records)
+        added = self._add_store(parsed)
+        n = len(added) if added is not None else 0
+        if n and self.journal:
+            # The record as received (first one per code, as _add_store keeps),
+            # so the replay parses to the same serial and serial_numeric
+            first = {}
+            for r in records:
+                first.setdefault(r['f'].strip(), r)
+            with open(self.journal, 'a', encoding='utf-8') as f:
+                for code in added.codes():
+                    r = first[code]
+                    f.write(json.dumps({"ic": r.get('ic'), "rt": r.get('rt'), "s": r.get('s'), "f": code}) + "\n")
+        self.last_latency = time.perf_counter() - t0
+        return n, parsed.skipped
+
+    def slopes(self):
+        if self._slopes is None:
+            self._slopes = self.fitter.slopes()
+        return self._slopes
+
+    def validate(self, codes):
+        # Regenerate every label from its own fields with the current model
+        labels = AnchorStore.from_records({'f': c, 'rt': f"R{c.strip()[4:5]}"} for c in codes if c)
+        if self._index is None:
+            self._index = AnchorIndex(self.store)
+        actual, passed = validate_cases(cases_from_store(labels), self.store, self.slopes(), self._index)
+        valid = iter(zip(actual, passed.tolist()))
+        out = []
+        for code in codes:
+            code = (code or "").strip()
+            if len(code) != 20 or not code.isdigit():
+                out.append({"code": code, "error": "not a 20-digit label"})
+                continue
+            expected, ok = next(valid)
+            out.append({"code": code, "valid": ok, "expected": expected, "known": code in self.known})
+        return out
+
+    def model(self, group):
+        s = self.slopes().get(group)
+        return {
+            "group": group,
+            "labels": self.ranking.totals.get(group, 0),
+            "slopes": s._asdict() if s is not None else None,
+            "hypotheses": self.ranking.top(group, self.top),
+            "coefficients": self._coefficients(group),
+        }
+
+    def _coefficients(self, group):
+        # (k, m, l, C) sets accepted by every label of the group
+        index = self.coefficients.get(group)
+        if index is None:
+            return None
+        return {"surviving": index.count(), "first": index.hypotheses(self.top)}
+
+    def stats(self):
+        return {
+            "labels": len(self.store),
+            "groups": {key: int(rows.size) for key, rows in self.store.groups().items()},
+            "files": self.files,
+            "last_ingest_ms": None if self.last_latency is None else round(1000 * self.last_latency, 3),
+        }
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "validate":
+            codes = request.get("codes") or [request.get("code")]
+            return {"ok": True, "results": self.validate(codes)}
+        if op == "model":
+            return {"ok": True, **self.model(request.get("group", "ALL"))}
+        if op == "ingest":
+            added, skipped = self.ingest(request.get("records") or [])
+            return {"ok": True, "added": added, "skipped": skipped}
+        if op == "stats":
+            return {"ok": True, **self.stats()}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+
+def _drop_files(drop):
+    for name in sorted(os.listdir(drop)):
+        path = os.path.join(drop, name)
+        if name.startswith(".") or os.path.splitext(name)[1].lower() not in DROP_EXTENSIONS:
+            continue
+        if os.path.isfile(path):
+            st = os.stat(path)
+            yield path, (st.st_mtime_ns, st.st_size)
+
+
+async def watch(state, drop, poll=POLL_SECONDS, log=print):
+    # Ingests every export that stayed unchanged for one poll; a rewritten
+    # file is ingested again (already known labels are skipped)
+    done = {}
+    seen = {}
+    while True:
+        current = dict(_drop_files(drop))
+        for path, sig in current.items():
+            if done.get(path) == sig or seen.get(path) != sig:
+                continue
+            try:
+                records = await asyncio.to_thread(lambda: list(iter_records(path)))
+            except (OSError, ValueError) as e:
+                log(f"[ingest] {path}: {e}")
+                done[path] = sig
+                continue
+            added, skipped = state.ingest(records)
+            state.files += 1
+            done[path] = sig
+            log(f"[ingest] {path}: {added} new labels, {skipped} skipped "
+                f"({1000 * state.last_latency:.1f} ms, {len(state.store)} total)")
+        seen = current
+        await asyncio.sleep(poll)
+
+
+async def _client(state, reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                response = state.handle(json.loads(line))
+            except (ValueError, TypeError, AttributeError) as e:
+                response = {"ok": False, "error": str(e)}
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(state, drop=None, poll=POLL_SECONDS, host=HOST, port=PORT, socket_path=None, log=print):
+    handler = lambda r, w: _client(state, r, w)
+    if socket_path:
+        server = await asyncio.start_unix_server(handler, path=socket_path)
+        log(f"[ingest] listening on {socket_path}")
+    else:
+        server = await asyncio.start_server(handler, host, port)
+        log(f"[ingest] listening on {host}:{port}")
+    async with server:
+        tasks = [asyncio.create_task(server.serve_forever())]
+        if drop:
+            os.makedirs(drop, exist_ok=True)
+            tasks.append(asyncio.create_task(watch(state, drop, poll, log)))
+        await asyncio.gather(*tasks)
+
+
+def query(request, host=HOST, port=PORT, socket_path=None, timeout=10.0):
+    # Blocking client for one request
+    if socket_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    else:
+        sock = socket.create_connection((host, port), timeout)
+    with sock, sock.makefile('rwb') as f:
+        f.write((json.dumps(request) + "\n").encode("utf-8"))
+        f.flush()
+        return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch a drop directory and answer model queries over a socket")
+    parser.add_argument("drop", nargs="?", default=None, help="drop directory of scanned label exports")
+    parser.add_argument("--anchors", default=ANCHORS_PATH, help="base anchor file")
+    parser.add_argument("--journal", default=JOURNAL_PATH, help="JSON Lines file new labels are appended to")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--socket", default=None, help="Unix socket path instead of TCP")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH, help="longest cyclic pattern ranked")
+    parser.add_argument("--top", type=int, default=TOP)
+    parser.add_argument("--query", default=None, help="send one JSON request to a running service and exit")
+    args = parser.parse_args()
+
+    if args.query:
+        print(json.dumps(query(json.loads(args.query), args.host, args.port, args.socket), indent=2))
+    else:
+        state = IngestState(service_store(args.anchors), args.journal, args.max_length, args.top)
+        print(f"[ingest] {len(state.store)} labels loaded")
+        try:
+            asyncio.run(serve(state, args.drop, args.poll, args.host, args.port, args.socket))
+        except KeyboardInterrupt:
+            pass
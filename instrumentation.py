@@ -0,0 +1,256 @@
+
+import cProfile
+import glob
+import io
+import json
+import os
+import pstats
+import time
+
+# Progress, throughput and profiling for the long-running searches.
+#
+# A Metrics object is handed to a search (parallel_search.parallel_sweep /
+# parallel_rank, prune_search.search_weights) and receives one record per
+# finished unit of work, keyed by what is being swept ("ALL L=5"):
+#   candidates  hypotheses scored (patterns x modes, or partial assignments)
+#   samples     sample evaluations (candidates x samples)
+#   pruned      candidates dropped without being scored to the end
+#   skipped     planned candidates never scored (early stop, checkpoint resume)
+#   hits        hypotheses that fit
+# plus the worker (pid) that did it and how long it took. Every `every`
+# seconds a progress line per active key is printed with throughput and an
+# ETA against the planned total, followed by per-worker rates and ETAs; the
+# same numbers can be written to a JSON metrics file. Workers take chunks from
+# one shared pool, so a worker's ETA is the time it needs, at its own busy
+# rate, for an even share of the candidates still planned; workers of a pool
+# that is already gone get none.
+#
+# With profile=path the parent runs under cProfile and pool workers profile
+# every chunk they score into path.<pid>; close() merges them into `path`
+# and prints the top functions.
+
+REPORT_EVERY = 10.0
+
+
+def _fmt_eta(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class _Counter:
+
+    def __init__(self):
+        self.total = None
+        self.candidates = 0
+        self.samples = 0
+        self.pruned = 0
+        self.skipped = 0
+        self.hits = 0
+        self.busy = 0.0
+        self.started = None
+        self.updated = None
+
+    def remaining(self):
+        if self.total is None:
+            return None
+        return max(0, self.total - self.candidates - self.skipped)
+
+    def to_dict(self, now):
+        elapsed = (self.updated or now) - self.started if self.started else 0.0
+        rate = self.candidates / elapsed if elapsed > 0 else None
+        rem = self.remaining()
+        return {
+            "total": self.total, "candidates": self.candidates, "samples": self.samples,
+            "pruned": self.pruned, "skipped": self.skipped, "hits": self.hits,
+            "pruning_rate": self.pruned / self.candidates if self.candidates else None,
+            "busy_seconds": round(self.busy, 3), "elapsed_seconds": round(elapsed, 3),
+            "candidates_per_second": rate,
+            "eta_seconds": rem / rate if rate and rem is not None else None,
+        }
+
+
+class _WorkerCounter(_Counter):
+    # Per-worker totals; a worker has no plan of its own, so its remaining
+    # work is handed in by Metrics.snapshot
+
+    def to_dict(self, now, remaining=None):
+        elapsed = (self.updated or now) - self.started if self.started else 0.0
+        busy_rate = self.candidates / self.busy if self.busy > 0 else None
+        return {
+            "candidates": self.candidates, "samples": self.samples, "pruned": self.pruned, "hits": self.hits,
+            "pruning_rate": self.pruned / self.candidates if self.candidates else None,
+            "busy_seconds": round(self.busy, 3), "elapsed_seconds": round(elapsed, 3),
+            "candidates_per_second": self.candidates / elapsed if elapsed > 0 else None,
+            "busy_candidates_per_second": busy_rate,
+            "remaining": remaining,
+            "eta_seconds": remaining / busy_rate if busy_rate and remaining is not None else None,
+        }
+
+
+class Metrics:
+
+    def __init__(self, name="search", every=REPORT_EVERY, path=None, profile=None, log=print):
+        self.name = name
+        self.every = every
+        self.path = path
+        self.profile = profile
+        self.log = log
+        self.keys = {}
+        self.workers = {}
+        self.started = time.monotonic()
+        self._last_report = self.started
+        self._profiler = None
+        if profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def _key(self, key):
+        c = self.keys.get(key)
+        if c is None:
+            c = self.keys[key] = _Counter()
+        return c
+
+    def plan(self, key, total):
+        # Announce the number of candidates `key` will score
+        c = self._key(key)
+        c.total = (c.total or 0) + total
+
+    def add(self, key, candidates, samples=0, pruned=0, hits=0, worker=None, seconds=0.0):
+        now = time.monotonic()
+        for c in (self._key(key), self.workers.setdefault(worker, _WorkerCounter()) if worker is not None else None):
+            if c is None:
+                continue
+            if c.started is None:
+                c.started = now - seconds
+            c.candidates += candidates
+            c.samples += samples
+            c.pruned += pruned
+            c.hits += hits
+            c.busy += seconds
+            c.updated = now
+        self.tick()
+
+    def skip(self, key, candidates):
+        self._key(key).skipped += candidates
+
+    def snapshot(self):
+        now = time.monotonic()
+        keys = {k: c.to_dict(now) for k, c in self.keys.items()}
+        # Even share of the planned candidates left among the live workers:
+        # those that reported since the earliest unfinished key started (the
+        # searches start a new pool per sweep, so older pids are gone)
+        open_keys = [c for c in self.keys.values() if c.remaining() and c.started is not None]
+        since = min((c.started for c in open_keys), default=None)
+        live = [w for w, c in self.workers.items() if since is not None and c.updated >= since]
+        share = sum(c.remaining() for c in self.keys.values() if c.total is not None) / len(live) if live else None
+        workers = {str(w): c.to_dict(now, share if w in live else None) for w, c in self.workers.items()}
+        return {"name": self.name, "elapsed_seconds": round(now - self.started, 3), "keys": keys, "workers": workers}
+
+    def lines(self, since=None):
+        # Progress lines for the keys and workers updated since `since` (all when None)
+        snap = self.snapshot()
+        active = lambda c: c.updated is not None and (since is None or c.updated >= since)
+        out = []
+        for key, d in snap["keys"].items():
+            if not d["candidates"] or not active(self.keys[key]):
+                continue
+            done = d["candidates"] + d["skipped"]
+            line = f"  [{self.name}] {key}: {d['candidates']:,} scored"
+            if d["total"]:
+                line += f" ({100.0 * done / d['total']:.1f}% of {d['total']:,})"
+            if d["candidates_per_second"]:
+                line += f", {d['candidates_per_second']:,.0f}/s"
+            if d["pruned"]:
+                line += f", {100.0 * d['pruning_rate']:.1f}% pruned"
+            if d["total"]:
+                line += f", ETA {_fmt_eta(d['eta_seconds'])}"
+            out.append(line)
+        for w, d in snap["workers"].items():
+            if not active(self.workers[int(w)]):
+                continue
+            out.append(f"    worker {w}: {d['candidates']:,} scored, "
+                       f"{d['busy_candidates_per_second'] or 0.0:,.0f}/s busy, ETA {_fmt_eta(d['eta_seconds'])}")
+        return out
+
+    def write(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp, self.path)
+
+    def report(self, since=None):
+        for line in self.lines(since):
+            self.log(line)
+        self.write()
+        self._last_report = time.monotonic()
+
+    def tick(self):
+        # Cheap enough to call after every chunk
+        if self.every is not None and time.monotonic() - self._last_report >= self.every:
+            self.report(self._last_report)
+
+    def close(self, top=25):
+        # Final report over everything; with profiling, merge and print the profiles
+        self.report()
+        if self._profiler:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile + ".parent")
+            stats = merge_profiles(self.profile)
+            if stats:
+                stats.dump_stats(self.profile)
+                buf = io.StringIO()
+                stats.stream = buf
+                stats.sort_stats("cumulative").print_stats(top)
+                self.log(buf.getvalue())
+            self._profiler = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def merge_profiles(path):
+    # The parent's and every worker's profile under `path` as one pstats.Stats
+    files = sorted(glob.glob(glob.escape(path) + ".*"))
+    if not files:
+        return None
+    stats = pstats.Stats(files[0])
+    for f in files[1:]:
+        stats.add(f)
+    for f in files:
+        os.remove(f)
+    return stats
+
+
+class WorkerProfile:
+    # Pool-worker side of the cProfile toggle: profiles the calls it runs and
+    # keeps path.<pid> up to date, since pool workers exit without a hook
+
+    def __init__(self, path):
+        self.path = f"{path}.{os.getpid()}"
+        self.profiler = cProfile.Profile()
+
+    def run(self, fn, *args):
+        self.profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+
+
+def timed(fn, *args):
+    # Worker-side wrapper: (pid, seconds, result)
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return os.getpid(), time.perf_counter() - t0, result
@@ -0,0 +1,238 @@
+
+import argparse
+import json
+
+import numpy as np
+
+# Bulk decoder for scanned 20-digit labels.
+#
+# The one place the label layout lives (0-based, half-open):
+#   0-3 item code | 3 bottle | 4 reagent | 5-11 yyMMdd | 11 P | 12-15 lot
+#   15-19 serial  | 19 checksum
+# A batch of codes is joined into one byte buffer, viewed as an (n, 20)
+# matrix and every field is a small matrix product over its columns, so
+# decoding is a handful of array operations however many labels there are.
+# Each row also gets a bit mask of sanity problems (REASONS); malformed rows
+# are flagged, not dropped, so row numbers stay aligned with the input.
+#
+#   python label_decoder.py scans.txt            # one code per line
+#   python label_decoder.py scans.txt --json     # problem rows as JSON Lines
+
+CODE_LEN = 20
+
+FIELDS = {
+    "item": (0, 3),
+    "bottle": (3, 4),
+    "reagent": (4, 5),
+    "date": (5, 11),
+    "p": (11, 12),
+    "lot": (12, 15),
+    "serial": (15, 19),
+    "checksum": (19, 20),
+}
+
+chem_map = {
+    "001": "GLUCOSE", "002": "CHOLESTEROL", "003": "TRIGLYCERIDES", "004": "ALBUMIN",
+    "005": "TOTAL PROTEIN", "006": "BIL TOTAL", "007": "BILIRUBIN DIRECT", "009": "UA II GEN",
+    "010": "UREA II GEN", "012": "MAGNESIUM", "013": "PHOSPHORUS", "015": "ALAT",
+    "016": "ASAT", "017": "AMYLASE", "018": "ALP", "019": "CK", "020": "LDH",
+    "022": "GGT", "024": "GTT", "025": "HDL DIRECT", "026": "LDL DIRECT",
+    "027": "CRP ULTRA", "031": "RF", "074": "TOTAL IgE", "059": "CALCIUM ARSENAZO",
+    "061": "HbA1c DIRECT", "071": "CREA ENZ"
+}
+
+# Item codes a label may carry: chem_map plus the IgE code of the golden
+# samples (Models/ChemicalData.cs)
+KNOWN_ITEMS = frozenset(int(code) for code in chem_map) | {34}
+
+BOTTLES = {1: "20 ml", 2: "40 ml", 3: "60 ml"}
+
+# Problem flags
+LENGTH, NON_DIGIT, UNKNOWN_ITEM, BAD_BOTTLE, BAD_REAGENT, BAD_DATE = 1, 2, 4, 8, 16, 32
+REASONS = {
+    LENGTH: "not 20 characters",
+    NON_DIGIT: "non-digit character",
+    UNKNOWN_ITEM: "unknown item code",
+    BAD_BOTTLE: "bottle code not 1-3",
+    BAD_REAGENT: "reagent code not 1-2",
+    BAD_DATE: "impossible yyMMdd expiry",
+}
+
+# Days per month indexed by the two MM digits (0 for anything but 01-12)
+_MONTH_DAYS = np.zeros(100, dtype=np.int64)
+_MONTH_DAYS[1:13] = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+# Day number (since 1970-01-01) of the 1st of every month 2000-01 .. 2099-12
+_MONTH_START = (np.arange(1200) + 360).astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+_POW10 = {w: 10 ** np.arange(w - 1, -1, -1, dtype=np.int64) for w in range(1, CODE_LEN + 1)}
+
+
+def field_values(digits, name, dtype=np.int64):
+    # Integer value of one field for every row of an (n, 20) digit matrix
+    lo, hi = FIELDS[name]
+    return (digits[:, lo:hi] @ _POW10[hi - lo].astype(dtype)).astype(dtype)
+
+
+def date_fields(date_digits):
+    # (n, 6) yyMMdd digits -> (yy, mm, dd, valid) int16 columns; valid is
+    # False for impossible dates
+    d = np.asarray(date_digits)
+    yy, mm, dd = (d[:, i].astype(np.int16) * 10 + d[:, i + 1] for i in (0, 2, 4))
+    # 2000-2099: the leap years are the multiples of 4
+    month_len = _MONTH_DAYS[mm] + ((mm == 2) & (yy % 4 == 0))
+    valid = (dd >= 1) & (dd <= month_len)
+    return yy, mm, dd, valid
+
+
+def _raw_matrix(codes):
+    # -> ((n, 20) uint8 character matrix, per-row length); rows of another
+    # length are left-aligned and padded with "0"
+    n = len(codes)
+    lengths = np.fromiter(map(len, codes), dtype=np.int64, count=n)
+    if (lengths == CODE_LEN).all():
+        buf = "".join(codes).encode("ascii", "replace")
+        return np.frombuffer(buf, dtype=np.uint8).reshape(n, CODE_LEN), lengths
+    raw = np.full((n, CODE_LEN), ord("0"), dtype=np.uint8)
+    good = np.flatnonzero(lengths == CODE_LEN)
+    if good.size:
+        buf = "".join([codes[i] for i in good.tolist()]).encode("ascii", "replace")
+        raw[good] = np.frombuffer(buf, dtype=np.uint8).reshape(-1, CODE_LEN)
+    for i in np.flatnonzero(lengths != CODE_LEN).tolist():
+        b = codes[i][:CODE_LEN].encode("ascii", "replace")
+        raw[i, :len(b)] = np.frombuffer(b, dtype=np.uint8)
+    return raw, lengths
+
+
+class LabelBatch:
+    # Typed columns of a decoded batch; row i of every column is input i
+
+    def __init__(self, codes, raw, lengths, items=KNOWN_ITEMS):
+        self.codes = codes
+        self.raw = raw
+        digits = raw - np.uint8(ord("0"))
+        # Characters below "0" wrap around, so anything but a digit is > 9
+        bad = digits > 9
+        non_digit = np.zeros(len(raw), dtype=bool)
+        if bad.any():
+            non_digit = bad.any(axis=1)
+            digits[bad] = 0
+        self.digits = digits
+
+        self.item = field_values(digits, "item", np.uint16)
+        self.bottle = digits[:, 3]
+        self.reagent = digits[:, 4]
+        self.p = digits[:, 11]
+        self.lot = field_values(digits, "lot", np.uint16)
+        self.serial = field_values(digits, "serial", np.uint16)
+        self.checksum = digits[:, 19]
+        yy, mm, dd, valid = date_fields(digits[:, 5:11])
+        self.yy, self.mm, self.dd = yy.astype(np.uint8), mm.astype(np.uint8), dd.astype(np.uint8)
+        day = _MONTH_START[yy * 12 + np.clip(mm, 1, 12) - 1] + dd - 1
+        self.expiry = np.where(valid, day, np.datetime64("NaT").astype(np.int64)).astype("datetime64[D]")
+
+        known = np.zeros(1000, dtype=bool)
+        known[list(items)] = True
+        flags = np.zeros(len(raw), dtype=np.uint8)
+        flags |= np.where(lengths != CODE_LEN, LENGTH, 0).astype(np.uint8)
+        flags |= np.where(non_digit, NON_DIGIT, 0).astype(np.uint8)
+        flags |= np.where(~known[self.item], UNKNOWN_ITEM, 0).astype(np.uint8)
+        flags |= np.where((self.bottle < 1) | (self.bottle > 3), BAD_BOTTLE, 0).astype(np.uint8)
+        flags |= np.where((self.reagent < 1) | (self.reagent > 2), BAD_REAGENT, 0).astype(np.uint8)
+        flags |= np.where(~valid, BAD_DATE, 0).astype(np.uint8)
+        # The fields of a code with the wrong length are not where the checks look
+        short = lengths != CODE_LEN
+        flags[short] &= LENGTH | NON_DIGIT
+        self.flags = flags
+
+    def __len__(self):
+        return len(self.flags)
+
+    @property
+    def ok(self):
+        return self.flags == 0
+
+    def reasons(self, row):
+        return [text for flag, text in REASONS.items() if self.flags[row] & flag]
+
+    def problems(self):
+        # (row, code, reasons) for every flagged row
+        for row in np.flatnonzero(self.flags).tolist():
+            yield row, self.code(row), self.reasons(row)
+
+    def counts(self):
+        return {text: int(((self.flags & flag) != 0).sum()) for flag, text in REASONS.items()}
+
+    def code(self, row):
+        if self.codes is not None:
+            return self.codes[row]
+        return self.raw[row].tobytes().decode("ascii")
+
+    def strings(self):
+        # The codes as 20-character strings
+        if self.codes is not None:
+            return list(self.codes)
+        return np.ascontiguousarray(self.raw).view(f"S{CODE_LEN}").ravel().astype(f"U{CODE_LEN}").tolist()
+
+    def text_fields(self):
+        # (bottle, lot, serial, expiry) string lists in TestCase form; rows of
+        # another length are aligned on their end (checksum last), as the
+        # scanner exports were always read
+        bottle = np.array(["20 ml"] * 10, dtype=object)
+        for b, text in BOTTLES.items():
+            bottle[b] = text
+        bottles = bottle[self.digits[:, 3]]
+        chars = np.ascontiguousarray(self.raw)
+
+        def cols(lo, hi):
+            return np.ascontiguousarray(chars[:, lo:hi]).view(f"S{hi - lo}").ravel().astype(f"U{hi - lo}")
+
+        lots, serials = cols(12, 15).tolist(), cols(15, 19).tolist()
+        yy, mm, dd = cols(5, 7), cols(7, 9), cols(9, 11)
+        expiry = np.char.add(np.char.add(np.char.add(np.char.add(mm, "/"), dd), "/20"), yy).tolist()
+        bottles = bottles.tolist()
+        # Odd rows are sliced from the original text
+        if self.codes is not None:
+            for row in np.flatnonzero(self.flags & (LENGTH | NON_DIGIT)).tolist():
+                bottles[row], lots[row], serials[row], expiry[row] = _text_fields(self.codes[row])
+        return bottles, lots, serials, expiry
+
+
+def _text_fields(f):
+    # Fields of one code; when it is not 20 characters long, lot and serial
+    # are taken relative to the checksum at the end
+    total = len(f)
+    bottle = BOTTLES.get(int(f[3]), "20 ml") if total > 3 and f[3] in "123" else "20 ml"
+    lot = f[total - 8:total - 5] if total >= 10 else "000"
+    serial = f[total - 5:total - 1] if total >= 5 else "0000"
+    expiry = f"{f[7:9]}/{f[9:11]}/20{f[5:7]}" if total >= 11 else "01/01/2025"
+    return bottle, lot, serial, expiry
+
+
+def decode_labels(codes, items=KNOWN_ITEMS):
+    # List of code strings, or an (n, 20) digit matrix -> LabelBatch
+    if isinstance(codes, np.ndarray):
+        digits = np.asarray(codes, dtype=np.uint8).reshape(-1, CODE_LEN)
+        return LabelBatch(None, digits + np.uint8(ord("0")), np.full(len(digits), CODE_LEN), items)
+    codes = list(codes)
+    raw, lengths = _raw_matrix(codes)
+    return LabelBatch(codes, raw, lengths, items)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode and sanity-check scanned labels (one code per line)")
+    parser.add_argument("path")
+    parser.add_argument("--json", action="store_true", help="print problem rows as JSON Lines")
+    args = parser.parse_args()
+
+    with open(args.path, 'r', encoding='utf-8-sig') as f:
+        codes = [line.strip() for line in f if line.strip()]
+    batch = decode_labels(codes)
+    for row, code, reasons in batch.problems():
+        if args.json:
+            print(json.dumps({"line": row + 1, "code": code, "reasons": reasons}))
+        else:
+            print(f"line {row + 1}: {code} -> {', '.join(reasons)}")
+    if not args.json:
+        print(f"{int(batch.ok.sum())}/{len(batch)} labels OK")
+        for text, count in batch.counts().items():
+            if count:
+                print(f"  {count} {text}")
@@ -9,7 +9,7 @@ namespace ReagentBarcode.Controllers
 {
     [ApiController]
     [Route("api/validation")]
-    public class ValidationController : ControllerBase
+    public partial class ValidationController : ControllerBase
     {
         private readonly BarcodeService _barcodeService;
 
@@ -0,0 +1,260 @@
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from anchor_store import ANCHORS_PATH
+from label_decoder import decode_labels
+from result_cache import corpus_hash
+from slope_fit import WSUM_WEIGHTS, Slopes, analyze_calibration_slopes, service_store
+
+# Registry of the fitted per-group service models.
+#
+# BarcodeService rebuilds _calibrationSlopesExtended with the O(n^2) pair
+# vote of AnalyzeCalibrationSlopes on every start. The registry stores the
+# result per ItemCode_RgtType group, with a version and fit statistics, in
+# wwwroot/data/calibration_slopes.json; the service loads that file at
+# startup and only re-analyzes when it was written for a different sample
+# list. source records the sample count and corpus_hash of the codes, and
+# LoadCalibrationSlopes recomputes both over its own samples.
+#
+# Both parts of the service model are affine mod 10, so besides the slopes
+# each group gets the intercepts that make them absolute:
+#   P   = pC   + sum_j pSlopes[j]*SN_j + pLotSlope*lot + pDateSlope*dateSum
+#   Cal = calC + k*P + m*SNTens + lotSlope*lot,   checksum = Cal - WeightedSum
+# (the most common value over the group's anchors). CompiledModels turns the
+# registry into per-group lookup tables, so checking a batch of labels is a
+# few gathers and adds per row; a label agrees with the service whenever its
+# group's anchors agree with each other (stats: pHits, checksumHits).
+#
+# A refit bumps the registry version when any group changed and stamps the
+# changed groups with it; unchanged groups keep their version.
+#
+#   python model_registry.py                      # fit the anchors, write the registry
+#   python model_registry.py --show
+#   python model_registry.py --check scans.txt    # bulk-check labels, one per line
+
+REGISTRY_PATH = os.path.join("wwwroot", "data", "calibration_slopes.json")
+FORMAT = 1
+
+# Slopes field -> artifact name (the C# Slopes struct)
+_ARTIFACT_NAMES = {
+    "p_slopes": "pSlopes", "k": "k", "m": "m", "lot_slope": "lotSlope",
+    "p_lot_slope": "pLotSlope", "p_date_slope": "pDateSlope", "count": "count",
+}
+_PARAMS = ("pSlopes", "k", "m", "lotSlope", "pLotSlope", "pDateSlope", "pC", "calC")
+
+
+def model_columns(batch):
+    # Model inputs per row of a LabelBatch
+    digits = batch.digits.astype(np.int64)
+    serial = batch.serial.astype(np.int64)
+    return {
+        "group": batch.item.astype(np.int64) * 10 + batch.reagent,
+        "p": digits[:, 11],
+        "cal": (digits[:, 19] + digits[:, :19] @ WSUM_WEIGHTS) % 10,
+        "wsum": digits[:, :19] @ WSUM_WEIGHTS,
+        "sn": np.stack([serial // 10 ** j % 10 for j in range(4)], axis=1),
+        "stens": serial // 10,
+        "lot": batch.lot.astype(np.int64),
+        "date": digits[:, 5:11].sum(axis=1),
+    }
+
+
+def _mode(values):
+    # Most common value 0-9 (smallest on ties), 0 for no values
+    if values.size == 0:
+        return 0
+    return int(np.bincount(values, minlength=10).argmax())
+
+
+def intercepts(slopes, cols):
+    # (pC, calC) of one group from the model columns of its anchors
+    p_free = (cols["p"] - cols["sn"] @ np.array(slopes.p_slopes) - slopes.p_lot_slope * cols["lot"]
+              - slopes.p_date_slope * cols["date"]) % 10
+    cal_free = (cols["cal"] - slopes.k * cols["p"] - slopes.m * cols["stens"] - slopes.lot_slope * cols["lot"]) % 10
+    return _mode(p_free), _mode(cal_free)
+
+
+class CompiledModels:
+    # Table-driven evaluator over every group of a registry
+
+    def __init__(self, groups):
+        self.keys = sorted(groups)
+        g = len(self.keys)
+        # ItemCode * 10 + reagent -> table row, -1 for groups without a model
+        self.index = np.full(10000, -1, dtype=np.int64)
+        self.p_sn = np.zeros((g, 4, 10), dtype=np.uint8)
+        self.p_lot = np.zeros((g, 1000), dtype=np.uint8)
+        self.p_date = np.zeros((g, 55), dtype=np.uint8)
+        self.c_p = np.zeros((g, 10), dtype=np.uint8)
+        self.c_stens = np.zeros((g, 1000), dtype=np.uint8)
+        self.c_lot = np.zeros((g, 1000), dtype=np.uint8)
+        self.p_c = np.zeros(g, dtype=np.uint8)
+        self.cal_c = np.zeros(g, dtype=np.uint8)
+        for row, key in enumerate(self.keys):
+            m = groups[key]
+            self.index[int(key[:3]) * 10 + int(key[-1])] = row
+            for j, w in enumerate(m["pSlopes"]):
+                self.p_sn[row, j] = w * np.arange(10) % 10
+            self.p_lot[row] = m["pLotSlope"] * np.arange(1000) % 10
+            self.p_date[row] = m["pDateSlope"] * np.arange(55) % 10
+            self.c_p[row] = m["k"] * np.arange(10) % 10
+            self.c_stens[row] = m["m"] * np.arange(1000) % 10
+            self.c_lot[row] = m["lotSlope"] * np.arange(1000) % 10
+            self.p_c[row] = m["pC"]
+            self.cal_c[row] = m["calC"]
+
+    def predict(self, codes):
+        # -> (table row, P, checksum) per label; row -1 (and P, checksum 0)
+        # where the group has no model
+        cols = model_columns(decode_labels(codes))
+        row = self.index[cols["group"]]
+        g = np.maximum(row, 0)
+        sn = cols["sn"]
+        p = self.p_c[g].astype(np.int64)
+        for j in range(4):
+            p += self.p_sn[g, j, sn[:, j]]
+        p = (p + self.p_lot[g, cols["lot"]] + self.p_date[g, cols["date"]]) % 10
+        cal = (self.cal_c[g].astype(np.int64) + self.c_p[g, p] + self.c_stens[g, cols["stens"]]
+               + self.c_lot[g, cols["lot"]]) % 10
+        checksum = (cal - cols["wsum"]) % 10
+        known = row >= 0
+        return row, np.where(known, p, 0), np.where(known, checksum, 0)
+
+    def check(self, codes):
+        # -> (row, P matches, checksum matches) per label
+        batch = decode_labels(codes)
+        row, p, checksum = self.predict(batch.digits)
+        known = row >= 0
+        return row, known & (p == batch.p), known & (checksum == batch.checksum)
+
+
+class ModelRegistry:
+
+    def __init__(self, groups=None, version=0, source=None, created=None):
+        # groups: key -> artifact dict (see _ARTIFACT_NAMES and _PARAMS)
+        self.groups = groups or {}
+        self.version = version
+        self.source = source or {}
+        self.created = created
+
+    @classmethod
+    def fit(cls, store, previous=None, path=ANCHORS_PATH):
+        # Fit every group of `store`; versions continue from `previous`
+        previous = previous or cls()
+        slopes = analyze_calibration_slopes(store)
+        cols = model_columns(decode_labels(store.digits))
+        rows = store.groups()
+        version = previous.version + 1
+        now = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+        groups = {}
+        for key, s in slopes.items():
+            g = {name: getattr(s, field) for field, name in _ARTIFACT_NAMES.items()}
+            g["pSlopes"] = list(g["pSlopes"])
+            sel = np.asarray(rows.get(key, []), dtype=np.int64)
+            g["pC"], g["calC"] = intercepts(s, {c: v[sel] for c, v in cols.items()})
+            old = previous.groups.get(key)
+            if old is not None and all(old[p] == g[p] for p in _PARAMS):
+                g["version"], g["fitted"] = old["version"], old["fitted"]
+            else:
+                g["version"], g["fitted"] = version, now
+            groups[key] = g
+
+        registry = cls(groups, version, {"anchors": path, "samples": len(store),
+                                         "digest": corpus_hash(store.codes())}, now)
+        # Fit statistics: anchors of each group the compiled model reproduces
+        row, p_ok, cs_ok = registry.compile().check(store.digits)
+        for key, g in groups.items():
+            sel = np.asarray(rows.get(key, []), dtype=np.int64)
+            g["anchors"] = int(sel.size)
+            g["pHits"] = int(p_ok[sel].sum())
+            g["checksumHits"] = int(cs_ok[sel].sum())
+
+        changed = set(groups) != set(previous.groups) or any(g["version"] == version for g in groups.values())
+        if not changed:
+            registry.version = previous.version
+        return registry
+
+    def slopes(self):
+        # The slope_fit dictionary (key -> Slopes), as analyze_calibration_slopes returns it
+        out = {}
+        for key, g in self.groups.items():
+            values = {field: g[name] for field, name in _ARTIFACT_NAMES.items()}
+            values["p_slopes"] = tuple(values["p_slopes"])
+            out[key] = Slopes(**values)
+        return out
+
+    def compile(self):
+        return CompiledModels(self.groups)
+
+    def to_dict(self):
+        return {"format": FORMAT, "version": self.version, "created": self.created,
+                "source": self.source, "groups": self.groups}
+
+    def save(self, path=REGISTRY_PATH):
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=REGISTRY_PATH):
+        with open(path, 'r') as f:
+            d = json.load(f)
+        if d.get("format") != FORMAT:
+            raise ValueError(f"{path}: unsupported registry format {d.get('format')}")
+        return cls(d["groups"], d["version"], d["source"], d["created"])
+
+
+def load_registry(path=REGISTRY_PATH):
+    # Registry on disk, or an empty one if there is none yet
+    if not os.path.exists(path):
+        return ModelRegistry()
+    return ModelRegistry.load(path)
+
+
+def update_registry(anchors=ANCHORS_PATH, path=REGISTRY_PATH):
+    # Refit from the service's sample list and write the registry if it changed
+    previous = load_registry(path)
+    store = service_store(anchors)
+    registry = ModelRegistry.fit(store, previous, anchors)
+    if registry.version != previous.version or registry.source != previous.source:
+        registry.save(path)
+    return registry
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit, show or apply the per-group service model registry")
+    parser.add_argument("--anchors", default=ANCHORS_PATH)
+    parser.add_argument("--registry", default=REGISTRY_PATH)
+    parser.add_argument("--show", action="store_true", help="print the registry without refitting")
+    parser.add_argument("--check", default=None, help="check the labels in a file (one code per line)")
+    args = parser.parse_args()
+
+    if args.check:
+        registry = ModelRegistry.load(args.registry)
+        with open(args.check, 'r', encoding='utf-8-sig') as f:
+            codes = [line.strip() for line in f if line.strip()]
+        batch = decode_labels(codes)
+        rows = np.flatnonzero(batch.ok)
+        compiled = registry.compile()
+        row, p_ok, cs_ok = compiled.check(batch.digits[rows])
+        for r in range(len(compiled.keys)):
+            sel = row == r
+            if sel.any():
+                print(f"{compiled.keys[r]}: {int(cs_ok[sel].sum())}/{int(sel.sum())} checksums, "
+                      f"{int(p_ok[sel].sum())}/{int(sel.sum())} P digits")
+        print(f"{int(cs_ok.sum())}/{len(codes)} labels match the registry "
+              f"({int((row < 0).sum())} without a model, {len(codes) - rows.size} malformed)")
+    else:
+        registry = load_registry(args.registry) if args.show else update_registry(args.anchors, args.registry)
+        print(f"registry v{registry.version} ({registry.source.get('samples', 0)} samples)")
+        for key, g in sorted(registry.groups.items()):
+            print(f"{key} v{g['version']}: pSlopes={g['pSlopes']} k={g['k']} m={g['m']} lotSlope={g['lotSlope']} "
+                  f"pLotSlope={g['pLotSlope']} pDateSlope={g['pDateSlope']} pC={g['pC']} calC={g['calC']} "
+                  f"n={g['count']} checksum {g['checksumHits']}/{g['anchors']}")
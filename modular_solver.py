@@ -0,0 +1,173 @@
+
+import itertools
+
+import numpy as np
+
+# Exact solver for linear congruences A x = b (mod M).
+#
+# Prime moduli (2, 5, 11, ...) are handled with plain Gaussian elimination.
+# Square-free composite moduli are split with the CRT, so Z/10 is solved as
+# Z/2 x Z/5 and the two solution spaces are glued back together:
+#   x = 5 * x2 + 6 * x5 (mod 10)   since 5 = 1 (mod 2), 0 (mod 5)
+#                                  and   6 = 0 (mod 2), 1 (mod 5)
+# The result is the full solution space: one particular solution plus
+# generators of the homogeneous solutions, instead of a brute-force list.
+
+
+def prime_factors(n):
+    factors = []
+    p = 2
+    while p * p <= n:
+        if n % p == 0:
+            factors.append(p)
+            n //= p
+            if n % p == 0:
+                raise ValueError("modulus must be square-free")
+        p += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+
+def rref_mod_prime(A, b, p):
+    # Reduced row echelon form of [A | b] over Z/p.
+    # Returns (R, rhs, pivots) for the rank(A) non-zero rows, or None when
+    # inconsistent. Row i has a 1 in column pivots[i] and is zero in every
+    # other pivot column and in every column left of pivots[i].
+    A = np.asarray(A, dtype=np.int64) % p
+    b = np.asarray(b, dtype=np.int64) % p
+    M = np.concatenate([A, b.reshape(-1, 1)], axis=1)
+    # Repeated congruences add nothing; large corpora have few distinct ones mod p
+    if M.shape[0] > 4 * M.shape[1] and p ** M.shape[1] < 2 ** 62:
+        keys = M @ (p ** np.arange(M.shape[1], dtype=np.int64))
+        _, first = np.unique(keys, return_index=True)
+        M = M[np.sort(first)]
+    rows, cols = M.shape[0], A.shape[1]
+
+    pivots = []
+    r = 0
+    for c in range(cols):
+        if r == rows:
+            break
+        nz = np.flatnonzero(M[r:, c])
+        if nz.size == 0:
+            continue
+        pr = r + nz[0]
+        if pr != r:
+            M[[r, pr]] = M[[pr, r]]
+        M[r] = (M[r] * pow(int(M[r, c]), -1, p)) % p
+        # Clear the pivot column everywhere else (reduced row echelon form)
+        factors = M[:, c].copy()
+        factors[r] = 0
+        M = (M - np.outer(factors, M[r])) % p
+        pivots.append(c)
+        r += 1
+
+    # A zero row with a non-zero right-hand side means no solution
+    if np.any(M[r:, cols] != 0):
+        return None
+    return M[:r, :cols], M[:r, cols], pivots
+
+
+def solve_mod_prime(A, b, p):
+    # Returns (particular, basis) over Z/p, or None when inconsistent
+    red = rref_mod_prime(A, b, p)
+    if red is None:
+        return None
+    R, rhs, pivots = red
+    cols = R.shape[1]
+
+    particular = np.zeros(cols, dtype=np.int64)
+    for i, c in enumerate(pivots):
+        particular[c] = rhs[i]
+
+    basis = []
+    free = [c for c in range(cols) if c not in pivots]
+    for f in free:
+        v = np.zeros(cols, dtype=np.int64)
+        v[f] = 1
+        for i, c in enumerate(pivots):
+            v[c] = (-R[i, f]) % p
+        basis.append(v)
+    return particular, basis
+
+
+class SolutionSpace:
+    # particular + span of the per-prime generators, all mod `modulus`
+
+    def __init__(self, modulus, components):
+        # components: list of (prime, particular, basis) for each prime factor
+        self.modulus = modulus
+        self.components = components
+
+        n = len(components[0][1])
+        self.particular = np.zeros(n, dtype=np.int64)
+        self.basis = []
+        for p, part, basis in components:
+            lift = self._crt_unit(p)
+            self.particular = (self.particular + lift * part) % modulus
+            self.basis.extend((lift * v) % modulus for v in basis)
+
+    def _crt_unit(self, p):
+        # e = 1 (mod p), 0 (mod M / p)
+        rest = self.modulus // p
+        return (rest * pow(rest, -1, p)) % self.modulus if rest > 1 else 1
+
+    def count(self):
+        total = 1
+        for p, _, basis in self.components:
+            total *= p ** len(basis)
+        return total
+
+    def dimension(self):
+        return {p: len(basis) for p, _, basis in self.components}
+
+    def contains(self, x):
+        x = np.asarray(x, dtype=np.int64)
+        for p, part, basis in self.components:
+            if not basis:
+                if np.any((x - part) % p):
+                    return False
+                continue
+            B = np.array(basis).T
+            if solve_mod_prime(B, x - part, p) is None:
+                return False
+        return True
+
+    def solutions(self, limit=None):
+        # Enumerates every solution (there are count() of them)
+        gens = []
+        for p, _, basis in self.components:
+            lift = self._crt_unit(p)
+            gens.extend((p, (lift * v) % self.modulus) for v in basis)
+        ranges = [range(p) for p, _ in gens]
+        for i, coeffs in enumerate(itertools.product(*ranges)):
+            if limit is not None and i >= limit:
+                return
+            x = self.particular.copy()
+            for c, (_, v) in zip(coeffs, gens):
+                x = (x + c * v) % self.modulus
+            yield x
+
+
+def solve_mod(A, b, modulus):
+    # Solution space of A x = b (mod modulus), or None when inconsistent
+    components = []
+    for p in prime_factors(modulus):
+        sol = solve_mod_prime(A, b, p)
+        if sol is None:
+            return None
+        components.append((p, sol[0], sol[1]))
+    return SolutionSpace(modulus, components)
+
+
+def solve_positions(digits, target_idx, input_indices, modulus=10, rule="direct"):
+    # Weights w over the digit columns in input_indices such that, for every row,
+    #   direct: sum(w * d) = d[target_idx]        (mod M)
+    #   luhn:   sum(w * d) + d[target_idx] = 0    (mod M)
+    digits = np.asarray(digits, dtype=np.int64)
+    A = digits[:, list(input_indices)]
+    y = digits[:, target_idx]
+    if rule == "luhn":
+        y = -y
+    return solve_mod(A, y, modulus)
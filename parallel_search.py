@@ -0,0 +1,281 @@
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from hypothesis_ranking import TopK
+from instrumentation import WorkerProfile, timed
+from weight_search import DEFAULT_BLOCK, MODES, WEIGHTS_1_9, pattern_count, rank_block, scan_block, search_block
+
+# Process-pool driver for pattern-length sweeps.
+#
+# The itertools.product space of every pattern length is cut into index
+# ranges ("chunks") that workers score with weight_search.search_block. Hits
+# are streamed back in chunk order per job, so the first hit reported is the
+# same one the old single-core loops would have found. Several jobs (e.g. the
+# IgE and UREA sub-solves) share one pool and run concurrently; a job that
+# finds its match cancels its own pending chunks. Progress can be saved to a
+# checkpoint file and a rerun resumes after the last finished chunk.
+#
+# Given a TopK per job, the sweep also ranks every chunk it scores (one
+# scan_block pass yields the hits and the chunk's top k), so the best
+# near-fits come out of the same sweep; they are merged in chunk order and
+# saved with the checkpoint. parallel_rank is the ranking-only driver.
+#
+# Both drivers take an optional instrumentation.Metrics: every finished chunk
+# is reported with the worker that scored it and how long it took, and with
+# Metrics(profile=...) the workers profile the chunks they score.
+
+DEFAULT_CHUNK = 1 << 18
+
+
+class SearchJob:
+    def __init__(self, label, X, checks, lengths, modes=tuple(MODES), alphabet=WEIGHTS_1_9):
+        self.label = label
+        self.X = X
+        self.checks = checks
+        self.lengths = list(lengths)
+        self.modes = tuple(modes)
+        self.alphabet = tuple(alphabet)
+
+    def chunks(self, chunk):
+        # (L, start, stop) in sweep order
+        for L in self.lengths:
+            total = pattern_count(L, self.alphabet)
+            for start in range(0, total, chunk):
+                yield L, start, min(start + chunk, total)
+
+
+# Sample matrices are shipped to each worker once, not with every chunk
+_WORKER_JOBS = {}
+_WORKER_PROFILE = []
+
+
+def _init_worker(jobs, profile=None):
+    _WORKER_JOBS.update(jobs)
+    if profile:
+        _WORKER_PROFILE.append(WorkerProfile(profile))
+
+
+def _run(fn, *args):
+    # -> (pid, seconds, result), under the worker's profiler when enabled
+    if _WORKER_PROFILE:
+        return _WORKER_PROFILE[0].run(timed, fn, *args)
+    return timed(fn, *args)
+
+
+def _scan(label, L, start, stop, k=0):
+    # -> (hits, ranked); ranked is None unless the chunk's top k is wanted
+    X, checks, modes, alphabet = _WORKER_JOBS[label]
+    if k:
+        return scan_block(X, checks, L, start, stop, k, modes, alphabet, DEFAULT_BLOCK)
+    return list(search_block(X, checks, L, start, stop, modes, alphabet, DEFAULT_BLOCK)), None
+
+
+def _rank(label, L, start, stop, k):
+    X, checks, modes, alphabet = _WORKER_JOBS[label]
+    return rank_block(X, checks, L, start, stop, k, modes, alphabet, DEFAULT_BLOCK)
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def _key(label, L):
+    return f"{label} L={L}"
+
+
+def _initargs(data, metrics):
+    return (data, metrics.profile if metrics else None)
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+class _JobState:
+    # Bookkeeping for one job: which chunks are done, which hits can be released
+
+    def __init__(self, job, chunk, saved, top=None):
+        self.job = job
+        self.top = top
+        self.order = list(job.chunks(chunk))
+        self.frontier = 0           # chunks [0, frontier) are finished and released
+        self.results = {}           # chunk ordinal -> (hits, ranked), finished but not yet released
+        self.hits = []
+        self.restored = set()
+        self.done = False
+        # A ranking sweep can only resume from a checkpoint ranked with the same k
+        if saved and saved.get("chunk") == chunk and (top is None or saved.get("k") == top.k):
+            self.frontier = saved.get("frontier", 0)
+            self.hits = [tuple(h[:3]) + (tuple(h[3]),) for h in saved.get("hits", [])]
+            self.done = saved.get("done", False)
+            for matches, L, idx, mode, pattern in saved.get("top", []) if top is not None else []:
+                top.push(matches, L, idx, mode, pattern)
+        # A chunk can be half released when the caller stopped mid-chunk
+        self.restored = set(h[:3] for h in self.hits)
+        self.next = self.frontier
+
+    def skip_rest(self, metrics):
+        # Chunks this job will never score (early stop or restored as done)
+        if metrics:
+            m = len(self.job.modes)
+            for L, start, stop in self.order[self.next:]:
+                metrics.skip(_key(self.job.label, L), (stop - start) * m)
+        self.next = len(self.order)
+
+    def snapshot(self, chunk):
+        state = {"chunk": chunk, "frontier": self.frontier, "done": self.done,
+                 "hits": [list(h[:3]) + [list(h[3])] for h in self.hits]}
+        if self.top is not None:
+            state["k"] = self.top.k
+            state["top"] = [list(e[:4]) + [list(e[4])] for e in self.top.entries()]
+        return state
+
+
+def parallel_sweep(jobs, workers=None, chunk=DEFAULT_CHUNK, first_only=True, checkpoint=None, save_every=5.0,
+                   metrics=None, tops=None):
+    # Yields (label, L, pattern_index, mode, pattern) as hits are confirmed.
+    # With first_only a job stops at its first hit, like the old exit()/return.
+    # tops: label -> TopK, filled with the best near-fits of every chunk the
+    # job releases; a ranked job sweeps its whole space, so with first_only it
+    # only stops reporting after the first hit.
+    workers = workers or os.cpu_count() or 1
+    saved = load_checkpoint(checkpoint)
+    tops = tops or {}
+    states = {job.label: _JobState(job, chunk, saved.get(job.label), tops.get(job.label)) for job in jobs}
+    if metrics:
+        for job in jobs:
+            for L in job.lengths:
+                metrics.plan(_key(job.label, L), pattern_count(L, job.alphabet) * len(job.modes))
+        for st in states.values():
+            for L, start, stop in st.order[:st.frontier]:
+                metrics.skip(_key(st.job.label, L), (stop - start) * len(st.job.modes))
+
+    # Hits restored from the checkpoint come first
+    for label, st in states.items():
+        for hit in st.hits:
+            yield (label,) + hit
+        if first_only and st.hits and st.top is None:
+            st.done = True
+        if st.done:
+            st.skip_rest(metrics)
+
+    data = {job.label: (job.X, job.checks, job.modes, job.alphabet) for job in jobs}
+    pending = {}
+    last_save = time.monotonic()
+
+    def fill(pool):
+        # Round-robin over live jobs, keeping a few chunks queued per worker
+        progressed = True
+        while len(pending) < workers * 2 and progressed:
+            progressed = False
+            for st in states.values():
+                if st.done or st.next >= len(st.order):
+                    continue
+                L, start, stop = st.order[st.next]
+                fut = pool.submit(_run, _scan, st.job.label, L, start, stop, st.top.k if st.top is not None else 0)
+                pending[fut] = (st, st.next, L)
+                st.next += 1
+                progressed = True
+                if len(pending) >= workers * 2:
+                    break
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=_initargs(data, metrics))
+    try:
+        fill(pool)
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                st, ordinal, L = pending.pop(fut)
+                if fut.cancelled():
+                    continue
+                pid, seconds, (hits, ranked) = fut.result()
+                if metrics:
+                    _, start, stop = st.order[ordinal]
+                    n = (stop - start) * len(st.job.modes)
+                    metrics.add(_key(st.job.label, L), n, n * len(st.job.X), hits=len(hits),
+                                worker=pid, seconds=seconds)
+                if st.done:
+                    continue
+                st.results[ordinal] = ([(L,) + hit for hit in hits], ranked)
+
+                # Release hits only once every earlier chunk of the job is in
+                while not st.done and st.frontier in st.results:
+                    hits, ranked = st.results.pop(st.frontier)
+                    if st.top is not None:
+                        st.top.extend(st.order[st.frontier][0], ranked)
+                    for hit in hits:
+                        if first_only and st.hits:
+                            break
+                        if hit[:3] in st.restored:
+                            continue
+                        st.hits.append(hit)
+                        yield (st.job.label,) + hit
+                        if first_only and st.top is None:
+                            st.done = True
+                            break
+                    st.frontier += 1
+                if st.frontier >= len(st.order):
+                    st.done = True
+
+                if st.done:
+                    # Early cancellation of this job's queued chunks
+                    for other, (ost, o_ordinal, o_L) in list(pending.items()):
+                        if ost is st and other.cancel():
+                            pending.pop(other)
+                            if metrics:
+                                _, start, stop = st.order[o_ordinal]
+                                metrics.skip(_key(st.job.label, o_L), (stop - start) * len(st.job.modes))
+                    st.skip_rest(metrics)
+
+            if checkpoint and time.monotonic() - last_save >= save_every:
+                save_checkpoint(checkpoint, {label: s.snapshot(chunk) for label, s in states.items()})
+                last_save = time.monotonic()
+            fill(pool)
+    finally:
+        # Also reached when the caller stops iterating early
+        pool.shutdown(wait=True, cancel_futures=True)
+        save_checkpoint(checkpoint, {label: s.snapshot(chunk) for label, s in states.items()})
+
+
+def parallel_rank(jobs, k=10, workers=None, chunk=DEFAULT_CHUNK, metrics=None):
+    # Ranking mode: label -> TopK of the best k hypotheses over all of the
+    # job's lengths. Each chunk returns its own top k; merging them is exact.
+    workers = workers or os.cpu_count() or 1
+    data = {job.label: (job.X, job.checks, job.modes, job.alphabet) for job in jobs}
+    by_label = {job.label: job for job in jobs}
+    tops = {job.label: TopK(k) for job in jobs}
+    todo = [(job.label, L, start, stop) for job in jobs for L, start, stop in job.chunks(chunk)]
+    todo.reverse()
+    if metrics:
+        for job in jobs:
+            for L in job.lengths:
+                metrics.plan(_key(f"rank {job.label}", L), pattern_count(L, job.alphabet) * len(job.modes))
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=_initargs(data, metrics)) as pool:
+        while todo or pending:
+            while todo and len(pending) < workers * 2:
+                label, L, start, stop = todo.pop()
+                pending[pool.submit(_run, _rank, label, L, start, stop, k)] = (label, L, stop - start)
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                label, L, size = pending.pop(fut)
+                pid, seconds, ranked = fut.result()
+                tops[label].extend(L, ranked)
+                if metrics:
+                    job = by_label[label]
+                    n = size * len(job.modes)
+                    metrics.add(_key(f"rank {label}", L), n, n * len(job.X), worker=pid, seconds=seconds)
+    return tops
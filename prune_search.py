@@ -0,0 +1,111 @@
+
+import itertools
+import time
+
+import numpy as np
+
+from modular_solver import prime_factors, rref_mod_prime
+from weight_search import DEFAULT_BLOCK, WEIGHTS_1_9, mode_targets
+
+# Pruned search over non-repeating weight vectors (all 9^19 of them).
+#
+# The cyclic search tests whole patterns against every sample. Here the
+# samples are first reduced to row echelon form per prime factor of the
+# modulus (Z/10 = Z/2 x Z/5), which is the strongest per-sample propagation
+# there is: after elimination every constraint row touches its pivot column
+# and free columns to its right only. Columns are then assigned right to
+# left, so a row closes exactly when its pivot column is reached and forces
+# that weight mod p; any branch whose forced residue has no weight in the
+# alphabet (e.g. 0 mod 10) is dropped on the spot. Only the free columns
+# branch, so the work is ~9^(free columns) instead of 9^19.
+#
+# Columns that are zero in every sample cannot be constrained at all; they
+# are reported as free wildcards (None) instead of multiplying the output.
+#
+# The frontier is expanded depth-first in blocks of partial assignments, so
+# memory stays bounded and the first solutions come out early. With an
+# instrumentation.Metrics every expansion is reported as candidates (children
+# generated) and pruned (children dropped by a forced residue).
+
+
+def free_columns(X):
+    # Columns whose digit is 0 in every sample: any weight fits there
+    return np.flatnonzero(~np.asarray(X).any(axis=0))
+
+
+def _components(X, targets, modulus):
+    # Per prime: (p, R, rhs, pivot row per column or -1), None when inconsistent
+    comps = []
+    for p in prime_factors(modulus):
+        red = rref_mod_prime(X, targets, p)
+        if red is None:
+            return None
+        R, rhs, pivots = red
+        pivot_row = np.full(X.shape[1], -1, dtype=np.int64)
+        pivot_row[pivots] = np.arange(len(pivots))
+        comps.append((p, R, rhs, pivot_row))
+    return comps
+
+
+def _expand(W, sums, col, comps, alpha):
+    # Frontier (B partial assignments) x alphabet -> surviving children
+    ok = np.ones((W.shape[0], alpha.size), dtype=bool)
+    for (p, R, rhs, pivot_row), S in zip(comps, sums):
+        r = pivot_row[col]
+        if r >= 0:
+            need = (rhs[r] - S[:, r]) % p
+            ok &= (alpha[None, :] % p) == need[:, None]
+    parent, pick = np.nonzero(ok)
+    W = W[parent]
+    W[:, col] = alpha[pick]
+    new_sums = []
+    for (p, R, rhs, pivot_row), S in zip(comps, sums):
+        new_sums.append((S[parent] + np.outer(alpha[pick], R[:, col])) % p)
+    return W, new_sums
+
+
+def search_weights(X, checks, mode="remainder", alphabet=WEIGHTS_1_9, limit=None, block=DEFAULT_BLOCK,
+                   metrics=None, label=None):
+    # Yields every weight vector (one weight per column, None for free
+    # wildcard columns) accepted by all samples under `mode`.
+    key = f"{label or 'prune'} {mode}"
+    modulus, targets = mode_targets(checks, mode)
+    X = np.asarray(X, dtype=np.int64)
+    width = X.shape[1]
+    wild = set(free_columns(X).tolist())
+    comps = _components(X, targets, modulus)
+    if comps is None:
+        return
+
+    alpha = np.asarray(alphabet, dtype=np.int64)
+    order = [c for c in range(width - 1, -1, -1) if c not in wild]
+    root = np.zeros((1, width), dtype=np.int64)
+    stack = [(0, root, [np.zeros((1, R.shape[0]), dtype=np.int64) for _, R, _, _ in comps])]
+
+    found = 0
+    while stack:
+        depth, W, sums = stack.pop()
+        if depth == len(order):
+            for row in W:
+                if metrics:
+                    metrics.add(key, 0, hits=1)
+                yield tuple(None if c in wild else int(row[c]) for c in range(width))
+                found += 1
+                if limit is not None and found >= limit:
+                    return
+            continue
+        t0 = time.perf_counter()
+        parents = W.shape[0]
+        W, sums = _expand(W, sums, order[depth], comps, alpha)
+        if metrics:
+            n = parents * alpha.size
+            metrics.add(key, n, pruned=n - W.shape[0], seconds=time.perf_counter() - t0)
+        # Push the pieces in reverse so the first block is explored first
+        for lo in range(((W.shape[0] - 1) // block) * block, -1, -block):
+            stack.append((depth + 1, W[lo:lo + block], [S[lo:lo + block] for S in sums]))
+
+
+def fill_wildcards(weights, alphabet=WEIGHTS_1_9):
+    # Every concrete vector a wildcard result stands for
+    slots = [alphabet if w is None else (w,) for w in weights]
+    return itertools.product(*slots)
@@ -0,0 +1,142 @@
+
+import hashlib
+import json
+import os
+import time
+
+# On-disk memoization of solver runs.
+#
+# An entry is keyed by the solver name, its parameters (modulus, pattern
+# length, weight alphabet, ...) and a content hash of the normalized corpus
+# (the sorted set of 20-digit codes), and holds the complete solution set of
+# that run -- an empty list is a cached negative result. Because every sample
+# is one more constraint, the solutions for a larger corpus are a subset of
+# the solutions for any corpus it contains: a run on a known corpus plus a few
+# new samples only re-verifies the cached candidates against the new ones.
+# Entries are evicted least-recently-used once the cache exceeds max_bytes.
+
+CACHE_DIR = ".solver_cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_corpus(codes):
+    return sorted(set(codes))
+
+
+def corpus_hash(codes):
+    return hashlib.sha256("\n".join(normalize_corpus(codes)).encode("ascii")).hexdigest()
+
+
+def params_key(solver, params):
+    return json.dumps({"solver": solver, "params": params}, sort_keys=True)
+
+
+def _entry_key(solver, params, digest):
+    return hashlib.sha256((params_key(solver, params) + digest).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, path=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(path, "index.json")
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+
+    def _save_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + ".json")
+
+    def _load(self, key):
+        try:
+            with open(self._entry_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Entry vanished or is corrupt: forget it
+            self.index.pop(key, None)
+            return None
+
+    def _touch(self, key):
+        self.index[key]["used"] = time.time()
+        self._save_index()
+
+    def get(self, solver, params, codes):
+        # Cached solution list for exactly this corpus, or None
+        key = _entry_key(solver, params, corpus_hash(codes))
+        if key not in self.index:
+            return None
+        entry = self._load(key)
+        if entry is None:
+            return None
+        self._touch(key)
+        return entry["solutions"]
+
+    def put(self, solver, params, codes, solutions):
+        corpus = normalize_corpus(codes)
+        digest = corpus_hash(corpus)
+        key = _entry_key(solver, params, digest)
+        entry = {"solver": solver, "params": params, "corpus": corpus, "solutions": solutions}
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._entry_path(key), 'w') as f:
+            json.dump(entry, f)
+        self.index[key] = {
+            "params": params_key(solver, params),
+            "n": len(corpus),
+            "size": os.path.getsize(self._entry_path(key)),
+            "used": time.time(),
+        }
+        self._evict()
+        self._save_index()
+
+    def closest_subset(self, solver, params, codes):
+        # Largest cached corpus for the same solver/params contained in codes
+        wanted = params_key(solver, params)
+        corpus = set(codes)
+        candidates = sorted((meta["n"], key) for key, meta in self.index.items()
+                            if meta["params"] == wanted and meta["n"] < len(corpus))
+        for _, key in reversed(candidates):
+            entry = self._load(key)
+            if entry is not None and corpus.issuperset(entry["corpus"]):
+                self._touch(key)
+                return entry
+        return None
+
+    def cached(self, solver, params, codes, compute, verify=None):
+        # -> (solutions, how) with how in "hit", "reverified", "computed".
+        # compute(codes) runs the solver; verify(solution, extra_codes) checks
+        # one cached solution against samples the cached corpus did not have.
+        solutions = self.get(solver, params, codes)
+        if solutions is not None:
+            return solutions, "hit"
+
+        if verify is not None:
+            entry = self.closest_subset(solver, params, codes)
+            if entry is not None:
+                extra = sorted(set(codes) - set(entry["corpus"]))
+                solutions = [s for s in entry["solutions"] if verify(s, extra)]
+                self.put(solver, params, codes, solutions)
+                return solutions, "reverified"
+
+        solutions = compute(codes)
+        self.put(solver, params, codes, solutions)
+        return solutions, "computed"
+
+    def _evict(self):
+        total = sum(meta["size"] for meta in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["used"]):
+            if total <= self.max_bytes:
+                break
+            total -= self.index.pop(key)["size"]
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
@@ -0,0 +1,189 @@
+
+from collections import namedtuple
+
+import numpy as np
+
+from anchor_store import ANCHORS_PATH, GOLDEN_SAMPLES, golden_store, load_store
+
+# Offline port of BarcodeService.AnalyzeCalibrationSlopes.
+#
+# The service votes over every pair of anchors in an ItemCode_RgtType group:
+#   P votes   (p0, p2, pL, pD):  p0*dSN0 + p2*dSN2 + pL*dLot + pD*dDateSum = dP   (mod 10)
+#   Cal votes (k, m, l):         k*dP + m*dSNTens + l*dLot = dCal  (C# %, weight 5 if dLot == 0)
+# and keeps the most voted key, ties going to the key that entered the C#
+# Dictionary first. Here the vote tables are dense count arrays and a new
+# anchor only adds its pairs with the anchors already in the group, so a
+# refit after one scan costs O(n * 10^4) vectorized work instead of O(n^2).
+
+Slopes = namedtuple("Slopes", "p_slopes k m lot_slope p_lot_slope p_date_slope count")
+
+# CalculateWeightedSum over the 19 data digits: weight 3 on the rightmost digit
+WSUM_WEIGHTS = np.array([3 if (18 - i) % 2 == 0 else 1 for i in range(19)], dtype=np.int64)
+
+# Defaults used by the service
+DEFAULT_P_SET = (3, 0, 3, 0, 0, 1)
+DEFAULT_CAL = (1, 0, 0)
+CAL_L_VALUES = (0, 1, 9, 7, 3)
+
+# Key enumeration order of the C# loops: p0, p2, pL, pD (outer to inner)
+_P_KEYS = np.array(np.meshgrid(*[np.arange(10)] * 4, indexing="ij")).reshape(4, -1)
+_P_KEYS16 = _P_KEYS.astype(np.int16)
+# k, m, l in CAL_L_VALUES order
+_C_KEYS = np.array(np.meshgrid(np.arange(10), np.arange(10), np.array(CAL_L_VALUES), indexing="ij")).reshape(3, -1)
+
+# Insertion stamp of a vote: (i, j, key) of the pair loop, packed into int64
+_NEVER = np.iinfo(np.int64).max
+
+
+def _stamp(i, j, key):
+    return (i.astype(np.int64) << 40) + (np.int64(j) << 16) + key
+
+
+def anchor_features(store, rows=None):
+    # Per-anchor columns the votes are computed from
+    s = store if rows is None else store.select(rows)
+    digits = s.digits.astype(np.int64)
+    serial = s.serial.astype(np.int64)
+    wsum = digits[:, :19] @ WSUM_WEIGHTS
+    return {
+        'p': digits[:, 11],
+        'cal': (digits[:, 19] + wsum) % 10,
+        'lot': s.lot.astype(np.int64),
+        'date': digits[:, 5:11].sum(axis=1),
+        'sn0': serial % 10,
+        'sn2': (serial // 100) % 10,
+        'stens': serial // 10,
+    }
+
+
+class GroupFit:
+    # Vote tables of one ItemCode_RgtType group, updated one anchor at a time
+
+    FIELDS = ('p', 'cal', 'lot', 'date', 'sn0', 'sn2', 'stens')
+
+    def __init__(self, chunk=512):
+        self.cols = {f: np.zeros(0, dtype=np.int64) for f in self.FIELDS}
+        self.p_votes, self.p_first, self.c_votes, self.c_first = self.empty_tables()
+        self.chunk = chunk
+
+    @staticmethod
+    def empty_tables(shape=()):
+        # Fresh (p_votes, p_first, c_votes, c_first), with leading axes `shape`
+        # for callers that keep several sets of tables
+        p, c = shape + (_P_KEYS.shape[1],), shape + (_C_KEYS.shape[1],)
+        return (np.zeros(p, dtype=np.int64), np.full(p, _NEVER, dtype=np.int64),
+                np.zeros(c, dtype=np.int64), np.full(c, _NEVER, dtype=np.int64))
+
+    def tables(self):
+        # The group's own vote tables, in empty_tables order
+        return self.p_votes, self.p_first, self.c_votes, self.c_first
+
+    def __len__(self):
+        return self.cols['p'].size
+
+    def add(self, features):
+        # features: dict of scalars (one anchor) as produced by anchor_features
+        j = len(self)
+        for lo in range(0, j, self.chunk):
+            self._vote_pairs(np.arange(lo, min(lo + self.chunk, j)), j, features, self.tables())
+        for f in self.FIELDS:
+            self.cols[f] = np.append(self.cols[f], np.int64(features[f]))
+
+    def _vote_pairs(self, i, j, new, tables):
+        # Votes of pairs (i, j) are added into `tables` in place
+        p_votes, p_first, c_votes, c_first = tables
+        old = {f: self.cols[f][i] for f in self.FIELDS}
+        dp = (new['p'] - old['p'] + 10) % 10
+        dl = new['lot'] - old['lot']
+
+        # P votes: mathematical mod 10 ((pred + 1000) % 10 in C#), so the
+        # deltas can be reduced mod 10 first and the products stay in int16
+        deltas = [new['sn0'] - old['sn0'], new['sn2'] - old['sn2'], dl, new['date'] - old['date']]
+        pred = sum(np.outer((d % 10).astype(np.int16), _P_KEYS16[n]) for n, d in enumerate(deltas))
+        self._tally(pred % 10 == dp[:, None], np.ones_like(dl), i, j, p_votes, p_first)
+
+        # Cal votes: C# % truncates toward zero, so negative sums never match dc > 0
+        dst = new['stens'] - old['stens']
+        dc = (new['cal'] - old['cal'] + 10) % 10
+        pred = (np.outer(dp, _C_KEYS[0]) + np.outer(dst, _C_KEYS[1]) + np.outer(dl, _C_KEYS[2]))
+        weight = np.where(dl == 0, 5, 1)
+        self._tally(np.fmod(pred, 10) == dc[:, None], weight, i, j, c_votes, c_first)
+
+    @staticmethod
+    def _tally(match, weight, i, j, votes, first):
+        votes += (match * weight[:, None]).sum(axis=0)
+        hit = match.any(axis=0)
+        if not hit.any():
+            return
+        # Earliest pair (smallest i, since j is fixed) that voted for each key
+        keys = np.flatnonzero(hit)
+        first_i = i[match[:, keys].argmax(axis=0)]
+        np.minimum.at(first, keys, _stamp(first_i, j, keys))
+
+    @staticmethod
+    def _best(votes, first):
+        # Most votes; ties -> first inserted key (stable OrderByDescending)
+        if not votes.any():
+            return None
+        top = np.flatnonzero(votes == votes.max())
+        return top[np.argmin(first[top])]
+
+    def slopes(self, tables=None):
+        # Slopes from the group's tables, or from other tables of the same shape
+        p_votes, p_first, c_votes, c_first = self.tables() if tables is None else tables
+        best = self._best(p_votes, p_first)
+        p0, p2, pl, pd = DEFAULT_P_SET[0], DEFAULT_P_SET[2], DEFAULT_P_SET[4], DEFAULT_P_SET[5]
+        if best is not None:
+            p0, p2, pl, pd = (int(v) for v in _P_KEYS[:, best])
+
+        best = self._best(c_votes, c_first)
+        k, m, l = DEFAULT_CAL
+        if best is not None:
+            k, m, l = (int(v) for v in _C_KEYS[:, best])
+
+        return Slopes((p0, 0, p2, 0), k, m, l, pl, pd, len(self))
+
+
+class SlopeFitter:
+    # All groups of an anchor corpus; feed it anchors as they are scanned
+
+    def __init__(self):
+        self.groups = {}
+
+    def add_store(self, store):
+        feats = anchor_features(store)
+        for row, key in enumerate(store.group_keys()):
+            self.groups.setdefault(key, GroupFit()).add({f: v[row] for f, v in feats.items()})
+        return self
+
+    def slopes(self):
+        # Same dictionary the service builds: groups with >= 2 anchors, then
+        # defaults for golden-sample groups that got no fit
+        out = {key: g.slopes() for key, g in self.groups.items() if len(g) >= 2}
+        for ic, rt, _, _ in GOLDEN_SAMPLES:
+            key = f"{ic}_{rt}"
+            if key not in out:
+                out[key] = Slopes((3, 0, 3, 0), 1, 0, 0, 0, 0, 0)
+        return out
+
+
+def service_store(path=ANCHORS_PATH):
+    # The sample list BarcodeService.GetSamples ends up with: the anchors file
+    # plus golden samples it does not already contain
+    try:
+        store = load_store(path)
+    except (OSError, ValueError):
+        return golden_store()
+    known = set(store.codes())
+    store.extend({'ic': ic, 'rt': rt, 's': s, 'f': f} for ic, rt, s, f in GOLDEN_SAMPLES if f not in known)
+    return store
+
+
+def analyze_calibration_slopes(store):
+    return SlopeFitter().add_store(store).slopes()
+
+
+if __name__ == "__main__":
+    for key, s in analyze_calibration_slopes(service_store()).items():
+        print(f"{key}: pSlopes={list(s.p_slopes)} k={s.k} m={s.m} lotSlope={s.lot_slope} "
+              f"pLotSlope={s.p_lot_slope} pDateSlope={s.p_date_slope} n={s.count}")
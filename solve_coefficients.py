@@ -1,28 +1,18 @@
 
 import itertools
 
-# Golden Samples
-samples_raw = [
-    # IgE (Item 034, Rgt 1/2 handled as same group usually? Or separte? Let's assume separate maybe?)
-    # Format: (Item, Rgt, FullBarcode)
-    ("034", "R1", "03421240831305186967"),
-    ("034", "R2", "03412240831905187165"),
-    ("034", "R1", "03421241130605287237"),
-    ("034", "R2", "03412241130805287467"),
-    ("034", "R1", "03421250531105397211"),
-    ("034", "R2", "03412250531305397641"),
-    
-    # UREA (Item 010)
-    ("010", "R1", "01021240930900989311"), # Lot 009
-    ("010", "R1", "01021240930100989451"), # Lot 009
-    ("010", "R2", "01012240930100994395"), # Lot 009
-    ("010", "R1", "01021241130001005591"), # Lot 010
-    ("010", "R1", "01021241130101005561"), # Lot 010
-    ("010", "R2", "01012241130501010681"), # Lot 010
-    ("010", "R1", "01021251130301304777"), # Lot 013
-    ("010", "R1", "01021251130001304769"), # Lot 013
-    ("010", "R2", "01012251130701301175")  # Lot 013
-]
+import numpy as np
+
+from anchor_store import AnchorStore, golden_store
+from label_decoder import decode_labels
+from modular_solver import solve_mod
+from result_cache import ResultCache
+
+# CalculateWeightedSum weights for the 19 data digits (3,1,3,1... from the left)
+WSUM_WEIGHTS = np.array([3 if i % 2 == 0 else 1 for i in range(19)])
+
+# Golden Samples (shared store; IgE is item 034, UREA item 010)
+store = golden_store()
 
 def parse(s):
     # P is usually derived from SN last digit logic in the service: 
@@ -55,60 +45,55 @@ def parse(s):
 # Let's brute force the service's own coefficients k, m, l for the defined samples.
 # We create equations for every pair in the group.
 
-def solve_coefficients(group_samples, group_name):
-    # data: list of (p, s_tens, lot, cs, w_sum_19)
+def _solve(group):
+    # All (k, m, l, C) in Z/10 that fit every point of the group
+    ws = group.x19().astype(np.int64) @ WSUM_WEIGHTS
+    target_cal = (group.checks() + ws) % 10
+    s_tens = group.serial // 10
+    A = np.column_stack([group.p, s_tens, group.lot, np.ones(len(group))]).astype(np.int64)
+    space = solve_mod(A, target_cal, 10)
+    if space is None:
+        return []
+    return sorted([int(v) for v in x] for x in space.solutions())
+
+
+def _fits(solution, codes):
+    # Re-check one cached (k, m, l, C) against new points
+    extra = decode_labels(codes)
+    k, m, l, c = solution
+    ws = extra.digits[:, :19].astype(np.int64) @ WSUM_WEIGHTS
+    target_cal = (extra.checksum + ws) % 10
+    pred = (c + k * extra.p.astype(np.int64) + m * (extra.serial.astype(np.int64) // 10)
+            + l * extra.lot.astype(np.int64)) % 10
+    return bool((pred == target_cal).all())
+
+
+def solve_coefficients(group, group_name, cache=None):
+    # group: AnchorStore rows of one chemistry
     # p is digit 11
     # s_tens is SN / 10
     # lot is digit 12-14
     # cs is digit 19
     # w_sum_19 is weighted sum of first 19 digits (standard 3,1,3,1...)
     
-    def calc_wsum(s):
-        sum_v = 0
-        for i, c in enumerate(s):
-            w = 3 if i % 2 == 0 else 1
-            sum_v += int(c) * w
-        return sum_v
-
-    pts = []
-    for _, _, code in group_samples:
-        p = int(code[11])
-        lot = int(code[12:15])
-        sn = int(code[15:19])
-        s_tens = sn // 10
-        cs = int(code[19])
-        
-        # Determine "Base Checksum" from Weighted Sum
-        # Service logic: int currentWSum = CalculateWeightedSum(cFinal);
-        # int cs = (targetCal - currentWSum) % 10;
-        # => targetCal = (cs + currentWSum) % 10
-        
-        # And targetCal = (anchorCal + k*dP + m*dS + l*dLot)
-        # For a single sample, we can say:
-        # targetCal_i = (C + k*p_i + m*s_tens_i + l*lot_i) % 10
-        
-        ws = calc_wsum(code[:19])
-        target_cal = (cs + ws) % 10
-        
-        pts.append({'p': p, 's': s_tens, 'l': lot, 't': target_cal})
-
-    # Brute force k, m, l, C (Base constant) in range [0..9]
-    print(f"Solving {group_name} with {len(pts)} points...")
+    # Determine "Base Checksum" from Weighted Sum
+    # Service logic: int currentWSum = CalculateWeightedSum(cFinal);
+    # int cs = (targetCal - currentWSum) % 10;
+    # => targetCal = (cs + currentWSum) % 10
+    
+    # And targetCal = (anchorCal + k*dP + m*dS + l*dLot)
+    # For a single sample, we can say:
+    # targetCal_i = (C + k*p_i + m*s_tens_i + l*lot_i) % 10
+    
+    # Solve for k, m, l, C (Base constant) in Z/10 exactly.
+    # Every point is one linear congruence in the unknowns (k, m, l, C):
+    #   k*p + m*s + l*lot + C = t (mod 10)
+    # The solution set is cached per corpus (see result_cache.py).
+    print(f"Solving {group_name} with {len(group)} points...")
     
-    solutions = []
-    for k in range(10):
-        for m in range(10):
-            for l in range(10):
-                for C in range(10):
-                    valid = True
-                    for pt in pts:
-                        # Predicted Target Cal
-                        pred = (C + k*pt['p'] + m*pt['s'] + l*pt['l']) % 10
-                        if pred != pt['t']:
-                            valid = False
-                            break
-                    if valid:
-                        solutions.append((k, m, l, C))
+    cache = cache or ResultCache()
+    solutions, _ = cache.cached("coefficients", {"modulus": 10}, group.codes(),
+                                lambda codes: _solve(AnchorStore.from_records({'f': c} for c in codes)), _fits)
     
     if solutions:
         print(f"FOUND {len(solutions)} Solutions for {group_name}!")
@@ -118,8 +103,8 @@ def solve_coefficients(group_samples, group_name):
         print(f"No linear solution found for {group_name}.")
 
 # Group samples
-ige = [s for s in samples_raw if s[0] == "034"]
-urea = [s for s in samples_raw if s[0] == "010"]
+ige = store.select(store.ic == 34)
+urea = store.select(store.ic == 10)
 
 solve_coefficients(ige, "IgE")
 solve_coefficients(urea, "UREA")
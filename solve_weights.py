@@ -1,67 +1,82 @@
 
-import sys
-from itertools import product
+import argparse
 
-# Samples (First 19 digits -> 20th digit)
-samples = [
-    ("0342124083130518696", 7),
-    ("0341224083190518716", 5),
-    ("0342124113060528723", 7),
-    ("0341224113080528746", 7),
-    ("0342125053110539721", 1),
-    ("0341225053130539764", 1),
-    ("0102124093090098931", 1),
-    ("0102124093010098945", 1),
-    ("0101224093010099439", 5),
-    ("0102124113000100559", 1),
-    ("0102124113010100556", 1),
-    ("0101224113050101068", 1),
-    ("0102125113030130477", 7),
-    ("0102125113000130476", 9),
-    ("0101225113070130117", 5)
-]
+from anchor_store import golden_store
+from hypothesis_ranking import TopK, format_hypothesis
+from instrumentation import REPORT_EVERY, Metrics
+from parallel_search import SearchJob, parallel_rank, parallel_sweep
+from result_cache import ResultCache
+from weight_search import WEIGHTS_1_9, accepts, expand, split_codes
 
-def solve_weights_pattern(modulus=10):
+# Samples (First 19 digits -> 20th digit), from the shared golden store
+store = golden_store()
+
+def find_patterns(codes, L, mode, workers=None, checkpoint=None, metrics=None, top=None):
+    # Every cyclic pattern of length L that fits all codes, in product order;
+    # with a TopK the same sweep also ranks the near-fits into it
+    X, outputs = split_codes(codes)
+    job = SearchJob(f"{mode}{L}", X, outputs, [L], modes=(mode,))
+    tops = {job.label: top} if top is not None else None
+    hits = parallel_sweep([job], workers, first_only=False, checkpoint=checkpoint, metrics=metrics, tops=tops)
+    return [list(pat) for _, _, _, _, pat in hits]
+
+
+def solve_weights_pattern(modulus=10, workers=None, checkpoint=None, cache=None, top=5, metrics=None):
     print(f"Solving for Modulus {modulus}...")
     
-    # Target values
-    Y = []
-    X = []
-    
-    for inputs, output in samples:
-        digits = [int(c) for c in inputs]
-        X.append(digits)
-        
-        # Assume Sum + Output = 0 (mod M) => Sum = -Output
-        target = (modulus - output) % modulus
-        Y.append(target)
+    # Assume Sum + Output = 0 (mod M) => Sum = -Output
+    # That is the "remainder" mode of weight_search (or "mod11" for M = 11).
+    mode = {10: "remainder", 11: "mod11"}[modulus]
+    codes = store.codes()
+    cache = cache or ResultCache()
 
     # Brute Force Patterns
-    # Try pattern length L
-    for L in range(1, 8): # Try lengths up to 7
-        print(f"  Testing Pattern Length {L}...")
-        
-        # Brute force weights in range [1, 3, 7, 9] (common) + [2,4,5,6,8]
-        # Just try 1..9
-        for pat in product(range(1, 10), repeat=L):
-            weights = (pat * 20)[:19]
-            
-            valid = True
-            for i in range(len(samples)):
-                # Manual dot product
-                row_sum = sum(w * d for w, d in zip(weights, X[i]))
-                if row_sum % modulus != Y[i]:
-                    valid = False
-                    break
-            
-            if valid:
-                print(f"  !!! FOUND PATTERN LENGTH {L}: {pat}")
-                print(f"  modulus: {modulus}")
-                return weights
+    # Try pattern lengths 1..7, weights 1..9, sharded across all cores.
+    # Full match sets are cached per corpus, so reruns are instant and a
+    # corpus with new samples only re-checks the cached patterns.
+    def verify(pat, extra):
+        X, outputs = split_codes(extra)
+        return bool(accepts(pat, X, outputs, mode).all())
+
+    # The sweeps rank the near-fits as they go; lengths answered from the
+    # cache were not scored in this run and are ranked on their own
+    near = TopK(top) if top else None
+    unranked = []
+    for L in range(1, 8):
+        params = {"modulus": modulus, "mode": mode, "length": L, "alphabet": list(WEIGHTS_1_9)}
+        ck = f"{checkpoint}.L{L}" if checkpoint else None
+        patterns, how = cache.cached("cyclic_weights", params, codes,
+                                     lambda c: find_patterns(c, L, mode, workers, ck, metrics, near), verify)
+        if how != "computed":
+            unranked.append(L)
+        print(f"  Testing Pattern Length {L}... ({how})")
+        if patterns:
+            pat = tuple(patterns[0])
+            print(f"  !!! FOUND PATTERN LENGTH {L}: {pat}")
+            print(f"  modulus: {modulus}")
+            return list(expand(pat))
 
     print(f"  No simple pattern found for Mod {modulus}.")
+    if top:
+        # Best near-fits over the same lengths, with the serials they miss
+        X, outputs = split_codes(codes)
+        if unranked:
+            job = SearchJob(f"rank{modulus}", X, outputs, unranked, modes=(mode,))
+            near.merge(parallel_rank([job], top, workers, metrics=metrics)[job.label])
+        for h in near.hypotheses(X, outputs, ids=store.serial):
+            print(f"  near-fit {format_hypothesis(h)}")
 
 if __name__ == "__main__":
-    solve_weights_pattern(10)
-    print("-" * 20)
-    solve_weights_pattern(11)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("workers", type=int, nargs="?", default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--modulus", type=int, nargs="+", default=[10, 11], choices=[10, 11])
+    parser.add_argument("--progress", type=float, default=REPORT_EVERY, help="seconds between progress lines")
+    parser.add_argument("--metrics", default=None, help="JSON metrics file, rewritten with every progress line")
+    parser.add_argument("--profile", default=None, help="cProfile output (parent and workers merged)")
+    args = parser.parse_args()
+
+    with Metrics("solve_weights", args.progress, args.metrics, args.profile) as metrics:
+        for i, modulus in enumerate(args.modulus):
+            if i:
+                print("-" * 20)
+            solve_weights_pattern(modulus, args.workers, metrics=metrics)
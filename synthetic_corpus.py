@@ -0,0 +1,218 @@
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from anchor_store import CODE_LEN, AnchorStore
+from checksum_families import evaluate_schemes, known_schemes
+from label_decoder import chem_map
+from slope_fit import WSUM_WEIGHTS
+
+# Seeded synthetic label corpora for load and scaling tests.
+#
+# Labels follow the layout generate_test_cases.py slices:
+#   0-2 item code | 3 bottle | 4 reagent | 5-10 yyMMdd | 11 P | 12-14 lot
+#   15-18 serial  | 19 checksum
+# with item codes from chem_map, month-end expiry dates, a handful of lots per
+# ItemCode_RgtType group and random serials. The checksum comes from a model:
+#   service    per-group P and calibration slopes, the structure the service
+#              fits (P from serial/lot/date, Cal = k*P + m*sTens + l*lot + C,
+#              checksum = Cal - CalculateWeightedSum)
+#   Luhn, Mod10_31, Mod10_13, Mod11
+#              a checksum_families scheme over the 19 data digits, random P
+# Optional noise: misreads (one data digit replaced, checksum left alone) and
+# wrong checksums, recorded per label in a noise column.
+#
+# Labels are generated in fixed blocks, each from its own seeded generator,
+# so a (seed, n, model, noise) corpus is identical however it is chunked on
+# disk. The on-disk form is a directory of .npy chunks plus manifest.json.
+#
+#   python synthetic_corpus.py corpora/synth1m -n 1000000 --model service --misread 0.001
+
+MODELS = ("service",) + tuple(s.name for s in known_schemes())
+BLOCK = 1 << 16
+CHUNK_ROWS = 1 << 20
+LOTS_PER_GROUP = 12
+
+# Noise flags
+CLEAN, MISREAD, WRONG_CHECKSUM = 0, 1, 2
+
+COLUMNS = ("digits", "ic", "rt", "lot", "serial", "noise")
+
+
+def corpus_params(seed, model="service"):
+    # Per-group lots and (for the service model) slopes, drawn once per seed
+    rng = np.random.default_rng([seed, 0])
+    params = {}
+    for code in sorted(chem_map):
+        for rt in (1, 2):
+            g = {"lots": sorted(int(v) for v in rng.choice(1000, LOTS_PER_GROUP, replace=False))}
+            if model == "service":
+                g["p"] = [int(v) for v in rng.integers(0, 10, 5)]     # p0, p2, pL, pD, c
+                g["cal"] = [int(v) for v in rng.integers(0, 10, 4)]   # k, m, l, C
+            params[f"{code}_R{rt}"] = g
+    return params
+
+
+def _month_end(year, month):
+    days = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[month - 1]
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return days + ((month == 2) & leap)
+
+
+def _split(values, widths):
+    # Integer column -> digit columns, most significant first
+    out = []
+    for w in range(widths - 1, -1, -1):
+        out.append((values // 10 ** w) % 10)
+    return np.stack(out, axis=1)
+
+
+def generate_block(n, seed, k, params, model="service", misread=0.0, wrong_checksum=0.0, years=(24, 28)):
+    # Block k of a corpus: AnchorStore of n labels plus its noise column
+    rng = np.random.default_rng([seed, 1, k])
+    keys = sorted(params)
+    g = rng.integers(0, len(keys), n)
+    ic = np.array([int(key[:3]) for key in keys], dtype=np.int64)[g]
+    rt = np.array([int(key[-1]) for key in keys], dtype=np.int64)[g]
+    lots = np.array([params[key]["lots"] for key in keys], dtype=np.int64)
+    lot = lots[g, rng.integers(0, LOTS_PER_GROUP, n)]
+    serial = rng.integers(0, 10000, n)
+
+    yy = rng.integers(years[0], years[1], n)
+    mm = rng.integers(1, 13, n)
+    dd = _month_end(2000 + yy, mm)
+
+    digits = np.zeros((n, CODE_LEN), dtype=np.int64)
+    digits[:, 0:3] = _split(ic, 3)
+    digits[:, 3] = rng.integers(1, 4, n)
+    digits[:, 4] = rt
+    digits[:, 5:11] = np.concatenate([_split(yy, 2), _split(mm, 2), _split(dd, 2)], axis=1)
+    digits[:, 12:15] = _split(lot, 3)
+    digits[:, 15:19] = _split(serial, 4)
+
+    if model == "service":
+        p_s = np.array([params[key]["p"] for key in keys], dtype=np.int64)[g]
+        c_s = np.array([params[key]["cal"] for key in keys], dtype=np.int64)[g]
+        date_sum = digits[:, 5:11].sum(axis=1)
+        digits[:, 11] = (p_s[:, 0] * (serial % 10) + p_s[:, 1] * ((serial // 100) % 10)
+                         + p_s[:, 2] * lot + p_s[:, 3] * date_sum + p_s[:, 4]) % 10
+        cal = (c_s[:, 0] * digits[:, 11] + c_s[:, 1] * (serial // 10) + c_s[:, 2] * lot + c_s[:, 3]) % 10
+        digits[:, 19] = (cal - digits[:, :19] @ WSUM_WEIGHTS) % 10
+    else:
+        digits[:, 11] = rng.integers(0, 10, n)
+        scheme = next(s for s in known_schemes() if s.name == model)
+        digits[:, 19] = evaluate_schemes(digits[:, :19], [scheme])[model]
+
+    noise = np.zeros(n, dtype=np.uint8)
+    if misread:
+        rows = np.flatnonzero(rng.random(n) < misread)
+        cols = rng.integers(0, 19, rows.size)
+        digits[rows, cols] = (digits[rows, cols] + rng.integers(1, 10, rows.size)) % 10
+        noise[rows] = MISREAD
+    if wrong_checksum:
+        rows = np.flatnonzero(rng.random(n) < wrong_checksum)
+        digits[rows, 19] = (digits[rows, 19] + rng.integers(1, 10, rows.size)) % 10
+        noise[rows] |= WRONG_CHECKSUM
+
+    # Columns are re-derived from the (possibly misread) digits, as a scanner would
+    store = AnchorStore(
+        digits.astype(np.uint8),
+        (digits[:, 0:3] @ [100, 10, 1]).astype(np.uint16),
+        digits[:, 4].astype(np.uint8),
+        (digits[:, 12:15] @ [100, 10, 1]).astype(np.uint16),
+        (digits[:, 15:19] @ [1000, 100, 10, 1]).astype(np.uint16),
+        digits[:, 11].astype(np.uint8),
+    )
+    return store, noise
+
+
+def generate(n, seed=0, model="service", misread=0.0, wrong_checksum=0.0, block=BLOCK):
+    # Yields (AnchorStore, noise) blocks covering n labels
+    if model not in MODELS:
+        raise ValueError(f"unknown checksum model {model}")
+    params = corpus_params(seed, model)
+    for k, lo in enumerate(range(0, n, block)):
+        yield generate_block(min(block, n - lo), seed, k, params, model, misread, wrong_checksum)
+
+
+def _concat(stores):
+    cols = ("digits", "ic", "rt", "lot", "serial", "p", "serial_numeric")
+    return AnchorStore(*(np.concatenate([getattr(s, c) for s in stores]) for c in cols))
+
+
+def synthetic_store(n, seed=0, model="service", misread=0.0, wrong_checksum=0.0):
+    # Whole corpus in memory
+    blocks = list(generate(n, seed, model, misread, wrong_checksum))
+    return _concat([s for s, _ in blocks])
+
+
+def write_corpus(path, n, seed=0, model="service", misread=0.0, wrong_checksum=0.0, chunk_rows=CHUNK_ROWS):
+    # Chunked .npy columns + manifest.json; chunk_rows is rounded up to whole blocks
+    os.makedirs(path, exist_ok=True)
+    per_chunk = max(1, -(-chunk_rows // BLOCK))
+    files = []
+    pending = []
+
+    def flush():
+        store = _concat([s for s, _ in pending])
+        noise = np.concatenate([z for _, z in pending])
+        k = len(files)
+        arrays = {"digits": store.digits, "ic": store.ic, "rt": store.rt, "lot": store.lot,
+                  "serial": store.serial, "noise": noise}
+        for name, arr in arrays.items():
+            np.save(os.path.join(path, f"{name}-{k:05d}.npy"), arr)
+        files.append(len(store))
+        pending.clear()
+
+    for part in generate(n, seed, model, misread, wrong_checksum):
+        pending.append(part)
+        if len(pending) == per_chunk:
+            flush()
+    if pending:
+        flush()
+
+    manifest = {
+        "rows": n, "seed": seed, "model": model, "misread": misread, "wrong_checksum": wrong_checksum,
+        "block": BLOCK, "chunks": files, "columns": list(COLUMNS), "params": corpus_params(seed, model),
+    }
+    with open(os.path.join(path, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def read_manifest(path):
+    with open(os.path.join(path, "manifest.json"), 'r') as f:
+        return json.load(f)
+
+
+def iter_chunks(path, mmap=True):
+    # Yields (AnchorStore, noise) per on-disk chunk; with mmap nothing is read
+    # until a column is touched
+    mode = "r" if mmap else None
+    for k in range(len(read_manifest(path)["chunks"])):
+        cols = {name: np.load(os.path.join(path, f"{name}-{k:05d}.npy"), mmap_mode=mode) for name in COLUMNS}
+        d = cols["digits"]
+        yield AnchorStore(d, cols["ic"], cols["rt"], cols["lot"], cols["serial"], d[:, 11]), cols["noise"]
+
+
+def load_corpus(path):
+    # Whole corpus as one in-memory AnchorStore (noise column dropped)
+    return _concat([s for s, _ in iter_chunks(path, mmap=False)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic label corpus")
+    parser.add_argument("path", help="output directory")
+    parser.add_argument("-n", "--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model", default="service", choices=MODELS)
+    parser.add_argument("--misread", type=float, default=0.0, help="share of labels with one misread data digit")
+    parser.add_argument("--wrong-checksum", type=float, default=0.0, help="share of labels with a wrong checksum")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    m = write_corpus(args.path, args.rows, args.seed, args.model, args.misread, args.wrong_checksum, args.chunk_rows)
+    print(f"SUCCESS ({m['rows']} labels in {len(m['chunks'])} chunks)")
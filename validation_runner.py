@@ -0,0 +1,246 @@
+
+import argparse
+import csv
+import html
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+from anchor_index import AnchorIndex
+from batch_generate import _CS_CASE, TestCase, validate_cases
+from label_decoder import FIELDS
+from model_registry import ModelRegistry
+from slope_fit import analyze_calibration_slopes, service_store
+
+# Validation runner: expected barcodes vs. the offline service model.
+#
+# Test cases are streamed from new_test_cases.txt (C# "new(...)" lines) or
+# from the JSON Lines / CSV shards generate_test_cases.py writes, validated in
+# chunks by batch_generate across a process pool, and every result row is
+# appended to the CSV as soon as its chunk is done (chunks are released in
+# input order). Only aggregate counts are kept in memory, so a 100k-case run
+# needs no more memory than a 1k one. The HTML report is rendered from those
+# aggregates: per-chemistry pass rates, the first failing digit position,
+# and a capped list of example failures.
+#
+#   python validation_runner.py new_test_cases.txt
+#   python validation_runner.py out/cases/*.jsonl --workers 4 --csv report.csv --html report.html
+#   python validation_runner.py --registry wwwroot/data/calibration_slopes.json   # stored slopes, no refit
+
+CSV_COLUMNS = ["Id", "Chemical", "Lot", "Serial", "Expiry", "Expected", "Actual", "Status"]
+CHUNK = 5000
+MAX_EXAMPLES = 50
+
+# Field of every barcode digit, for the first-failing-digit table
+DIGIT_FIELDS = [name for name, (lo, hi) in FIELDS.items() for _ in range(lo, hi)]
+
+
+def iter_case_file(path):
+    # TestCase records from a .txt/.cs, .jsonl or .csv case file
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield TestCase(**json.loads(line))
+        elif ext == ".csv":
+            for row in csv.DictReader(f):
+                yield TestCase(int(row["id"]), *(row[k] for k in TestCase._fields[1:]))
+        else:
+            for line in f:
+                match = _CS_CASE.search(line)
+                if match:
+                    g = match.groups()
+                    yield TestCase(int(g[0]), g[1].replace('\\"', '"'), *g[2:])
+
+
+def iter_cases(paths):
+    for path in paths:
+        yield from iter_case_file(path)
+
+
+# The model is shipped to each worker once, not with every chunk
+_WORKER_MODEL = {}
+
+
+def _init_worker(store, slopes):
+    _WORKER_MODEL.update(store=store, slopes=slopes, index=AnchorIndex(store))
+
+
+def _validate(cases):
+    m = _WORKER_MODEL
+    actual, _ = validate_cases(cases, m['store'], m['slopes'], m['index'])
+    return actual
+
+
+def first_mismatch(expected, actual):
+    # First differing digit position, or -1 when equal
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            return i
+    return -1 if len(expected) == len(actual) else min(len(expected), len(actual))
+
+
+class ValidationStats:
+    # Running aggregates of a validation run
+
+    def __init__(self, max_examples=MAX_EXAMPLES):
+        self.total = 0
+        self.passed = 0
+        self.by_chem = {}
+        self.first_fail = np.zeros(len(DIGIT_FIELDS) + 1, dtype=np.int64)
+        self.examples = []
+        self.max_examples = max_examples
+
+    def add(self, cases, actual):
+        for t, a in zip(cases, actual):
+            ok = a == t.expected
+            chem = self.by_chem.setdefault(t.chem, [0, 0])
+            chem[0] += 1
+            self.total += 1
+            if ok:
+                chem[1] += 1
+                self.passed += 1
+                continue
+            pos = first_mismatch(t.expected, a)
+            self.first_fail[min(pos, len(DIGIT_FIELDS))] += 1
+            if len(self.examples) < self.max_examples:
+                self.examples.append((t, a, pos))
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "passed": self.passed,
+            "by_chemistry": {k: {"total": n, "passed": p} for k, (n, p) in sorted(self.by_chem.items())},
+            "first_failing_digit": self.first_fail.tolist(),
+        }
+
+
+def _csv_rows(cases, actual):
+    for t, a in zip(cases, actual):
+        yield [t.id, t.chem, t.lot, t.serial, t.expiry, t.expected, a, "PASS" if a == t.expected else "FAIL"]
+
+
+def run_validation(cases, csv_path=None, workers=None, chunk=CHUNK, store=None, slopes=None):
+    # -> ValidationStats; result rows are appended to csv_path as chunks finish
+    store = service_store() if store is None else store
+    slopes = analyze_calibration_slopes(store) if slopes is None else slopes
+    workers = workers or os.cpu_count() or 1
+    stats = ValidationStats()
+
+    out = open(csv_path, 'w', newline='', encoding='utf-8') if csv_path else None
+    writer = csv.writer(out) if out else None
+    if writer:
+        writer.writerow(CSV_COLUMNS)
+
+    def emit(batch, actual):
+        stats.add(batch, actual)
+        if writer:
+            writer.writerows(_csv_rows(batch, actual))
+
+    cases = iter(cases)
+    try:
+        if workers == 1:
+            index = AnchorIndex(store)
+            while True:
+                batch = list(islice(cases, chunk))
+                if not batch:
+                    break
+                emit(batch, validate_cases(batch, store, slopes, index)[0])
+            return stats
+
+        # A bounded window of chunks in flight keeps memory flat; results
+        # come back in submission order
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(store, slopes)) as pool:
+            window = deque()
+            while True:
+                while len(window) < workers * 2:
+                    batch = list(islice(cases, chunk))
+                    if not batch:
+                        break
+                    window.append((batch, pool.submit(_validate, batch)))
+                if not window:
+                    break
+                batch, fut = window.popleft()
+                emit(batch, fut.result())
+        return stats
+    finally:
+        if out:
+            out.close()
+
+
+def _pct(p, n):
+    return f"{100.0 * p / n:.1f}%" if n else "-"
+
+
+def render_html(stats, title="Barcode Mass Validation Report", elapsed=None):
+    e = html.escape
+    parts = [
+        "<html><head><style>table { border-collapse: collapse; font-family: sans-serif; } "
+        "th, td { border: 1px solid #ddd; padding: 6px 10px; text-align: left; } "
+        "th { background-color: #f2f2f2; } .pass { color: green; } .fail { color: red; font-weight: bold; }"
+        "</style></head><body>",
+        f"<h1>{e(title)}</h1>",
+        f"<p>{stats.passed}/{stats.total} passed ({_pct(stats.passed, stats.total)})"
+        + (f" in {elapsed:.1f} s" if elapsed is not None else "") + "</p>",
+        "<h2>Pass Rate per Chemistry</h2>",
+        "<table><tr><th>Chemical</th><th>Cases</th><th>Passed</th><th>Failed</th><th>Pass Rate</th></tr>",
+    ]
+    for chem, (n, p) in sorted(stats.by_chem.items()):
+        cls = "pass" if p == n else "fail"
+        parts.append(f"<tr><td>{e(chem)}</td><td>{n}</td><td>{p}</td><td>{n - p}</td>"
+                     f"<td><span class='{cls}'>{_pct(p, n)}</span></td></tr>")
+    parts.append("</table>")
+
+    failed = stats.total - stats.passed
+    if failed:
+        parts.append("<h2>First Failing Digit</h2>")
+        parts.append("<table><tr><th>Position</th><th>Field</th><th>Failures</th><th>Share</th></tr>")
+        for pos, count in enumerate(stats.first_fail.tolist()):
+            if count:
+                field = DIGIT_FIELDS[pos] if pos < len(DIGIT_FIELDS) else "length"
+                parts.append(f"<tr><td>{pos}</td><td>{field}</td><td>{count}</td><td>{_pct(count, failed)}</td></tr>")
+        parts.append("</table>")
+
+        parts.append(f"<h2>Example Failures (first {len(stats.examples)})</h2>")
+        parts.append("<table><tr><th>ID</th><th>Chemical</th><th>Params (Lot/SN/Exp)</th>"
+                     "<th>Expected</th><th>Actual</th><th>First Diff</th></tr>")
+        for t, a, pos in stats.examples:
+            parts.append(f"<tr><td>{t.id}</td><td>{e(t.chem)}</td>"
+                         f"<td>Lot:{e(t.lot)} SN:{e(t.serial)} Exp:{e(t.expiry)}</td>"
+                         f"<td>{e(t.expected)}</td><td>{e(a)}</td><td><span class='fail'>{pos}</span></td></tr>")
+        parts.append("</table>")
+
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate expected barcodes against the offline service model")
+    parser.add_argument("cases", nargs="*", default=['new_test_cases.txt'],
+                        help="case files: .txt (C# new(...) lines), .jsonl or .csv")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=CHUNK)
+    parser.add_argument("--csv", default="validation_results.csv", help="per-case results")
+    parser.add_argument("--html", default="validation_report.html", help="aggregated report")
+    parser.add_argument("--json", default=None, help="aggregated statistics as JSON")
+    parser.add_argument("--registry", default=None, help="slopes from a model_registry.py file instead of a refit")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    slopes = ModelRegistry.load(args.registry).slopes() if args.registry else None
+    stats = run_validation(iter_cases(args.cases), args.csv, args.workers, args.chunk, slopes=slopes)
+    elapsed = time.perf_counter() - t0
+
+    with open(args.html, 'w', encoding='utf-8') as f:
+        f.write(render_html(stats, elapsed=elapsed))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats.to_dict(), f, indent=2)
+    print(f"Summary: {stats.passed}/{stats.total} Passed. ({elapsed:.1f} s)")
@@ -0,0 +1,165 @@
+
+import numpy as np
+
+# Batched weight-pattern search shared by crack_checksum.py and solve_weights.py.
+#
+# Samples are kept as a 2-D uint8 digit matrix (one row per barcode, 19 data
+# columns) plus a vector of checksum digits. Candidate weight patterns are
+# enumerated in blocks straight from their position in the
+# itertools.product(alphabet, repeat=L) order, so a block is just an index
+# range and can be scored against every sample with one matrix product.
+
+WEIGHTS_1_9 = tuple(range(1, 10))
+
+# Acceptance modes: name -> (modulus, remainder_mode)
+#   remainder: (M - sum % M) % M == checksum   (Luhn style)
+#   direct:    sum % M == checksum
+#   mod11:     remainder mode with M = 11
+MODES = {
+    "remainder": (10, True),
+    "direct": (10, False),
+    "mod11": (11, True),
+}
+
+DEFAULT_BLOCK = 1 << 16
+
+
+def digit_matrix(codes, width=19):
+    # "0342...967" strings -> (n, width) uint8 matrix of their first `width` digits
+    joined = "".join(c[:width] for c in codes).encode("ascii")
+    return (np.frombuffer(joined, dtype=np.uint8).reshape(-1, width) - ord("0")).astype(np.uint8)
+
+
+def split_codes(codes):
+    # Full 20-digit codes -> (digits of first 19, checksum digit vector)
+    full = digit_matrix(codes, 20)
+    return full[:, :19].copy(), full[:, 19].copy()
+
+
+def mode_targets(checks, mode):
+    # Every mode reduces to "weighted sum % M == target"
+    modulus, remainder = MODES[mode]
+    checks = np.asarray(checks, dtype=np.int64)
+    if remainder:
+        return modulus, (modulus - checks) % modulus
+    return modulus, checks % modulus
+
+
+def pattern_count(L, alphabet=WEIGHTS_1_9):
+    return len(alphabet) ** L
+
+
+def pattern_block(start, stop, L, alphabet=WEIGHTS_1_9):
+    # Patterns [start, stop) in itertools.product(alphabet, repeat=L) order
+    base = len(alphabet)
+    idx = np.arange(start, stop, dtype=np.int64)
+    out = np.empty((idx.size, L), dtype=np.int64)
+    for pos in range(L - 1, -1, -1):
+        out[:, pos] = idx % base
+        idx //= base
+    return np.asarray(alphabet, dtype=np.int64)[out]
+
+
+def fold_cyclic(X, L):
+    # A cyclic pattern of length L repeats over the 19 columns, so the column
+    # sums per residue class mod L are all a pattern ever gets multiplied with.
+    X = np.asarray(X, dtype=np.int64)
+    folded = np.zeros((X.shape[0], L), dtype=np.int64)
+    for r in range(L):
+        folded[:, r] = X[:, r::L].sum(axis=1)
+    return folded
+
+
+def block_residues(patterns, folded, modulus):
+    # (B, L) patterns x (n, L) folded digits -> (B, n) weighted sums mod M.
+    # Sums stay far below 2**53, so the float BLAS product is exact.
+    sums = patterns.astype(np.float64) @ folded.T.astype(np.float64)
+    return sums.astype(np.int64) % modulus
+
+
+def score_block(patterns, folded, modulus, targets):
+    # Number of samples each pattern in the block accepts
+    return (block_residues(patterns, folded, modulus) == targets).sum(axis=1)
+
+
+def full_match_rows(patterns, folded, modulus, targets):
+    # Rows of the block accepted by every sample. Samples are applied one at a
+    # time to the survivors only, so each extra sample costs ~1/M of the last.
+    rows = np.arange(patterns.shape[0])
+    for j in range(folded.shape[0]):
+        if rows.size == 0:
+            break
+        res = (patterns[rows] @ folded[j]) % modulus
+        rows = rows[res == targets[j]]
+    return rows
+
+
+def search_block(X, checks, L, start, stop, modes=tuple(MODES), alphabet=WEIGHTS_1_9, block=DEFAULT_BLOCK):
+    # Yields (pattern_index, mode, pattern) for every full match in
+    # [start, stop), ordered by pattern index and then by the order of `modes`.
+    folded = fold_cyclic(X, L)
+    specs = [(mode,) + mode_targets(checks, mode) for mode in modes]
+
+    for lo in range(start, stop, block):
+        hi = min(lo + block, stop)
+        pats = pattern_block(lo, hi, L, alphabet)
+        hits = []
+        for rank, (mode, modulus, targets) in enumerate(specs):
+            for row in full_match_rows(pats, folded, modulus, targets):
+                hits.append((int(row), rank, mode))
+        hits.sort()
+        for row, _, mode in hits:
+            yield lo + row, mode, tuple(int(w) for w in pats[row])
+
+
+def search_cyclic(X, checks, L, modes=tuple(MODES), alphabet=WEIGHTS_1_9, block=DEFAULT_BLOCK):
+    # Whole pattern space of length L; same order as the old itertools loops
+    return search_block(X, checks, L, 0, pattern_count(L, alphabet), modes, alphabet, block)
+
+
+def scan_block(X, checks, L, start, stop, k, modes=tuple(MODES), alphabet=WEIGHTS_1_9, block=DEFAULT_BLOCK):
+    # One pass over [start, stop) for both sweep modes: -> (hits, ranked),
+    # hits as search_block yields them and ranked as rank_block returns it.
+    # The match counts are computed once and serve both.
+    folded = fold_cyclic(X, L)
+    specs = [(mode,) + mode_targets(checks, mode) for mode in modes]
+    nm = len(specs)
+    n = folded.shape[0]
+    hits, best = [], []
+
+    for lo in range(start, stop, block):
+        hi = min(lo + block, stop)
+        pats = pattern_block(lo, hi, L, alphabet)
+        counts = np.stack([score_block(pats, folded, modulus, targets) for _, modulus, targets in specs], axis=1)
+        # Full matches in (row, mode) order, as search_block
+        for row, rank in np.argwhere(counts == n).tolist():
+            hits.append((lo + row, specs[rank][0], tuple(int(w) for w in pats[row])))
+        # Unique sort key per (row, mode): more matches first, then row, then mode
+        size = counts.size
+        key = counts.astype(np.int64).ravel() * size + (size - 1 - np.arange(size))
+        take = np.argpartition(-key, k - 1)[:k] if size > k else np.arange(size)
+        for t in take.tolist():
+            row, rank = divmod(t, nm)
+            best.append((int(counts[row, rank]), lo + row, rank, tuple(int(w) for w in pats[row])))
+        best.sort(key=lambda h: (-h[0], h[1], h[2]))
+        del best[k:]
+
+    return hits, [(m, idx, specs[rank][0], pat) for m, idx, rank, pat in best]
+
+
+def rank_block(X, checks, L, start, stop, k, modes=tuple(MODES), alphabet=WEIGHTS_1_9, block=DEFAULT_BLOCK):
+    # Best k (matches, pattern_index, mode, pattern) in [start, stop) by the
+    # number of samples accepted; ties go to the lower index, then to the
+    # earlier mode, so merging per-range results gives the global top k.
+    return scan_block(X, checks, L, start, stop, k, modes, alphabet, block)[1]
+
+
+def accepts(pattern, X, checks, mode):
+    # Per-sample acceptance of one pattern (used to re-verify cached hits)
+    modulus, targets = mode_targets(checks, mode)
+    weights = np.array(expand(pattern, X.shape[1]), dtype=np.int64)
+    return (np.asarray(X, dtype=np.int64) @ weights) % modulus == targets
+
+
+def expand(pattern, width=19):
+    return (tuple(pattern) * (width // len(pattern) + 1))[:width]